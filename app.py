@@ -1,6 +1,8 @@
 import json
+import math
 import os
 import sys
+import tempfile
 from datetime import datetime, timedelta
 
 import pandas as pd
@@ -10,18 +12,34 @@ import streamlit as st
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 # Importe les fonctions de la base de données et de l'extraction LLM
+import app_cache
 import database
+import extraction_cache
+import extractions_view
+import history_export
 import prompt_manager
-from run_extraction import SYSTEM_PROMPT_FILE, extract_data_from_llm
-from wordpress_connector import WordPressConnector
+from run_extraction import (
+    SYSTEM_PROMPT_FILE,
+    BulkExtractionWriter,
+    extract_data_from_llm,
+    extract_many,
+    skip_existing_jobs,
+)
 
 # --- Configuration de la Page ---
 st.set_page_config(page_title="Analyseur d'Articles", layout="wide", page_icon="🤖")
 
 
 # --- Initialisation de la Base de Données ---
-# Crée les tables `users` et `extractions` si elles n'existent pas
-database.init_db()
+# Applique les migrations en attente, une seule fois par processus Streamlit (pas à chaque rerun)
+@st.cache_resource(show_spinner=False)
+def init_database():
+    return database.init_db()
+
+
+if not init_database():
+    # Ne pas garder l'échec en cache : on réessaiera au prochain rerun
+    init_database.clear()
 
 
 # --- Initialisation de l'État de Session ---
@@ -44,6 +62,36 @@ if "wp_selected_posts" not in st.session_state:
     st.session_state.wp_selected_posts = []
 
 
+# Nombre d'analyses par page dans l'historique
+HISTORY_PAGE_SIZE = 50
+
+# Tris proposés dans l'historique (libellé -> clé de database.SEARCH_SORTS)
+HISTORY_SORTS = {
+    "Plus récentes": "recent",
+    "Plus anciennes": "oldest",
+    "Montant décroissant": "amount_desc",
+    "Montant croissant": "amount_asc",
+    "Date de levée": "funding_date_desc",
+    "Nom de start-up": "startup",
+}
+
+
+def history_export_data(user_id, export_format, filters, sort):
+    """Retourne la fonction qui génère un export au clic sur le bouton de téléchargement."""
+
+    def generate():
+        # Écrit sur disque au fil de la lecture plutôt que de construire l'export en
+        # mémoire ; Streamlit ne garde que les octets finaux, le fichier est fermé ici
+        with tempfile.TemporaryFile() as output:
+            history_export.export_history(
+                user_id, export_format, output, filters=filters, sort=sort
+            )
+            output.seek(0)
+            return output.read()
+
+    return generate
+
+
 # --- Interface d'Authentification ---
 def show_auth_ui():
     """Affiche les formulaires de connexion et de création de compte dans la barre latérale."""
@@ -140,6 +188,7 @@ else:
 
         if st.button("📚 Historique", type="secondary", use_container_width=True):
             st.session_state.show_history = True
+            st.session_state.history_page = 0
             st.session_state.show_dashboard = False
             st.rerun()
 
@@ -183,90 +232,144 @@ else:
         st.header("📚 Historique de vos analyses")
         st.caption("Consultez et exportez vos analyses passées.")
 
-        extractions = database.get_extractions_by_user(st.session_state.user_id)
+        change_token = app_cache.get_change_token(st.session_state.user_id)
+        total_extractions = change_token[0] if change_token else 0
 
-        if not extractions:
+        if not total_extractions:
             st.info("Vous n'avez pas encore d'analyse dans votre historique.")
         else:
-            history_data = []
-            for ext in extractions:
-                data = ext["extracted_data"]
-                if isinstance(data, str):
-                    try:
-                        data = json.loads(data)
-                    except json.JSONDecodeError:
-                        data = {"error": "invalid json"}
-
-                # Récupérer la liste des investisseurs
-                investisseurs_list = data.get("Investisseurs", [])
-                if isinstance(investisseurs_list, list):
-                    investisseurs_str = (
-                        ", ".join(investisseurs_list) if investisseurs_list else "N/A"
+            # Filtres et tri appliqués en base (database.search_extractions)
+            with st.expander("🔎 Rechercher et filtrer", expanded=False):
+                col_f1, col_f2, col_f3 = st.columns(3)
+                with col_f1:
+                    startup_filter = st.text_input(
+                        "Start-up", placeholder="Début du nom..."
                     )
-                else:
-                    investisseurs_str = (
-                        str(investisseurs_list) if investisseurs_list else "N/A"
+                    round_filter = st.selectbox(
+                        "Tour",
+                        ["Tous"]
+                        + app_cache.get_funding_rounds(
+                            st.session_state.user_id, change_token
+                        ),
+                    )
+                    sort_label = st.selectbox("Trier par", list(HISTORY_SORTS))
+                with col_f2:
+                    investor_filter = st.text_input(
+                        "Investisseur", placeholder="Nom ou partie du nom..."
+                    )
+                    amount_min = st.number_input(
+                        "Montant minimum (M€)", min_value=0.0, value=None
+                    )
+                    amount_max = st.number_input(
+                        "Montant maximum (M€)", min_value=0.0, value=None
+                    )
+                with col_f3:
+                    source_filter = st.text_input(
+                        "URL source", placeholder="Domaine ou partie de l'URL..."
+                    )
+                    date_from = st.date_input(
+                        "Levée à partir du", value=None, format="DD/MM/YYYY"
+                    )
+                    date_to = st.date_input(
+                        "Levée jusqu'au", value=None, format="DD/MM/YYYY"
                     )
 
-                # Extraire la date de levée pour séparer jour/mois/année
-                date_levee = data.get("Date_levée", "")
-                jour, mois, annee = "N/A", "N/A", "N/A"
-                if date_levee and "/" in date_levee:
-                    parts = date_levee.split("/")
-                    if len(parts) == 3:
-                        jour, mois, annee = parts[0], parts[1], parts[2]
-
-                history_data.append(
-                    {
-                        "ID": ext["id"],
-                        "Date_extraction": ext["created_at"].strftime("%Y-%m-%d %H:%M"),
-                        "Nom_start-up": data.get("Nom_start-up", "N/A"),
-                        "Type": data.get("Type", "N/A"),
-                        "Montant": data.get("Montant", "N/A"),
-                        "Date_levée": date_levee if date_levee else "N/A",
-                        "Jour": jour,
-                        "Mois": mois,
-                        "Année": annee,
-                        "Tour": data.get("Tour", "N/A"),
-                        "Investisseurs": investisseurs_str,
-                        "Lien": data.get("Lien") or ext.get("source_url", "N/A"),
-                        "data_json": json.dumps(data, indent=2, ensure_ascii=False),
-                    }
-                )
+            filters = {
+                "startup": startup_filter,
+                "investor": investor_filter,
+                "source_url": source_filter,
+                "round": None if round_filter == "Tous" else round_filter,
+                "amount_min": amount_min,
+                "amount_max": amount_max,
+                "date_from": date_from,
+                "date_to": date_to,
+            }
+            sort = HISTORY_SORTS[sort_label]
+
+            # Revenir à la première page quand les filtres ou le tri changent
+            search_key = (tuple(filters.items()), sort)
+            if st.session_state.get("history_search") != search_key:
+                st.session_state.history_search = search_key
+                st.session_state.history_page = 0
+            page = st.session_state.get("history_page", 0)
+
+            extractions, total_results = app_cache.search_extractions(
+                st.session_state.user_id,
+                change_token,
+                filters,
+                sort,
+                page,
+                HISTORY_PAGE_SIZE,
+            )
 
-            df = pd.DataFrame(history_data)
-            display_columns = [col for col in df.columns if col != "data_json"]
+            if not total_results:
+                st.info("Aucune analyse ne correspond à ces filtres.")
+            else:
+                total_pages = math.ceil(total_results / HISTORY_PAGE_SIZE)
+                df = extractions_view.get_table(
+                    st.session_state.user_id, change_token, extractions
+                )
 
-            st.dataframe(
-                df[display_columns],
-                use_container_width=True,
-                height=600,
-            )
+                st.dataframe(
+                    df,
+                    use_container_width=True,
+                    height=600,
+                )
 
-            csv = df.to_csv(index=False, encoding="utf-8-sig")
-            st.download_button(
-                label="📥 Télécharger tout l'historique en CSV",
-                data=csv,
-                file_name=f"historique_extractions_{st.session_state.username}.csv",
-                mime="text/csv",
-            )
+                col_prev, col_page, col_next = st.columns([1, 2, 1])
+                with col_prev:
+                    if st.button(
+                        "← Page précédente",
+                        disabled=page == 0,
+                        use_container_width=True,
+                    ):
+                        st.session_state.history_page = page - 1
+                        st.rerun()
+                with col_page:
+                    results_text = f"{total_results} analyse(s)"
+                    if total_results != total_extractions:
+                        results_text += f" sur {total_extractions}"
+                    st.markdown(
+                        f"<div style='text-align: center;'>Page {page + 1} / {total_pages} — {results_text}</div>",
+                        unsafe_allow_html=True,
+                    )
+                with col_next:
+                    if st.button(
+                        "Page suivante →",
+                        disabled=page + 1 >= total_pages,
+                        use_container_width=True,
+                    ):
+                        st.session_state.history_page = page + 1
+                        st.rerun()
 
-            st.subheader("Télécharger les extractions individuelles")
-            cols_per_row = 4
-            for i in range(0, len(df), cols_per_row):
-                cols = st.columns(cols_per_row)
-                for j, col in enumerate(cols):
-                    if i + j < len(df):
-                        row = df.iloc[i + j]
-                        with col:
-                            st.download_button(
-                                label=f"📥 ID {row['ID']}",
-                                data=row["data_json"],
-                                file_name=f"extraction_{row['ID']}.json",
-                                mime="application/json",
-                                key=f"download_{row['ID']}",
-                                use_container_width=True,
-                            )
+                # Exports générés au clic, en flux depuis la base (filtres et tri appliqués)
+                st.subheader("Exporter")
+                if total_results != total_extractions:
+                    st.caption(
+                        f"Les filtres s'appliquent à l'export : {total_results} analyse(s) sur {total_extractions}."
+                    )
+                export_labels = {
+                    "csv": "📥 Tableau CSV",
+                    "ndjson": "📥 JSON (une ligne par analyse)",
+                    "zip": "📥 Archive ZIP de fichiers JSON",
+                }
+                export_cols = st.columns(len(history_export.EXPORT_FORMATS))
+                for col, (export_format, (_, mime)) in zip(
+                    export_cols, history_export.EXPORT_FORMATS.items()
+                ):
+                    with col:
+                        st.download_button(
+                            label=export_labels[export_format],
+                            data=history_export_data(
+                                st.session_state.user_id, export_format, filters, sort
+                            ),
+                            file_name=history_export.default_file_name(
+                                st.session_state.username, export_format
+                            ),
+                            mime=mime,
+                            key=f"history_export_{export_format}",
+                            use_container_width=True,
+                        )
 
     elif st.session_state.selected_action == "analyse":
         # --- Interface d'Analyse ---
@@ -340,9 +443,14 @@ else:
                                 f"Le prompt système est vide. Vérifiez le fichier '{SYSTEM_PROMPT_FILE}' ou votre prompt personnalisé."
                             )
                         else:
+                            # Champs affichés au fil de la réponse du LLM (streaming)
+                            live_fields = st.empty()
                             extracted_data = extract_data_from_llm(
-                                article_text, system_prompt_to_use
+                                article_text,
+                                system_prompt_to_use,
+                                on_partial=live_fields.json,
                             )
+                            live_fields.empty()
 
                             if extracted_data:
                                 st.success("✅ Analyse terminée avec succès !")
@@ -362,6 +470,9 @@ else:
                                         extracted_data=json.dumps(extracted_data),
                                         content_hash=content_hash,
                                         source_url=source_url.strip(),
+                                        prompt_hash=extraction_cache.prompt_hash(
+                                            system_prompt_to_use
+                                        ),
                                     )
                                 if success:
                                     st.success(
@@ -473,7 +584,7 @@ else:
                         with st.spinner(f"Test de connexion à {site_format}..."):
                             try:
                                 # Créer le connecteur
-                                connector = WordPressConnector(
+                                connector = app_cache.get_wordpress_connector(
                                     st.session_state.wp_base_domain,
                                     use_subdirectory=st.session_state.wp_use_subdirectory,
                                 )
@@ -570,13 +681,10 @@ else:
                         with col_tax1:
                             # Récupérer les catégories disponibles
                             try:
-                                connector = WordPressConnector(
+                                categories = app_cache.get_wordpress_categories(
                                     st.session_state.wp_base_domain,
-                                    use_subdirectory=st.session_state.wp_use_subdirectory,
-                                )
-
-                                categories = connector.get_categories(
-                                    selected_subdomain
+                                    st.session_state.wp_use_subdirectory,
+                                    selected_subdomain,
                                 )
                                 cat_options = {
                                     cat["name"]: cat["id"] for cat in categories
@@ -598,12 +706,11 @@ else:
                         with col_tax2:
                             # Récupérer les tags disponibles
                             try:
-                                connector = WordPressConnector(
+                                tags = app_cache.get_wordpress_tags(
                                     st.session_state.wp_base_domain,
-                                    use_subdirectory=st.session_state.wp_use_subdirectory,
+                                    st.session_state.wp_use_subdirectory,
+                                    selected_subdomain,
                                 )
-
-                                tags = connector.get_tags(selected_subdomain)
                                 tag_options = {tag["name"]: tag["id"] for tag in tags}
                                 selected_tags = st.multiselect(
                                     "🔖 Tags",
@@ -739,7 +846,7 @@ else:
                 if load_button:
                     with st.spinner("Chargement des articles..."):
                         try:
-                            connector = WordPressConnector(
+                            connector = app_cache.get_wordpress_connector(
                                 st.session_state.wp_base_domain,
                                 use_subdirectory=st.session_state.wp_use_subdirectory,
                             )
@@ -831,6 +938,12 @@ else:
                             f"**{len(st.session_state.wp_selected_post_ids)} article(s) sélectionné(s)**"
                         )
 
+                        skip_existing = st.checkbox(
+                            "Ignorer les articles déjà extraits",
+                            value=True,
+                            help="Les articles déjà extraits avec le prompt sélectionné ne sont pas renvoyés au LLM. Après un changement de prompt, ils sont ré-extraits.",
+                        )
+
                         if st.button(
                             "🤖 Lancer l'extraction LLM et sauvegarder", type="primary"
                         ):
@@ -858,11 +971,10 @@ else:
 
                             success_count = 0
                             error_count = 0
-                            total = len(st.session_state.wp_selected_post_ids)
 
-                            for idx, post_id in enumerate(
-                                st.session_state.wp_selected_post_ids
-                            ):
+                            # Préparer les articles sélectionnés
+                            selected_posts = []
+                            for post_id in st.session_state.wp_selected_post_ids:
                                 # Trouver le post correspondant
                                 post = next(
                                     (
@@ -875,56 +987,89 @@ else:
                                 if not post:
                                     continue
 
-                                status_text.text(
-                                    f"Traitement de '{post['title'][:50]}...' ({idx + 1}/{total})"
+                                # Extraire le contenu texte
+                                article_text = connector.strip_html_tags(
+                                    post["content"]
                                 )
-
-                                try:
-                                    # Extraire le contenu texte
-                                    article_text = connector.strip_html_tags(
-                                        post["content"]
-                                    )
-
-                                    # Ajouter l'URL WordPress au texte pour que le LLM puisse l'extraire
-                                    article_text_with_url = (
-                                        f"{article_text}\n\nSource: {post['link']}"
-                                    )
-
-                                    # Extraction LLM
-                                    extracted_data = extract_data_from_llm(
-                                        article_text_with_url, system_prompt_to_use
+                                selected_posts.append((post, article_text))
+
+                            # Vérification groupée des articles déjà en base, avant tout appel au LLM
+                            skipped_count = 0
+                            if skip_existing and selected_posts:
+                                new_posts = list(
+                                    skip_existing_jobs(
+                                        selected_posts,
+                                        st.session_state.user_id,
+                                        system_prompt_to_use,
                                     )
+                                )
+                                skipped_count = len(selected_posts) - len(new_posts)
+                                selected_posts = new_posts
 
-                                    if extracted_data:
-                                        # Calculer le hash
-                                        content_hash = database.calculate_content_hash(
-                                            article_text
-                                        )
+                            total = len(selected_posts)
+                            progress = {"completed": 0}
+                            extraction_errors = []
 
-                                        # Sauvegarder avec l'URL de l'article WordPress
-                                        success, message = database.add_extraction(
-                                            user_id=st.session_state.user_id,
-                                            original_content=article_text,
-                                            extracted_data=json.dumps(extracted_data),
-                                            content_hash=content_hash,
-                                            source_url=post["link"],
-                                        )
-
-                                        if success:
-                                            success_count += 1
-                                        else:
-                                            error_count += 1
-                                    else:
-                                        error_count += 1
+                            def on_extraction_done(index, extracted_data):
+                                progress["completed"] += 1
+                                status_text.text(
+                                    f"Extraction de '{selected_posts[index][0]['title'][:50]}...' terminée ({progress['completed']}/{total})"
+                                )
+                                # Mettre à jour la barre de progression
+                                progress_bar.progress(progress["completed"] / total)
 
-                                except Exception as e:
-                                    st.warning(
-                                        f"Erreur pour '{post['title']}': {str(e)}"
+                            # Extraction LLM concurrente sur une seule boucle asyncio
+                            # (l'URL WordPress est ajoutée au texte pour que le LLM puisse l'extraire)
+                            status_text.text(
+                                f"Extraction LLM de {total} article(s) en parallèle..."
+                            )
+                            extraction_results = extract_many(
+                                [
+                                    f"{article_text}\n\nSource: {post['link']}"
+                                    for post, article_text in selected_posts
+                                ],
+                                system_prompt_to_use,
+                                on_result=on_extraction_done,
+                                on_error=lambda index, error: extraction_errors.append(
+                                    (selected_posts[index][0]["title"], error)
+                                ),
+                            )
+                            for title, error in extraction_errors:
+                                st.warning(f"Erreur pour '{title}': {str(error)}")
+
+                            # Sauvegarde par paquets, une transaction par paquet,
+                            # avec l'URL de l'article WordPress
+                            save_results = []
+                            status_text.text("Sauvegarde dans votre historique...")
+                            writer = BulkExtractionWriter(
+                                st.session_state.user_id,
+                                on_flush=lambda post_titles, success, message: (
+                                    save_results.append(
+                                        (len(post_titles), success, message)
+                                    )
+                                ),
+                                system_prompt=system_prompt_to_use,
+                            )
+                            for (post, article_text), extracted_data in zip(
+                                selected_posts, extraction_results
+                            ):
+                                if extracted_data:
+                                    writer.add(
+                                        post["title"],
+                                        article_text,
+                                        extracted_data,
+                                        source_url=post["link"],
                                     )
+                                else:
                                     error_count += 1
+                            writer.flush()
 
-                                # Mettre à jour la barre de progression
-                                progress_bar.progress((idx + 1) / total)
+                            for saved_count, success, message in save_results:
+                                if success:
+                                    success_count += saved_count
+                                else:
+                                    st.warning(f"Erreur de sauvegarde : {message}")
+                                    error_count += saved_count
 
                             status_text.empty()
                             progress_bar.empty()
@@ -936,6 +1081,10 @@ else:
                                 )
                             if error_count > 0:
                                 st.warning(f"⚠️ {error_count} article(s) ont échoué.")
+                            if skipped_count > 0:
+                                st.info(
+                                    f"⏭️ {skipped_count} article(s) déjà extrait(s), ignoré(s)."
+                                )
 
                             # Réinitialiser la sélection
                             st.session_state.wp_selected_post_ids = []
@@ -988,38 +1137,33 @@ else:
 
         # Aperçu des extractions disponibles
         st.subheader("📊 Aperçu de vos extractions")
-        extractions = database.get_extractions_by_user(st.session_state.user_id)
+        change_token = app_cache.get_change_token(st.session_state.user_id)
+        total_extractions = change_token[0] if change_token else 0
 
-        if extractions:
+        if total_extractions:
             st.info(
-                f"**{len(extractions)} extraction(s)** disponible(s) dans votre historique"
+                f"**{total_extractions} extraction(s)** disponible(s) dans votre historique"
             )
 
-            # Tableau récapitulatif
-            export_data = []
-            for ext in extractions[:10]:  # Limite à 10 pour l'aperçu
-                data = ext["extracted_data"]
-                if isinstance(data, str):
-                    try:
-                        data = json.loads(data)
-                    except:
-                        data = {}
-
-                export_data.append(
-                    {
-                        "ID": ext["id"],
-                        "Date": ext["created_at"].strftime("%Y-%m-%d"),
-                        "Entreprise": data.get("Nom_start-up", "N/A"),
-                        "Montant": data.get("Montant", "N/A"),
-                    }
-                )
-
-            df_export = pd.DataFrame(export_data)
+            # Tableau récapitulatif, limité à 10 pour l'aperçu
+            extractions = app_cache.get_extractions_page(
+                st.session_state.user_id,
+                change_token,
+                10,
+                fields=("id", "extracted_data", "created_at"),
+            )
+            table = extractions_view.get_table(
+                st.session_state.user_id, change_token, extractions
+            )
+            df_export = table[
+                ["ID", "Date_extraction", "Nom_start-up", "Montant"]
+            ].rename(columns={"Date_extraction": "Date", "Nom_start-up": "Entreprise"})
+            df_export["Date"] = df_export["Date"].str[:10]
             st.dataframe(df_export, use_container_width=True)
 
-            if len(extractions) > 10:
+            if total_extractions > 10:
                 st.caption(
-                    f"Affichage des 10 premières extractions sur {len(extractions)} disponibles"
+                    f"Affichage des 10 premières extractions sur {total_extractions} disponibles"
                 )
         else:
             st.warning(
@@ -1036,10 +1180,11 @@ else:
         st.caption("Exportez vos analyses vers une feuille Google Sheets")
         st.markdown("<br>", unsafe_allow_html=True)
 
-        # Récupérer les extractions
-        extractions = database.get_extractions_by_user(st.session_state.user_id)
+        # Récupérer le nombre d'extractions (les lignes ne sont chargées qu'au besoin)
+        change_token = app_cache.get_change_token(st.session_state.user_id)
+        total_extractions = change_token[0] if change_token else 0
 
-        if not extractions:
+        if not total_extractions:
             st.warning(
                 "Aucune extraction disponible. Effectuez d'abord des analyses d'articles."
             )
@@ -1048,7 +1193,7 @@ else:
             st.markdown('<div class="card">', unsafe_allow_html=True)
             st.subheader("1️⃣ Sélectionner les extractions à exporter")
             st.info(
-                f"**{len(extractions)} extraction(s)** disponible(s) dans votre historique"
+                f"**{total_extractions} extraction(s)** disponible(s) dans votre historique"
             )
 
             # Initialiser la liste de sélection
@@ -1060,23 +1205,29 @@ else:
             with col_select1:
                 select_all = st.checkbox("Tout sélectionner", value=False)
                 if select_all:
-                    st.session_state.gsheet_selected_ids = [
-                        ext["id"] for ext in extractions
-                    ]
-                elif not select_all and len(
-                    st.session_state.gsheet_selected_ids
-                ) == len(extractions):
+                    if len(st.session_state.gsheet_selected_ids) != total_extractions:
+                        st.session_state.gsheet_selected_ids = (
+                            app_cache.get_extraction_ids(
+                                st.session_state.user_id, change_token
+                            )
+                        )
+                elif (
+                    not select_all
+                    and len(st.session_state.gsheet_selected_ids) == total_extractions
+                ):
                     st.session_state.gsheet_selected_ids = []
 
-            # Afficher les extractions avec checkboxes
-            for ext in extractions[:20]:  # Limite à 20 pour l'affichage
-                data = ext["extracted_data"]
-                if isinstance(data, str):
-                    try:
-                        data = json.loads(data)
-                    except:
-                        data = {}
-
+            # Afficher les extractions avec checkboxes (limité à 20 pour l'affichage)
+            extractions = app_cache.get_extractions_page(
+                st.session_state.user_id,
+                change_token,
+                20,
+                fields=("id", "extracted_data", "created_at"),
+            )
+            table = extractions_view.get_table(
+                st.session_state.user_id, change_token, extractions
+            )
+            for ext, row in zip(extractions, table.to_dict("records")):
                 col1, col2 = st.columns([1, 20])
                 with col1:
                     is_selected = st.checkbox(
@@ -1097,12 +1248,12 @@ else:
 
                 with col2:
                     st.markdown(
-                        f"**{data.get('Nom_start-up', 'N/A')}** - {data.get('Montant', 'N/A')} - {ext['created_at'].strftime('%d/%m/%Y')}"
+                        f"**{row['Nom_start-up']}** - {row['Montant']} - {ext['created_at'].strftime('%d/%m/%Y')}"
                     )
 
-            if len(extractions) > 20:
+            if total_extractions > 20:
                 st.caption(
-                    f"Affichage des 20 premières sur {len(extractions)} disponibles"
+                    f"Affichage des 20 premières sur {total_extractions} disponibles"
                 )
 
             st.markdown("</div>", unsafe_allow_html=True)
@@ -1153,45 +1304,27 @@ else:
                     use_container_width=True,
                 ):
                     # Préparer les données pour l'aperçu
-                    preview_data = []
-                    for ext in extractions:
-                        if ext["id"] in st.session_state.gsheet_selected_ids:
-                            data = ext["extracted_data"]
-                            if isinstance(data, str):
-                                try:
-                                    data = json.loads(data)
-                                except:
-                                    data = {}
-
-                            # Récupérer la liste des investisseurs
-                            investisseurs_list = data.get("Investisseurs", [])
-                            if isinstance(investisseurs_list, list):
-                                investisseurs_str = (
-                                    ", ".join(investisseurs_list)
-                                    if investisseurs_list
-                                    else ""
-                                )
-                            else:
-                                investisseurs_str = (
-                                    str(investisseurs_list)
-                                    if investisseurs_list
-                                    else ""
-                                )
-
-                            preview_data.append(
-                                {
-                                    "Nom_start-up": data.get("Nom_start-up", ""),
-                                    "Type": data.get("Type", ""),
-                                    "Montant": data.get("Montant", ""),
-                                    "Date_levée": data.get("Date_levée", ""),
-                                    "Tour": data.get("Tour", ""),
-                                    "Investisseurs": investisseurs_str,
-                                    "Lien": data.get("Lien")
-                                    or ext.get("source_url", ""),
-                                }
-                            )
-
-                    df_preview = pd.DataFrame(preview_data)
+                    selected_table = extractions_view.get_table(
+                        st.session_state.user_id,
+                        change_token,
+                        app_cache.get_extractions_by_ids(
+                            st.session_state.user_id,
+                            change_token,
+                            tuple(st.session_state.gsheet_selected_ids),
+                        ),
+                        missing="",
+                    )
+                    df_preview = selected_table[
+                        [
+                            "Nom_start-up",
+                            "Type",
+                            "Montant",
+                            "Date_levée",
+                            "Tour",
+                            "Investisseurs",
+                            "Lien",
+                        ]
+                    ]
                     st.dataframe(df_preview, use_container_width=True)
 
                 st.markdown("<br>", unsafe_allow_html=True)
@@ -1268,7 +1401,6 @@ else:
                                             )
 
                                         # Préparer les données
-                                        export_data = []
                                         headers = [
                                             "Nom_start-up",
                                             "Type",
@@ -1282,62 +1414,23 @@ else:
                                             "Lien",
                                         ]
 
-                                        for ext in extractions:
-                                            if (
-                                                ext["id"]
-                                                in st.session_state.gsheet_selected_ids
-                                            ):
-                                                data = ext["extracted_data"]
-                                                if isinstance(data, str):
-                                                    try:
-                                                        data = json.loads(data)
-                                                    except:
-                                                        data = {}
-
-                                                # Extraire date et ses composants
-                                                date_levee = data.get("Date_levée", "")
-                                                jour, mois, annee = "", "", ""
-                                                if date_levee and "/" in date_levee:
-                                                    parts = date_levee.split("/")
-                                                    if len(parts) == 3:
-                                                        jour, mois, annee = (
-                                                            parts[0],
-                                                            parts[1],
-                                                            parts[2],
-                                                        )
-
-                                                # Récupérer les investisseurs
-                                                investisseurs_list = data.get(
-                                                    "Investisseurs", []
-                                                )
-                                                if isinstance(investisseurs_list, list):
-                                                    investisseurs_str = (
-                                                        ", ".join(investisseurs_list)
-                                                        if investisseurs_list
-                                                        else ""
-                                                    )
-                                                else:
-                                                    investisseurs_str = (
-                                                        str(investisseurs_list)
-                                                        if investisseurs_list
-                                                        else ""
-                                                    )
-
-                                                row = [
-                                                    data.get("Nom_start-up", ""),
-                                                    data.get("Type", ""),
-                                                    data.get("Montant", ""),
-                                                    date_levee,
-                                                    jour,
-                                                    mois,
-                                                    annee,
-                                                    data.get("Tour", ""),
-                                                    investisseurs_str,
-                                                    data.get("Lien")
-                                                    or ext.get("source_url", ""),
-                                                ]
-
-                                                export_data.append(row)
+                                        selected_table = extractions_view.get_table(
+                                            st.session_state.user_id,
+                                            change_token,
+                                            app_cache.get_extractions_by_ids(
+                                                st.session_state.user_id,
+                                                change_token,
+                                                tuple(
+                                                    st.session_state.gsheet_selected_ids
+                                                ),
+                                            ),
+                                            missing="",
+                                        )
+                                        export_data = (
+                                            selected_table[headers]
+                                            .astype(object)
+                                            .values.tolist()
+                                        )
 
                                         # Exporter selon le mode
                                         if (
@@ -1420,7 +1513,12 @@ else:
         st.caption("Vue d'ensemble de votre activité")
         st.markdown("<br>", unsafe_allow_html=True)
 
-        extractions = database.get_extractions_by_user(st.session_state.user_id)
+        stats = app_cache.get_extraction_stats(
+            st.session_state.user_id,
+            app_cache.get_change_token(st.session_state.user_id),
+            days=30,
+        )
+        total_extractions = stats["total"]
 
         # Statistiques principales
         col_stat1, col_stat2, col_stat3 = st.columns(3)
@@ -1431,7 +1529,7 @@ else:
             <div class="metric-card" style="padding: 2rem;">
                 <h4 style="color: #6B7280; margin-bottom: 1rem; font-size: 0.9rem; text-transform: uppercase;">Total analyses</h4>
                 <h1 style="color: #7C3AED; margin: 0; font-size: 3rem;">"""
-                + str(len(extractions))
+                + str(total_extractions)
                 + """</h1>
                 <p style="color: #9CA3AF; margin-top: 0.5rem; font-size: 0.85rem;">Analyses effectuées</p>
             </div>
@@ -1440,9 +1538,8 @@ else:
             )
 
         with col_stat2:
-            last_extraction = extractions[0] if extractions else None
-            if last_extraction:
-                last_date = last_extraction["created_at"].strftime("%d/%m/%Y")
+            if stats["latest"]:
+                last_date = stats["latest"].strftime("%d/%m/%Y")
                 st.markdown(
                     """
                 <div class="metric-card" style="padding: 2rem;">
@@ -1468,8 +1565,8 @@ else:
                 )
 
         with col_stat3:
-            status_text = "✓ Actif" if extractions else "○ En attente"
-            status_color = "#10B981" if extractions else "#F59E0B"
+            status_text = "✓ Actif" if total_extractions else "○ En attente"
+            status_color = "#10B981" if total_extractions else "#F59E0B"
             st.markdown(
                 """
             <div class="metric-card" style="padding: 2rem;">
@@ -1488,32 +1585,22 @@ else:
         st.markdown("<br><br>", unsafe_allow_html=True)
 
         # Graphique d'activité récente
-        if extractions and len(extractions) > 0:
+        if total_extractions:
             st.subheader("📈 Activité récente")
 
-            # Créer un DataFrame pour les analyses des 30 derniers jours
-            from datetime import timedelta
-
-            thirty_days_ago = datetime.now() - timedelta(days=30)
-            recent_extractions = [
-                ext for ext in extractions if ext["created_at"] >= thirty_days_ago
-            ]
-
-            if recent_extractions:
-                # Compter par jour
-                dates_count = {}
-                for ext in recent_extractions:
-                    date_key = ext["created_at"].strftime("%Y-%m-%d")
-                    dates_count[date_key] = dates_count.get(date_key, 0) + 1
-
+            # Nombre d'analyses par jour sur les 30 derniers jours (calculé en base)
+            if stats["daily"]:
                 chart_df = pd.DataFrame(
-                    list(dates_count.items()), columns=["Date", "Analyses"]
+                    [
+                        (day.strftime("%Y-%m-%d"), count)
+                        for day, count in stats["daily"]
+                    ],
+                    columns=["Date", "Analyses"],
                 )
-                chart_df = chart_df.sort_values("Date")
 
                 st.line_chart(chart_df.set_index("Date"))
                 st.caption(
-                    f"📊 {len(recent_extractions)} analyses effectuées ces 30 derniers jours"
+                    f"📊 {chart_df['Analyses'].sum()} analyses effectuées ces 30 derniers jours"
                 )
             else:
                 st.info("Aucune analyse récente dans les 30 derniers jours")
@@ -1583,7 +1670,7 @@ else:
         st.markdown("**Choisissez le type d'analyse :**")
 
         # Récupérer les prompts disponibles
-        available_prompts = prompt_manager.get_available_prompts()
+        available_prompts = app_cache.get_available_prompts()
 
         # Déterminer le prompt actuellement sélectionné
         current_prompt_id = (
@@ -1592,7 +1679,7 @@ else:
             else None
         )
         if not current_prompt_id:
-            current_prompt_id = prompt_manager.get_default_prompt_id()
+            current_prompt_id = app_cache.get_default_prompt_id()
 
         # Créer les options pour le selectbox
         prompt_options = {
@@ -1617,7 +1704,7 @@ else:
         selected_prompt_id = prompt_options[selected_label]
 
         # Afficher la description du prompt sélectionné
-        prompt_info = prompt_manager.get_prompt_info(selected_prompt_id)
+        prompt_info = app_cache.get_prompt_info(selected_prompt_id)
         if prompt_info:
             st.caption(prompt_info["description"])
 
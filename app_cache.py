@@ -0,0 +1,134 @@
+"""
+Cache Streamlit des données affichées par l'application
+
+Les lectures de l'historique sont mises en cache par utilisateur avec pour clé le
+jeton de modification de la base (`database.get_change_token`). Ce jeton n'est
+lui-même relu qu'après une écriture faite par ce processus (`database.mark_user_changed`,
+appelé par add_extraction, add_extractions_bulk et update_user_prompt) : cocher une case
+ou changer de page ne renvoie plus de requête déjà faite. Le TTL rattrape les écritures
+faites par un autre processus (script CLI, autre instance).
+"""
+
+import os
+
+import streamlit as st
+
+import database
+import prompt_manager
+from wordpress_connector import WordPressConnector
+
+# Durée de vie (secondes) des données de l'historique en cache
+CACHE_TTL = float(os.getenv("APP_CACHE_TTL", "300"))
+# Durée de vie des catégories/tags WordPress et de la configuration des prompts
+WP_CACHE_TTL = float(os.getenv("WP_CACHE_TTL", "3600"))
+PROMPTS_CACHE_TTL = float(os.getenv("PROMPTS_CACHE_TTL", "60"))
+
+
+# --- Historique des extractions ---
+
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def _change_token(user_id, version):
+    return database.get_change_token(user_id)
+
+
+def get_change_token(user_id):
+    """Jeton de l'historique, relu en base seulement après une écriture (ou après CACHE_TTL)."""
+    version = database.get_user_version(user_id)
+    token = _change_token(user_id, version)
+    if token is None:
+        # Ne pas garder un échec de connexion en cache
+        _change_token.clear(user_id, version)
+    return token
+
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def search_extractions(user_id, change_token, filters, sort, page, page_size):
+    """Version en cache de database.search_extractions."""
+    extractions, total = database.search_extractions(
+        user_id, filters, sort=sort, page=page, page_size=page_size
+    )
+    return [dict(ext) for ext in extractions], total
+
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def get_extractions_page(user_id, change_token, limit, fields=None):
+    """Version en cache de la première page de database.get_extractions_page."""
+    extractions, _ = database.get_extractions_page(user_id, limit=limit, fields=fields)
+    return [dict(ext) for ext in extractions]
+
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def get_extractions_by_ids(user_id, change_token, extraction_ids):
+    """Version en cache de database.get_extractions_by_ids."""
+    return [
+        dict(ext)
+        for ext in database.get_extractions_by_ids(user_id, list(extraction_ids))
+    ]
+
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def get_extraction_ids(user_id, change_token):
+    """Version en cache de database.get_extraction_ids."""
+    return database.get_extraction_ids(user_id)
+
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def get_funding_rounds(user_id, change_token):
+    """Version en cache de database.get_funding_rounds."""
+    return database.get_funding_rounds(user_id)
+
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def get_extraction_stats(user_id, change_token, days=30):
+    """Version en cache de database.get_extraction_stats."""
+    return database.get_extraction_stats(user_id, days=days)
+
+
+# --- Prompts ---
+
+
+@st.cache_data(ttl=PROMPTS_CACHE_TTL, show_spinner=False)
+def get_available_prompts():
+    """Version en cache de prompt_manager.get_available_prompts."""
+    return prompt_manager.get_available_prompts()
+
+
+def get_default_prompt_id():
+    """ID du prompt par défaut, lu dans la configuration en cache."""
+    prompts = get_available_prompts()
+    for prompt in prompts:
+        if prompt.get("default", False):
+            return prompt["id"]
+    return prompts[0]["id"] if prompts else None
+
+
+def get_prompt_info(prompt_id):
+    """Informations d'un prompt, lues dans la configuration en cache."""
+    for prompt in get_available_prompts():
+        if prompt["id"] == prompt_id:
+            return prompt
+    return None
+
+
+# --- WordPress ---
+
+
+@st.cache_resource(show_spinner=False)
+def get_wordpress_connector(base_domain, use_subdirectory=False):
+    """Connecteur WordPress partagé par toutes les sessions pour un même site."""
+    return WordPressConnector(base_domain, use_subdirectory=use_subdirectory)
+
+
+@st.cache_data(ttl=WP_CACHE_TTL, show_spinner=False)
+def get_wordpress_categories(base_domain, use_subdirectory, subdomain):
+    """Catégories d'un site WordPress, mises en cache."""
+    return get_wordpress_connector(base_domain, use_subdirectory).get_categories(
+        subdomain
+    )
+
+
+@st.cache_data(ttl=WP_CACHE_TTL, show_spinner=False)
+def get_wordpress_tags(base_domain, use_subdirectory, subdomain):
+    """Tags d'un site WordPress, mis en cache."""
+    return get_wordpress_connector(base_domain, use_subdirectory).get_tags(subdomain)
@@ -0,0 +1,173 @@
+"""
+Préparation des articles longs avant extraction
+
+- `trim_boilerplate` retire ce qui n'apporte rien à l'extraction : sections « À propos »,
+  contacts presse, mentions légales et lignes de navigation/partage.
+- `split_chunks` découpe un texte trop long en morceaux qui tiennent dans un budget de
+  tokens, en coupant entre paragraphes (puis entre phrases si un paragraphe dépasse).
+- `merge_extractions` fusionne les JSON extraits de chaque morceau en un seul.
+"""
+
+import re
+
+import token_counter
+
+# Titre de section à partir duquel la fin d'un communiqué est du texte standard
+BOILERPLATE_SECTION = re.compile(
+    r"^\W*("
+    r"[àa] propos d[eu'’]"
+    r"|about\s"
+    r"|contacts? (presse|m[ée]dias?)"
+    r"|press contacts?"
+    r"|media contacts?"
+    r"|mentions l[ée]gales"
+    r"|avertissement"
+    r"|disclaimer"
+    r"|d[ée]clarations prospectives"
+    r"|forward[- ]looking statements"
+    r"|###\s*$"
+    r")",
+    re.IGNORECASE,
+)
+# Un titre de section est une ligne courte, sans ponctuation de phrase : « About 40 new
+# jobs will be created. » ou « Avertissement : chiffres provisoires. » restent du contenu
+MAX_SECTION_TITLE_LENGTH = 80
+SENTENCE_PUNCTUATION = re.compile(r"[.!?;…]\s*$|[.!?…]\s+\S")
+
+# Lignes isolées sans information (partage, navigation, cookies...)
+NOISE_LINE = re.compile(
+    r"^\W*("
+    r"partager( sur| cet article)?"
+    r"|lire aussi"
+    r"|[àa] lire aussi"
+    r"|suivez[- ]nous"
+    r"|abonnez[- ]vous"
+    r"|newsletter"
+    r"|tous droits r[ée]serv[ée]s"
+    r"|all rights reserved"
+    r"|(ce site|nous) utilis(e|ons) des cookies"
+    r"|accepter (les|tous les) cookies"
+    r")\b.{0,60}$",
+    re.IGNORECASE,
+)
+
+SENTENCE_END = re.compile(r"(?<=[.!?…])\s+")
+
+
+def _is_boilerplate_title(line):
+    """Indique si la ligne est un titre de section standard (« À propos de ... », « Contacts presse »)."""
+    return (
+        len(line) <= MAX_SECTION_TITLE_LENGTH
+        and BOILERPLATE_SECTION.match(line) is not None
+        and SENTENCE_PUNCTUATION.search(line) is None
+    )
+
+
+def trim_boilerplate(text):
+    """
+    Retire les sections standard de fin de communiqué et les lignes de bruit.
+
+    Une section n'est coupée que si son titre arrive après le premier paragraphe :
+    un article qui commence par « À propos de ... » est gardé tel quel. Le titre doit
+    être une ligne à part, sans ponctuation de phrase (voir `_is_boilerplate_title`).
+    """
+    lines = text.splitlines()
+    kept = []
+    seen_content = False
+    for line in lines:
+        stripped = line.strip()
+        if seen_content and _is_boilerplate_title(stripped):
+            break
+        if stripped and NOISE_LINE.match(stripped):
+            continue
+        if stripped:
+            seen_content = True
+        kept.append(line)
+    trimmed = "\n".join(kept).strip()
+    return trimmed or text
+
+
+def _split_paragraph(paragraph, max_tokens, model):
+    """Découpe un paragraphe trop long entre phrases, puis en tranches de caractères."""
+    pieces = []
+    for sentence in SENTENCE_END.split(paragraph):
+        if token_counter.count_tokens(sentence, model) <= max_tokens:
+            pieces.append(sentence)
+            continue
+        # Phrase démesurée (tableau, liste sans ponctuation) : tranches de taille fixe
+        step = max(1, max_tokens * token_counter.CHARS_PER_TOKEN // 2)
+        pieces.extend(sentence[i : i + step] for i in range(0, len(sentence), step))
+    return pieces
+
+
+def split_chunks(text, max_tokens, model=None):
+    """
+    Découpe `text` en morceaux d'au plus `max_tokens` tokens.
+
+    Les coupures se font entre paragraphes ; un texte qui tient dans le budget est
+    renvoyé en un seul morceau.
+    """
+    if token_counter.count_tokens(text, model) <= max_tokens:
+        return [text]
+
+    units = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if token_counter.count_tokens(paragraph, model) <= max_tokens:
+            units.append((paragraph, "\n\n"))
+        else:
+            units.extend(
+                (piece, " ") for piece in _split_paragraph(paragraph, max_tokens, model)
+            )
+
+    chunks = []
+    current = ""
+    current_tokens = 0
+    for unit, separator in units:
+        unit_tokens = token_counter.count_tokens(unit, model)
+        if current and current_tokens + unit_tokens > max_tokens:
+            chunks.append(current)
+            current, current_tokens = "", 0
+        current = f"{current}{separator}{unit}" if current else unit
+        # Approximation : le séparateur compte pour un token au plus
+        current_tokens += unit_tokens + 1
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def is_empty(value):
+    """Indique si une valeur extraite est vide (None, chaîne vide, "N/A", liste vide...)."""
+    if value is None:
+        return True
+    if isinstance(value, str):
+        return value.strip().lower() in ("", "n/a", "null", "none", "inconnu")
+    if isinstance(value, (list, dict)):
+        return not value
+    return False
+
+
+def merge_extractions(results):
+    """
+    Fusionne les JSON extraits de chaque morceau d'un article.
+
+    Pour chaque champ, la première valeur renseignée (dans l'ordre du texte) l'emporte ;
+    les listes (investisseurs...) sont réunies sans doublon.
+    """
+    merged = {}
+    for result in results:
+        if not isinstance(result, dict):
+            continue
+        for key, value in result.items():
+            current = merged.get(key)
+            if key not in merged or is_empty(current):
+                merged[key] = list(value) if isinstance(value, list) else value
+            elif isinstance(current, list) and isinstance(value, list):
+                seen = {str(item).strip().lower() for item in current}
+                for item in value:
+                    if not is_empty(item) and str(item).strip().lower() not in seen:
+                        current.append(item)
+                        seen.add(str(item).strip().lower())
+    return merged
@@ -0,0 +1,353 @@
+"""
+Mode batch : extraction via l'API Batch d'OpenAI pour les gros traitements hors ligne
+
+Les articles (CSV ou dossier a_traiter) sont convertis en fichiers JSONL, soumis à
+l'API Batch, puis les résultats sont relus et enregistrés via `database.add_extraction`.
+Chaque job possède un manifeste sur disque (batch_jobs/<job_id>/manifest.json) mis à
+jour à chaque étape : un job interrompu reprend là où il s'était arrêté.
+
+Pour tester sans OpenAI, pointez OPENAI_BASE_URL vers un faux serveur Batch local (voir
+tests/test_batch_api.py).
+"""
+
+import csv
+import json
+import os
+import shutil
+import time
+from datetime import datetime
+
+import database
+import extraction_cache
+import llm_client
+import run_extraction
+
+BATCH_JOBS_DIR = os.getenv("BATCH_JOBS_DIR", "batch_jobs")
+BATCH_ENDPOINT = "/v1/chat/completions"
+BATCH_COMPLETION_WINDOW = "24h"
+# Limite de l'API Batch : nombre maximal de requêtes par fichier soumis
+BATCH_MAX_REQUESTS = int(os.getenv("BATCH_MAX_REQUESTS", "50000"))
+BATCH_POLL_INTERVAL = float(os.getenv("BATCH_POLL_INTERVAL", "60"))
+
+# Statuts terminaux d'un batch côté API
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+# --- Manifeste ---
+
+
+def _manifest_path(job_dir):
+    return os.path.join(job_dir, "manifest.json")
+
+
+def load_manifest(job_dir):
+    """Charge le manifeste d'un job."""
+    with open(_manifest_path(job_dir), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(manifest):
+    """Écrit le manifeste de façon atomique (fichier temporaire puis renommage)."""
+    path = _manifest_path(manifest["job_dir"])
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+# --- Préparation ---
+
+
+def iter_csv_jobs(csv_file):
+    """Retourne les articles `(cle, texte)` d'un CSV (colonne détectée comme en mode synchrone)."""
+    with open(csv_file, "r", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        content_column = run_extraction.detect_content_column(reader.fieldnames)
+        if not content_column:
+            raise ValueError(
+                f"Aucune colonne de contenu trouvée dans le CSV (attendu: {', '.join(run_extraction.CSV_CONTENT_COLUMNS)})."
+            )
+        for row_num, row in enumerate(reader, start=2):
+            article_content = row.get(content_column, "").strip()
+            if article_content:
+                yield f"ligne {row_num}", article_content
+
+
+def iter_directory_jobs(source_dir=run_extraction.SOURCE_DIR):
+    """Retourne les articles `(nom_de_fichier, texte)` des fichiers .txt du dossier source."""
+    for filename in sorted(os.listdir(source_dir)):
+        if not filename.endswith(".txt"):
+            continue
+        with open(os.path.join(source_dir, filename), "r", encoding="utf-8") as f:
+            article_content = f.read()
+        if article_content.strip():
+            yield filename, article_content
+
+
+def _batch_request(custom_id, article_text, system_prompt):
+    """Construit une ligne JSONL de requête Batch (même requête que le mode synchrone)."""
+    return {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": BATCH_ENDPOINT,
+        "body": run_extraction._openai_request(
+            run_extraction._build_history(article_text, system_prompt),
+            schema=run_extraction._output_schema(system_prompt),
+        ),
+    }
+
+
+def create_job(user_id, system_prompt, jobs, source, jobs_dir=BATCH_JOBS_DIR):
+    """
+    Écrit les fichiers d'entrée JSONL d'un nouveau job et son manifeste.
+
+    `jobs` est un itérable de `(cle, texte)` ; `source` décrit l'origine ("csv" ou "directory").
+    Les requêtes sont réparties en plusieurs fichiers au-delà de BATCH_MAX_REQUESTS.
+    Retourne None (sans rien écrire) s'il n'y a aucun article.
+    """
+    jobs = iter(jobs)
+    job = next(jobs, None)
+    if job is None:
+        return None
+
+    job_id = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    job_dir = os.path.join(jobs_dir, job_id)
+    os.makedirs(job_dir, exist_ok=True)
+
+    parts = []
+    count = 0
+    while job is not None:
+        index = len(parts)
+        part = {
+            "index": index,
+            "input_path": os.path.join(job_dir, f"input_{index:03d}.jsonl"),
+            "articles_path": os.path.join(job_dir, f"articles_{index:03d}.jsonl"),
+            "request_count": 0,
+            "status": "created",
+            "input_file_id": None,
+            "batch_id": None,
+            "output_file_id": None,
+            "error_file_id": None,
+            "ingested": False,
+        }
+        parts.append(part)
+
+        with (
+            open(part["input_path"], "w", encoding="utf-8") as input_file,
+            open(part["articles_path"], "w", encoding="utf-8") as articles_file,
+        ):
+            while job is not None and part["request_count"] < BATCH_MAX_REQUESTS:
+                key, article_text = job
+                custom_id = f"article-{count}"
+                input_file.write(
+                    json.dumps(
+                        _batch_request(custom_id, article_text, system_prompt),
+                        ensure_ascii=False,
+                    )
+                    + "\n"
+                )
+                articles_file.write(
+                    json.dumps(
+                        {"custom_id": custom_id, "key": key, "content": article_text},
+                        ensure_ascii=False,
+                    )
+                    + "\n"
+                )
+                part["request_count"] += 1
+                count += 1
+                job = next(jobs, None)
+
+    manifest = {
+        "job_id": job_id,
+        "job_dir": job_dir,
+        "user_id": user_id,
+        "source": source,
+        "model": run_extraction.OPENAI_MODEL,
+        "system_prompt": system_prompt,
+        "request_count": count,
+        "created_at": datetime.now().isoformat(),
+        "status": "created",
+        "parts": parts,
+        "results": {"success": 0, "errors": 0},
+    }
+    save_manifest(manifest)
+    return manifest
+
+
+# --- Soumission, suivi et ingestion ---
+
+
+def _get_client():
+    return llm_client.get_openai_client(run_extraction.OPENAI_API_KEY)
+
+
+def submit_job(manifest):
+    """Envoie les fichiers d'entrée et crée un batch par partie (les parties déjà soumises sont ignorées)."""
+    client = _get_client()
+    for part in manifest["parts"]:
+        if part["input_file_id"] is None:
+            with open(part["input_path"], "rb") as f:
+                uploaded = client.files.create(file=f, purpose="batch")
+            part["input_file_id"] = uploaded.id
+            save_manifest(manifest)
+        if part["batch_id"] is None:
+            batch = client.batches.create(
+                input_file_id=part["input_file_id"],
+                endpoint=BATCH_ENDPOINT,
+                completion_window=BATCH_COMPLETION_WINDOW,
+                metadata={"job_id": manifest["job_id"], "part": str(part["index"])},
+            )
+            part["batch_id"] = batch.id
+            part["status"] = batch.status
+            save_manifest(manifest)
+            print(
+                f"Partie {part['index']}: batch {batch.id} soumis ({part['request_count']} requêtes)."
+            )
+    manifest["status"] = "submitted"
+    save_manifest(manifest)
+
+
+def wait_for_job(manifest, poll_interval=BATCH_POLL_INTERVAL):
+    """Interroge l'API jusqu'à ce que tous les batchs du job soient terminés."""
+    client = _get_client()
+    while True:
+        pending = 0
+        for part in manifest["parts"]:
+            if part["status"] in TERMINAL_STATUSES:
+                continue
+            batch = client.batches.retrieve(part["batch_id"])
+            if batch.status != part["status"]:
+                counts = batch.request_counts
+                progress = f" ({counts.completed}/{counts.total})" if counts else ""
+                print(f"Partie {part['index']}: {batch.status}{progress}")
+            part["status"] = batch.status
+            part["output_file_id"] = batch.output_file_id
+            part["error_file_id"] = batch.error_file_id
+            if batch.status not in TERMINAL_STATUSES:
+                pending += 1
+        save_manifest(manifest)
+        if not pending:
+            break
+        time.sleep(poll_interval)
+    manifest["status"] = "completed"
+    save_manifest(manifest)
+
+
+def _read_jsonl(path):
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _ingest_part(manifest, part, client, db_chunk_size):
+    """Enregistre en base les résultats d'une partie. Retourne `(succes, erreurs)`."""
+    articles = {item["custom_id"]: item for item in _read_jsonl(part["articles_path"])}
+    counts = {"success": 0, "errors": 0}
+
+    def on_flush(keys, success, message):
+        if not success:
+            print(f"❌ {len(keys)} articles: Erreur de sauvegarde: {message}")
+            counts["errors"] += len(keys)
+            return
+        counts["success"] += len(keys)
+        if manifest["source"] == "directory":
+            for filename in keys:
+                _move_processed_file(filename)
+
+    if part["output_file_id"]:
+        output_text = client.files.content(part["output_file_id"]).text
+        output_path = os.path.join(
+            manifest["job_dir"], f"output_{part['index']:03d}.jsonl"
+        )
+        with open(output_path, "w", encoding="utf-8") as f:
+            f.write(output_text)
+
+        cache = extraction_cache.get_cache()
+        writer = run_extraction.BulkExtractionWriter(
+            manifest["user_id"],
+            db_chunk_size,
+            on_flush=on_flush,
+            system_prompt=manifest["system_prompt"],
+        )
+        for result in _read_jsonl(output_path):
+            article = articles.pop(result.get("custom_id"), None)
+            if article is None:
+                continue
+            response = result.get("response") or {}
+            try:
+                if response.get("status_code") != 200:
+                    raise ValueError(f"statut HTTP {response.get('status_code')}")
+                llm_response_text = response["body"]["choices"][0]["message"]["content"]
+                extracted_data = run_extraction._parse_llm_json(llm_response_text)
+            except (KeyError, IndexError, TypeError, ValueError) as e:
+                print(f"❌ {article['key']}: réponse inexploitable ({e}).")
+                counts["errors"] += 1
+                continue
+
+            writer.add(article["key"], article["content"], extracted_data)
+            if cache is not None:
+                cache.set(
+                    extraction_cache.make_cache_key(
+                        database.calculate_content_hash(article["content"]),
+                        manifest["system_prompt"],
+                        manifest["model"],
+                        run_extraction.LLM_TEMPERATURE,
+                    ),
+                    extracted_data,
+                    model=manifest["model"],
+                )
+        writer.flush()
+
+    # Les requêtes sans résultat (erreurs, batch expiré) sont comptées en échec
+    for article in articles.values():
+        print(f"❌ {article['key']}: aucune réponse du batch.")
+        counts["errors"] += 1
+
+    return counts["success"], counts["errors"]
+
+
+def _move_processed_file(filename):
+    filepath = os.path.join(run_extraction.SOURCE_DIR, filename)
+    if os.path.exists(filepath):
+        os.makedirs(run_extraction.PROCESSED_DIR, exist_ok=True)
+        shutil.move(filepath, os.path.join(run_extraction.PROCESSED_DIR, filename))
+
+
+def ingest_job(manifest, db_chunk_size=run_extraction.DEFAULT_DB_CHUNK_SIZE):
+    """Relit les résultats de chaque partie terminée et les enregistre en base."""
+    client = _get_client()
+    for part in manifest["parts"]:
+        if part["ingested"]:
+            continue
+        success_count, error_count = _ingest_part(manifest, part, client, db_chunk_size)
+        manifest["results"]["success"] += success_count
+        manifest["results"]["errors"] += error_count
+        part["ingested"] = True
+        save_manifest(manifest)
+    manifest["status"] = "ingested"
+    save_manifest(manifest)
+
+
+def run_job(
+    manifest,
+    poll_interval=BATCH_POLL_INTERVAL,
+    db_chunk_size=run_extraction.DEFAULT_DB_CHUNK_SIZE,
+):
+    """Exécute (ou reprend) toutes les étapes restantes d'un job."""
+    if manifest["status"] == "created":
+        submit_job(manifest)
+    if manifest["status"] == "submitted":
+        wait_for_job(manifest, poll_interval=poll_interval)
+    if manifest["status"] == "completed":
+        ingest_job(manifest, db_chunk_size=db_chunk_size)
+
+    print(f"\n{'=' * 60}")
+    print(f"Job batch {manifest['job_id']} terminé:")
+    print(f"  - {manifest['request_count']} articles soumis")
+    print(f"  - {manifest['results']['success']} succès")
+    print(f"  - {manifest['results']['errors']} échecs")
+    print(f"  - Manifeste: {_manifest_path(manifest['job_dir'])}")
+    run_extraction._print_pool_summary()
+    print(f"{'=' * 60}")
+    return manifest
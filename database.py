@@ -1,11 +1,18 @@
+import atexit
 import hashlib  # Importation pour le hachage
 import json
 import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
 from urllib.parse import urlparse
 
 import bcrypt
 import psycopg2
+import psycopg2.extensions
 import psycopg2.extras
+import psycopg2.pool
 import streamlit as st
 from dotenv import load_dotenv
 
@@ -14,125 +21,576 @@ load_dotenv()
 
 # --- Database Connection ---
 
+# Connexions gardées ouvertes dans le pool entre deux utilisations / connexions simultanées maximum
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "2"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+# Attente maximale (en secondes) d'une connexion libre quand toutes sont utilisées
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Une connexion inutilisée depuis plus de N secondes est vérifiée (SELECT 1) avant d'être prêtée
+DB_POOL_HEALTHCHECK_AFTER = float(os.getenv("DB_POOL_HEALTHCHECK_AFTER", "30"))
+
+
+def _connection_params():
+    """Retourne les paramètres de connexion (.env puis secrets Streamlit), ou None."""
+    # Essayer d'abord avec les variables d'environnement (.env)
+    if os.getenv("DB_HOST"):
+        return {
+            "host": os.getenv("DB_HOST"),
+            "dbname": os.getenv("DB_NAME", "postgres"),
+            "user": os.getenv("DB_USER"),
+            "password": os.getenv("DB_PASSWORD"),
+            "port": os.getenv("DB_PORT", "5432"),
+        }
+    # Fallback sur les secrets Streamlit si .env n'existe pas
+    if "postgres" in st.secrets:
+        return {
+            "host": st.secrets["postgres"]["host"],
+            "dbname": st.secrets["postgres"]["dbname"],
+            "user": st.secrets["postgres"]["user"],
+            "password": st.secrets["postgres"]["password"],
+            "port": st.secrets["postgres"]["port"],
+        }
+    st.error(
+        "Aucune configuration de base de données trouvée. Créez un fichier .env avec les variables DB_HOST, DB_USER, DB_PASSWORD, etc."
+    )
+    return None
+
 
 def get_db_connection():
-    """Établit une connexion à la base de données PostgreSQL en utilisant les variables d'environnement."""
+    """
+    Établit une connexion dédiée (hors pool) à la base de données PostgreSQL.
+
+    Conservée pour compatibilité : l'appelant doit fermer la connexion lui-même.
+    Préférer `db_connection()`, qui emprunte une connexion au pool partagé.
+    """
     try:
-        # Essayer d'abord avec les variables d'environnement (.env)
-        if os.getenv("DB_HOST"):
-            conn = psycopg2.connect(
-                host=os.getenv("DB_HOST"),
-                dbname=os.getenv("DB_NAME", "postgres"),
-                user=os.getenv("DB_USER"),
-                password=os.getenv("DB_PASSWORD"),
-                port=os.getenv("DB_PORT", "5432"),
-            )
-            return conn
-        # Fallback sur les secrets Streamlit si .env n'existe pas
-        elif "postgres" in st.secrets:
-            conn = psycopg2.connect(
-                host=st.secrets["postgres"]["host"],
-                dbname=st.secrets["postgres"]["dbname"],
-                user=st.secrets["postgres"]["user"],
-                password=st.secrets["postgres"]["password"],
-                port=st.secrets["postgres"]["port"],
-            )
-            return conn
-        else:
-            st.error(
-                "Aucune configuration de base de données trouvée. Créez un fichier .env avec les variables DB_HOST, DB_USER, DB_PASSWORD, etc."
-            )
+        params = _connection_params()
+        if params is None:
             return None
+        return psycopg2.connect(**params)
     except Exception as e:
         st.error(f"Erreur de connexion à la base de données : {e}")
         return None
 
 
-# --- Schema Initialization ---
+class ConnectionPool:
+    """
+    Pool de connexions PostgreSQL partagé entre threads.
 
+    Quand toutes les connexions sont prêtées, `getconn` attend qu'une connexion soit
+    rendue (au plus `timeout` secondes) au lieu d'échouer immédiatement.
+    """
+
+    def __init__(
+        self,
+        minconn=DB_POOL_MIN,
+        maxconn=DB_POOL_MAX,
+        timeout=DB_POOL_TIMEOUT,
+        healthcheck_after=DB_POOL_HEALTHCHECK_AFTER,
+        **params,
+    ):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.healthcheck_after = healthcheck_after
+        self._pool = psycopg2.pool.ThreadedConnectionPool(minconn, maxconn, **params)
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+        self._last_used = {}
+
+        self.in_use = 0
+        self.checkouts = 0
+        self.waits = 0
+        self.timeouts = 0
+        self.reconnects = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def getconn(self):
+        """Emprunte une connexion vérifiée, en attendant qu'une se libère si besoin."""
+        start = time.perf_counter()
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.waits += 1
+            if not self._slots.acquire(timeout=self.timeout):
+                with self._lock:
+                    self.timeouts += 1
+                raise psycopg2.pool.PoolError(
+                    f"Aucune connexion libre après {self.timeout:.0f}s ({self.maxconn} connexions utilisées)"
+                )
+
+        try:
+            # Après un redémarrage du serveur, toutes les connexions inactives peuvent
+            # être coupées : on les écarte jusqu'à en trouver une saine (au pire, une
+            # nouvelle connexion ouverte par le pool)
+            conn = self._pool.getconn()
+            attempts = 0
+            while not self._is_healthy(conn):
+                self._discard(conn)
+                attempts += 1
+                if attempts > self.maxconn:
+                    raise psycopg2.pool.PoolError(
+                        f"Aucune connexion saine après {attempts} essais"
+                    )
+                with self._lock:
+                    self.reconnects += 1
+                conn = self._pool.getconn()
+        except Exception:
+            self._slots.release()
+            raise
+
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.in_use += 1
+            self.checkouts += 1
+            self._wait_total += elapsed
+            self._wait_max = max(self._wait_max, elapsed)
+        return conn
+
+    def putconn(self, conn):
+        """Rend une connexion au pool, en annulant toute transaction laissée ouverte."""
+        close = bool(conn.closed)
+        if not close:
+            status = conn.get_transaction_status()
+            if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                close = True
+            elif status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    close = True
+
+        try:
+            if close:
+                self._discard(conn)
+            else:
+                self._last_used[id(conn)] = time.monotonic()
+                self._pool.putconn(conn)
+        finally:
+            with self._lock:
+                self.in_use -= 1
+            self._slots.release()
+
+    def _discard(self, conn):
+        self._last_used.pop(id(conn), None)
+        self._pool.putconn(conn, close=True)
+
+    def _is_healthy(self, conn):
+        """Vérifie une connexion restée inutilisée trop longtemps (coupure réseau, redémarrage du serveur)."""
+        if conn.closed:
+            return False
+        last_used = self._last_used.get(id(conn))
+        if (
+            last_used is not None
+            and time.monotonic() - last_used < self.healthcheck_after
+        ):
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def closeall(self):
+        """Ferme toutes les connexions du pool."""
+        self._last_used.clear()
+        self._pool.closeall()
+
+    def stats(self):
+        """Retourne les métriques du pool depuis sa création."""
+        with self._lock:
+            return {
+                "min": self.minconn,
+                "max": self.maxconn,
+                "in_use": self.in_use,
+                "checkouts": self.checkouts,
+                "waits": self.waits,
+                "timeouts": self.timeouts,
+                "reconnects": self.reconnects,
+                "avg_checkout_ms": (
+                    1000 * self._wait_total / self.checkouts if self.checkouts else 0.0
+                ),
+                "max_checkout_ms": 1000 * self._wait_max,
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Retourne le pool de connexions du processus, créé à la première utilisation (None si la base est injoignable)."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                try:
+                    params = _connection_params()
+                    if params is None:
+                        return None
+                    _pool = ConnectionPool(**params)
+                except Exception as e:
+                    st.error(f"Erreur de connexion à la base de données : {e}")
+                    return None
+    return _pool
+
+
+@contextmanager
+def db_connection():
+    """
+    Emprunte une connexion au pool partagé et la rend à la sortie du bloc.
+
+    Produit None si la base est injoignable. Une transaction non validée par
+    `conn.commit()` est annulée quand la connexion retourne dans le pool.
+    """
+    pool = get_pool()
+    conn = None
+    if pool is not None:
+        try:
+            conn = pool.getconn()
+        except Exception as e:
+            st.error(f"Erreur de connexion à la base de données : {e}")
 
-def init_db():
-    """Initialise la base de données en créant les tables si elles n'existent pas et en ajoutant des colonnes/contraintes si nécessaire."""
-    conn = get_db_connection()
     if conn is None:
-        st.error(
-            "La connexion à la base de données a échoué, impossible d'initialiser."
-        )
+        yield None
         return
-
     try:
-        with conn.cursor() as cur:
+        yield conn
+    finally:
+        pool.putconn(conn)
+
+
+def get_pool_stats():
+    """Retourne les métriques du pool (connexions prêtées, attentes, latence d'emprunt), ou {} s'il n'existe pas encore."""
+    if _pool is None:
+        return {}
+    return _pool.stats()
+
+
+def close_pool():
+    """Ferme le pool de connexions partagé (fin de processus, tests)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+
+
+atexit.register(close_pool)
+
+
+# --- Change Tracking ---
+
+# Compteur d'écritures par utilisateur faites par ce processus. Les caches de
+# l'application s'en servent comme clé : une écriture les invalide sans requête.
+_user_versions = {}
+_user_versions_lock = threading.Lock()
+
+
+def mark_user_changed(user_id):
+    """Signale une écriture dans les données d'un utilisateur."""
+    with _user_versions_lock:
+        _user_versions[user_id] = _user_versions.get(user_id, 0) + 1
+
+
+def get_user_version(user_id):
+    """Retourne le compteur d'écritures de l'utilisateur (voir mark_user_changed)."""
+    return _user_versions.get(user_id, 0)
+
+
+# --- Schema Migrations ---
+
+# Étapes de migration, dans l'ordre : (version, description, instructions SQL).
+# Une migration déjà déployée ne doit plus être modifiée : ajouter une nouvelle version.
+MIGRATIONS = [
+    (
+        1,
+        "Schéma initial : users, extractions, content_hash, source_url, unique_user_content",
+        [
             # Table pour les utilisateurs
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS users (
-                    id SERIAL PRIMARY KEY,
-                    username VARCHAR(80) UNIQUE NOT NULL,
-                    password_hash VARCHAR(255) NOT NULL,
-                    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
-                );
-            """)
+            """
+            CREATE TABLE IF NOT EXISTS users (
+                id SERIAL PRIMARY KEY,
+                username VARCHAR(80) UNIQUE NOT NULL,
+                password_hash VARCHAR(255) NOT NULL,
+                created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+            );
+            """,
             # Ajout de la colonne selected_prompt_id si elle n'existe pas
-            cur.execute("""
-                DO $$
-                BEGIN
-                    IF NOT EXISTS (SELECT 1 FROM information_schema.columns WHERE table_name='users' AND column_name='selected_prompt_id') THEN
-                        ALTER TABLE users ADD COLUMN selected_prompt_id VARCHAR(50) DEFAULT 'levee_fonds_esante';
-                    END IF;
-                END
-                $$;
-            """)
-
+            """
+            DO $$
+            BEGIN
+                IF NOT EXISTS (SELECT 1 FROM information_schema.columns WHERE table_name='users' AND column_name='selected_prompt_id') THEN
+                    ALTER TABLE users ADD COLUMN selected_prompt_id VARCHAR(50) DEFAULT 'levee_fonds_esante';
+                END IF;
+            END
+            $$;
+            """,
             # Table pour les extractions
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS extractions (
-                    id SERIAL PRIMARY KEY,
-                    user_id INTEGER NOT NULL,
-                    original_content TEXT,
-                    extracted_data JSONB,
-                    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
-                );
-            """)
-
+            """
+            CREATE TABLE IF NOT EXISTS extractions (
+                id SERIAL PRIMARY KEY,
+                user_id INTEGER NOT NULL,
+                original_content TEXT,
+                extracted_data JSONB,
+                created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+            );
+            """,
             # Ajout de la colonne content_hash si elle n'existe pas
-            cur.execute("""
-                DO $$
-                BEGIN
-                    IF NOT EXISTS (SELECT 1 FROM information_schema.columns WHERE table_name='extractions' AND column_name='content_hash') THEN
-                        ALTER TABLE extractions ADD COLUMN content_hash VARCHAR(64);
-                    END IF;
-                END
-                $$;
-            """)
-
+            """
+            DO $$
+            BEGIN
+                IF NOT EXISTS (SELECT 1 FROM information_schema.columns WHERE table_name='extractions' AND column_name='content_hash') THEN
+                    ALTER TABLE extractions ADD COLUMN content_hash VARCHAR(64);
+                END IF;
+            END
+            $$;
+            """,
             # Ajout de la colonne source_url si elle n'existe pas
-            cur.execute("""
-                DO $$
-                BEGIN
-                    IF NOT EXISTS (SELECT 1 FROM information_schema.columns WHERE table_name='extractions' AND column_name='source_url') THEN
-                        ALTER TABLE extractions ADD COLUMN source_url TEXT;
-                    END IF;
-                END
-                $$;
-            """)
-
+            """
+            DO $$
+            BEGIN
+                IF NOT EXISTS (SELECT 1 FROM information_schema.columns WHERE table_name='extractions' AND column_name='source_url') THEN
+                    ALTER TABLE extractions ADD COLUMN source_url TEXT;
+                END IF;
+            END
+            $$;
+            """,
             # Ajout de la contrainte UNIQUE (user_id, content_hash) si elle n'existe pas
-            cur.execute("""
-                DO $$
-                BEGIN
-                    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'unique_user_content') THEN
-                        ALTER TABLE extractions ADD CONSTRAINT unique_user_content UNIQUE (user_id, content_hash);
-                    END IF;
+            """
+            DO $$
+            BEGIN
+                IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'unique_user_content') THEN
+                    ALTER TABLE extractions ADD CONSTRAINT unique_user_content UNIQUE (user_id, content_hash);
+                END IF;
+            END
+            $$;
+            """,
+        ],
+    ),
+    (
+        2,
+        "Index (user_id, created_at DESC, id DESC) pour la pagination de l'historique",
+        [
+            """
+            CREATE INDEX IF NOT EXISTS idx_extractions_user_created
+            ON extractions (user_id, created_at DESC, id DESC);
+            """,
+        ],
+    ),
+    (
+        3,
+        "Colonnes générées typées (start-up, montant, date, tour, investisseurs) et index",
+        [
+            # Fonctions de lecture tolérantes : NULL plutôt qu'une erreur si le LLM
+            # a renvoyé une valeur inattendue (une erreur bloquerait l'INSERT)
+            """
+            CREATE OR REPLACE FUNCTION extraction_amount(data JSONB) RETURNS NUMERIC
+            LANGUAGE plpgsql IMMUTABLE AS $$
+            BEGIN
+                IF jsonb_typeof(data -> 'Montant') = 'number' THEN
+                    RETURN (data ->> 'Montant')::NUMERIC;
+                END IF;
+                -- "5,5 M€", "12M€" : premier nombre trouvé, en M€ comme demandé par les prompts
+                RETURN replace(
+                    substring(data ->> 'Montant' FROM '[0-9]+(?:[.,][0-9]+)?'), ',', '.'
+                )::NUMERIC;
+            EXCEPTION WHEN others THEN
+                RETURN NULL;
+            END
+            $$;
+            """,
+            """
+            CREATE OR REPLACE FUNCTION extraction_date(data JSONB) RETURNS DATE
+            LANGUAGE plpgsql IMMUTABLE AS $$
+            DECLARE
+                parts TEXT[];
+            BEGIN
+                -- Date_levée au format JJ/MM/AAAA (to_date n'est pas IMMUTABLE, make_date l'est)
+                parts := regexp_match(
+                    data ->> 'Date_levée', '^[[:space:]]*([0-9]{1,2})/([0-9]{1,2})/([0-9]{4})[[:space:]]*$'
+                );
+                IF parts IS NULL THEN
+                    RETURN NULL;
+                END IF;
+                RETURN make_date(parts[3]::INTEGER, parts[2]::INTEGER, parts[1]::INTEGER);
+            EXCEPTION WHEN others THEN
+                RETURN NULL;
+            END
+            $$;
+            """,
+            """
+            CREATE OR REPLACE FUNCTION extraction_investors(data JSONB) RETURNS JSONB
+            LANGUAGE sql IMMUTABLE AS $$
+                SELECT CASE jsonb_typeof(data -> 'Investisseurs')
+                    WHEN 'array' THEN data -> 'Investisseurs'
+                    WHEN 'string' THEN jsonb_build_array(data ->> 'Investisseurs')
+                    ELSE '[]'::JSONB
                 END
-                $$;
-            """)
+            $$;
+            """,
+            """
+            ALTER TABLE extractions
+                ADD COLUMN IF NOT EXISTS startup_name TEXT
+                    GENERATED ALWAYS AS (extracted_data ->> 'Nom_start-up') STORED,
+                ADD COLUMN IF NOT EXISTS amount NUMERIC
+                    GENERATED ALWAYS AS (extraction_amount(extracted_data)) STORED,
+                ADD COLUMN IF NOT EXISTS funding_date DATE
+                    GENERATED ALWAYS AS (extraction_date(extracted_data)) STORED,
+                ADD COLUMN IF NOT EXISTS funding_round TEXT
+                    GENERATED ALWAYS AS (extracted_data ->> 'Tour') STORED,
+                ADD COLUMN IF NOT EXISTS investors JSONB
+                    GENERATED ALWAYS AS (extraction_investors(extracted_data)) STORED;
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_extractions_user_amount ON extractions (user_id, amount);",
+            "CREATE INDEX IF NOT EXISTS idx_extractions_user_funding_date ON extractions (user_id, funding_date DESC);",
+            "CREATE INDEX IF NOT EXISTS idx_extractions_user_round ON extractions (user_id, funding_round);",
+            "CREATE INDEX IF NOT EXISTS idx_extractions_investors ON extractions USING GIN (investors);",
+        ],
+    ),
+    (
+        4,
+        "Index de recherche de l'historique (préfixe et trigrammes)",
+        [
+            # Recherche par préfixe du nom de start-up, sans dépendre d'une extension
+            """
+            CREATE INDEX IF NOT EXISTS idx_extractions_user_startup_prefix
+            ON extractions (user_id, lower(startup_name) text_pattern_ops);
+            """,
+            # pg_trgm n'est pas disponible partout : sans lui, la recherche reste
+            # possible mais parcourt les extractions de l'utilisateur
+            """
+            DO $$
+            BEGIN
+                CREATE EXTENSION IF NOT EXISTS pg_trgm;
+            EXCEPTION WHEN others THEN
+                RAISE NOTICE 'Extension pg_trgm indisponible : index trigrammes non créés';
+            END
+            $$;
+            """,
+            """
+            DO $$
+            BEGIN
+                IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') THEN
+                    CREATE INDEX IF NOT EXISTS idx_extractions_startup_trgm
+                    ON extractions USING GIN (lower(startup_name) gin_trgm_ops);
+                    CREATE INDEX IF NOT EXISTS idx_extractions_investors_trgm
+                    ON extractions USING GIN (lower(investors::TEXT) gin_trgm_ops);
+                    CREATE INDEX IF NOT EXISTS idx_extractions_source_url_trgm
+                    ON extractions USING GIN (lower(source_url) gin_trgm_ops);
+                END IF;
+            END
+            $$;
+            """,
+        ],
+    ),
+    (
+        5,
+        "Hash du prompt système utilisé pour chaque extraction",
+        [
+            # NULL pour les extractions antérieures : elles sont ré-extraites une fois
+            "ALTER TABLE extractions ADD COLUMN IF NOT EXISTS prompt_hash VARCHAR(64);",
+        ],
+    ),
+]
+
+LATEST_SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+# Clé du verrou consultatif qui empêche deux processus de migrer en même temps
+MIGRATION_LOCK_ID = 7248031
+
+_schema_ready = False
+
+
+def get_schema_version():
+    """Retourne la version du schéma en base (0 si jamais migré), ou None en cas d'erreur."""
+    with db_connection() as conn:
+        if conn is None:
+            return None
+
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT to_regclass('schema_version') IS NOT NULL")
+                if not cur.fetchone()[0]:
+                    return 0
+                cur.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+                return cur.fetchone()[0]
+        except Exception as e:
+            st.error(f"Erreur pour lire la version du schéma : {e}")
+            return None
 
-        conn.commit()
-    except Exception as e:
-        st.error(f"Erreur lors de l'initialisation de la base de données : {e}")
-    finally:
-        if conn:
-            conn.close()
+
+def migrate():
+    """Applique les migrations en attente, dans une seule transaction et sous verrou consultatif."""
+    with db_connection() as conn:
+        if conn is None:
+            return False, "Connexion à la base de données échouée."
+
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_ID,))
+                cur.execute("""
+                    CREATE TABLE IF NOT EXISTS schema_version (
+                        version INTEGER PRIMARY KEY,
+                        description TEXT,
+                        applied_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+                    );
+                """)
+                # Relu après le verrou : un autre processus a pu migrer entre-temps
+                cur.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+                current_version = cur.fetchone()[0]
+
+                applied = []
+                for version, description, statements in MIGRATIONS:
+                    if version <= current_version:
+                        continue
+                    for statement in statements:
+                        cur.execute(statement)
+                    cur.execute(
+                        "INSERT INTO schema_version (version, description) VALUES (%s, %s)",
+                        (version, description),
+                    )
+                    applied.append(version)
+            conn.commit()
+            if not applied:
+                return True, f"Schéma déjà à jour (version {current_version})."
+            return True, f"Migration(s) appliquée(s) : {', '.join(map(str, applied))}."
+        except Exception as e:
+            return False, f"Erreur lors de la migration du schéma : {e}"
+
+
+def init_db():
+    """
+    Vérifie la version du schéma et applique les migrations en attente.
+
+    La vérification n'est faite qu'une fois par processus : les appels suivants
+    ne touchent pas la base. Retourne True si le schéma est à jour.
+    """
+    global _schema_ready
+    if _schema_ready:
+        return True
+
+    version = get_schema_version()
+    if version is None:
+        st.error(
+            "La connexion à la base de données a échoué, impossible d'initialiser."
+        )
+        return False
+
+    if version < LATEST_SCHEMA_VERSION:
+        success, message = migrate()
+        if not success:
+            st.error(
+                f"Erreur lors de l'initialisation de la base de données : {message}"
+            )
+            return False
+        print(message)
+
+    _schema_ready = True
+    return True
 
 
 # --- User Management ---
@@ -150,66 +608,58 @@ def check_password(password, hashed_password):
 
 def add_user(username, password):
     """Ajoute un nouvel utilisateur à la base de données."""
-    conn = get_db_connection()
-    if conn is None:
-        return False, "Connexion à la base de données échouée."
+    with db_connection() as conn:
+        if conn is None:
+            return False, "Connexion à la base de données échouée."
 
-    password_hash = hash_password(password)
-    try:
-        with conn.cursor() as cur:
-            cur.execute(
-                "INSERT INTO users (username, password_hash) VALUES (%s, %s)",
-                (username, password_hash),
-            )
-        conn.commit()
-        return True, "Utilisateur créé avec succès."
-    except psycopg2.IntegrityError:
-        return False, "Ce nom d'utilisateur existe déjà."
-    except Exception as e:
-        return False, f"Erreur lors de la création de l'utilisateur : {e}"
-    finally:
-        if conn:
-            conn.close()
+        password_hash = hash_password(password)
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "INSERT INTO users (username, password_hash) VALUES (%s, %s)",
+                    (username, password_hash),
+                )
+            conn.commit()
+            return True, "Utilisateur créé avec succès."
+        except psycopg2.IntegrityError:
+            return False, "Ce nom d'utilisateur existe déjà."
+        except Exception as e:
+            return False, f"Erreur lors de la création de l'utilisateur : {e}"
 
 
 def get_user(username):
     """Récupère un utilisateur par son nom d'utilisateur."""
-    conn = get_db_connection()
-    if conn is None:
-        return None
+    with db_connection() as conn:
+        if conn is None:
+            return None
 
-    try:
-        with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-            cur.execute("SELECT * FROM users WHERE username = %s", (username,))
-            user = cur.fetchone()
-            return user
-    except Exception as e:
-        st.error(f"Erreur pour récupérer l'utilisateur : {e}")
-        return None
-    finally:
-        if conn:
-            conn.close()
+        try:
+            with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
+                cur.execute("SELECT * FROM users WHERE username = %s", (username,))
+                user = cur.fetchone()
+                return user
+        except Exception as e:
+            st.error(f"Erreur pour récupérer l'utilisateur : {e}")
+            return None
 
 
 def update_user_prompt(user_id, prompt_id):
     """Met à jour l'ID du prompt sélectionné par l'utilisateur."""
-    conn = get_db_connection()
-    if conn is None:
-        return False, "Connexion à la base de données échouée."
+    with db_connection() as conn:
+        if conn is None:
+            return False, "Connexion à la base de données échouée."
 
-    try:
-        with conn.cursor() as cur:
-            cur.execute(
-                "UPDATE users SET selected_prompt_id = %s WHERE id = %s",
-                (prompt_id, user_id),
-            )
-        conn.commit()
-        return True, "Prompt utilisateur mis à jour avec succès."
-    except Exception as e:
-        return False, f"Erreur lors de la mise à jour du prompt utilisateur : {e}"
-    finally:
-        if conn:
-            conn.close()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "UPDATE users SET selected_prompt_id = %s WHERE id = %s",
+                    (prompt_id, user_id),
+                )
+            conn.commit()
+            mark_user_changed(user_id)
+            return True, "Prompt utilisateur mis à jour avec succès."
+        except Exception as e:
+            return False, f"Erreur lors de la mise à jour du prompt utilisateur : {e}"
 
 
 # --- Extractions Management ---
@@ -220,57 +670,471 @@ def calculate_content_hash(content):
     return hashlib.sha256(content.encode("utf-8")).hexdigest()
 
 
+def get_existing_content_hashes(user_id, content_hashes, prompt_hash=None):
+    """
+    Retourne l'ensemble des hashes de `content_hashes` déjà extraits pour cet utilisateur.
+
+    Avec `prompt_hash`, seules les extractions faites avec ce prompt système comptent :
+    un article extrait avec un autre prompt (ou avant la migration 5) n'est pas retourné.
+    """
+    content_hashes = list(set(content_hashes))
+    if not content_hashes:
+        return set()
+
+    with db_connection() as conn:
+        if conn is None:
+            return set()
+
+        try:
+            with conn.cursor() as cur:
+                if prompt_hash is None:
+                    cur.execute(
+                        "SELECT content_hash FROM extractions WHERE user_id = %s AND content_hash = ANY(%s)",
+                        (user_id, content_hashes),
+                    )
+                else:
+                    cur.execute(
+                        "SELECT content_hash FROM extractions WHERE user_id = %s AND content_hash = ANY(%s) AND prompt_hash = %s",
+                        (user_id, content_hashes, prompt_hash),
+                    )
+                return {row[0] for row in cur.fetchall()}
+        except Exception as e:
+            st.error(f"Erreur pour récupérer les extractions existantes : {e}")
+            return set()
+
+
 def add_extraction(
-    user_id, original_content, extracted_data, content_hash, source_url=None
+    user_id,
+    original_content,
+    extracted_data,
+    content_hash,
+    source_url=None,
+    prompt_hash=None,
 ):
-    """Ajoute ou met à jour un enregistrement d'extraction dans la base de données."""
-    conn = get_db_connection()
-    if conn is None:
-        return False, "Connexion à la base de données échouée."
+    """
+    Ajoute ou met à jour un enregistrement d'extraction dans la base de données.
 
-    try:
-        with conn.cursor() as cur:
-            if not isinstance(extracted_data, str):
-                extracted_data = json.dumps(extracted_data)
-
-            cur.execute(
-                """
-                INSERT INTO extractions (user_id, original_content, extracted_data, content_hash, source_url)
-                VALUES (%s, %s, %s::jsonb, %s, %s)
-                ON CONFLICT (user_id, content_hash) DO UPDATE SET
-                    original_content = EXCLUDED.original_content,
-                    extracted_data = EXCLUDED.extracted_data,
-                    source_url = EXCLUDED.source_url,
-                    created_at = CURRENT_TIMESTAMP
-            """,
-                (user_id, original_content, extracted_data, content_hash, source_url),
-            )
-        conn.commit()
-        return True, "Extraction ajoutée/mise à jour avec succès."
-    except Exception as e:
-        return False, f"Erreur lors de l'ajout/mise à jour de l'extraction : {e}"
-    finally:
-        if conn:
-            conn.close()
+    `prompt_hash` identifie le prompt système utilisé (voir get_existing_content_hashes).
+    """
+    with db_connection() as conn:
+        if conn is None:
+            return False, "Connexion à la base de données échouée."
 
+        try:
+            with conn.cursor() as cur:
+                if not isinstance(extracted_data, str):
+                    extracted_data = json.dumps(extracted_data)
 
-def get_extractions_by_user(user_id):
-    """Récupère toutes les extractions pour un utilisateur donné."""
-    conn = get_db_connection()
-    if conn is None:
-        return []
+                cur.execute(
+                    """
+                    INSERT INTO extractions (user_id, original_content, extracted_data, content_hash, source_url, prompt_hash)
+                    VALUES (%s, %s, %s::jsonb, %s, %s, %s)
+                    ON CONFLICT (user_id, content_hash) DO UPDATE SET
+                        original_content = EXCLUDED.original_content,
+                        extracted_data = EXCLUDED.extracted_data,
+                        source_url = EXCLUDED.source_url,
+                        prompt_hash = EXCLUDED.prompt_hash,
+                        created_at = CURRENT_TIMESTAMP
+                """,
+                    (
+                        user_id,
+                        original_content,
+                        extracted_data,
+                        content_hash,
+                        source_url,
+                        prompt_hash,
+                    ),
+                )
+            conn.commit()
+            mark_user_changed(user_id)
+            return True, "Extraction ajoutée/mise à jour avec succès."
+        except Exception as e:
+            return False, f"Erreur lors de l'ajout/mise à jour de l'extraction : {e}"
 
-    try:
-        with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-            cur.execute(
-                "SELECT id, extracted_data, created_at FROM extractions WHERE user_id = %s ORDER BY created_at DESC",
-                (user_id,),
+
+def add_extractions_bulk(user_id, rows, page_size=500):
+    """
+    Ajoute ou met à jour plusieurs extractions en une seule transaction.
+
+    `rows` est une liste de dicts avec les clés `original_content`, `extracted_data`,
+    `content_hash` et, optionnellement, `source_url` et `prompt_hash`. Si un même hash apparaît plusieurs
+    fois, la dernière occurrence l'emporte (un INSERT ... ON CONFLICT ne peut pas
+    modifier deux fois la même ligne).
+    """
+    values_by_hash = {}
+    for row in rows:
+        extracted_data = row["extracted_data"]
+        if not isinstance(extracted_data, str):
+            extracted_data = json.dumps(extracted_data)
+        values_by_hash[row["content_hash"]] = (
+            user_id,
+            row["original_content"],
+            extracted_data,
+            row["content_hash"],
+            row.get("source_url"),
+            row.get("prompt_hash"),
+        )
+    if not values_by_hash:
+        return True, "Aucune extraction à enregistrer."
+
+    with db_connection() as conn:
+        if conn is None:
+            return False, "Connexion à la base de données échouée."
+
+        try:
+            with conn.cursor() as cur:
+                psycopg2.extras.execute_values(
+                    cur,
+                    """
+                    INSERT INTO extractions (user_id, original_content, extracted_data, content_hash, source_url, prompt_hash)
+                    VALUES %s
+                    ON CONFLICT (user_id, content_hash) DO UPDATE SET
+                        original_content = EXCLUDED.original_content,
+                        extracted_data = EXCLUDED.extracted_data,
+                        source_url = EXCLUDED.source_url,
+                        prompt_hash = EXCLUDED.prompt_hash,
+                        created_at = CURRENT_TIMESTAMP
+                """,
+                    list(values_by_hash.values()),
+                    template="(%s, %s, %s::jsonb, %s, %s, %s)",
+                    page_size=page_size,
+                )
+            conn.commit()
+            mark_user_changed(user_id)
+            return (
+                True,
+                f"{len(values_by_hash)} extraction(s) ajoutée(s)/mise(s) à jour.",
             )
-            extractions = cur.fetchall()
-            return extractions
-    except Exception as e:
-        st.error(f"Erreur pour récupérer les extractions : {e}")
+        except Exception as e:
+            return False, f"Erreur lors de l'ajout/mise à jour des extractions : {e}"
+
+
+# Colonnes qu'un appelant peut demander dans `fields`
+EXTRACTION_FIELDS = (
+    "id",
+    "user_id",
+    "original_content",
+    "extracted_data",
+    "content_hash",
+    "source_url",
+    "prompt_hash",
+    "created_at",
+    # Colonnes générées à partir de extracted_data (migration 3)
+    "startup_name",
+    "amount",
+    "funding_date",
+    "funding_round",
+    "investors",
+)
+DEFAULT_PAGE_FIELDS = ("id", "extracted_data", "source_url", "created_at")
+
+
+def _select_fields(fields):
+    """Construit la liste de colonnes du SELECT (`id` et `created_at` sont toujours inclus)."""
+    fields = DEFAULT_PAGE_FIELDS if fields is None else fields
+    unknown = set(fields) - set(EXTRACTION_FIELDS)
+    if unknown:
+        raise ValueError(f"Colonne(s) inconnue(s) : {', '.join(sorted(unknown))}")
+    columns = ["id", "created_at"] + [
+        field for field in fields if field not in ("id", "created_at")
+    ]
+    return ", ".join(columns)
+
+
+def get_extractions_page(user_id, limit=50, cursor=None, fields=None):
+    """
+    Récupère une page d'extractions, de la plus récente à la plus ancienne.
+
+    La pagination se fait par clé (created_at, id) : `cursor` est le curseur renvoyé
+    par la page précédente, ou None pour la première page. `fields` restreint les
+    colonnes lues (voir EXTRACTION_FIELDS). Retourne (extractions, curseur_suivant),
+    le curseur suivant valant None sur la dernière page.
+    """
+    columns = _select_fields(fields)
+    with db_connection() as conn:
+        if conn is None:
+            return [], None
+
+        try:
+            with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
+                if cursor is None:
+                    cur.execute(
+                        f"""
+                        SELECT {columns} FROM extractions
+                        WHERE user_id = %s
+                        ORDER BY created_at DESC, id DESC
+                        LIMIT %s
+                        """,
+                        (user_id, limit + 1),
+                    )
+                else:
+                    cur.execute(
+                        f"""
+                        SELECT {columns} FROM extractions
+                        WHERE user_id = %s AND (created_at, id) < (%s, %s)
+                        ORDER BY created_at DESC, id DESC
+                        LIMIT %s
+                        """,
+                        (user_id, cursor[0], cursor[1], limit + 1),
+                    )
+                extractions = cur.fetchall()
+        except Exception as e:
+            st.error(f"Erreur pour récupérer les extractions : {e}")
+            return [], None
+
+    if len(extractions) <= limit:
+        return extractions, None
+    extractions = extractions[:limit]
+    last = extractions[-1]
+    return extractions, (last["created_at"], last["id"])
+
+
+def get_change_token(user_id):
+    """
+    Retourne un jeton qui change à chaque écriture dans l'historique de l'utilisateur.
+
+    Le jeton (nombre d'extractions, date de la plus récente) sert de clé aux caches
+    côté application : toute insertion ou mise à jour réécrit created_at.
+    """
+    with db_connection() as conn:
+        if conn is None:
+            return None
+
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "SELECT COUNT(*), MAX(created_at) FROM extractions WHERE user_id = %s",
+                    (user_id,),
+                )
+                return tuple(cur.fetchone())
+        except Exception as e:
+            st.error(f"Erreur pour lire l'état de l'historique : {e}")
+            return None
+
+
+def get_extraction_ids(user_id):
+    """Retourne les IDs de toutes les extractions d'un utilisateur (les plus récentes d'abord)."""
+    with db_connection() as conn:
+        if conn is None:
+            return []
+
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "SELECT id FROM extractions WHERE user_id = %s ORDER BY created_at DESC, id DESC",
+                    (user_id,),
+                )
+                return [row[0] for row in cur.fetchall()]
+        except Exception as e:
+            st.error(f"Erreur pour récupérer les extractions : {e}")
+            return []
+
+
+def get_extractions_by_ids(user_id, extraction_ids, fields=None):
+    """Récupère les extractions demandées (appartenant à l'utilisateur), les plus récentes d'abord."""
+    extraction_ids = list(extraction_ids)
+    if not extraction_ids:
         return []
-    finally:
-        if conn:
-            conn.close()
+
+    columns = _select_fields(fields)
+    with db_connection() as conn:
+        if conn is None:
+            return []
+
+        try:
+            with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
+                cur.execute(
+                    f"""
+                    SELECT {columns} FROM extractions
+                    WHERE user_id = %s AND id = ANY(%s)
+                    ORDER BY created_at DESC, id DESC
+                    """,
+                    (user_id, extraction_ids),
+                )
+                return cur.fetchall()
+        except Exception as e:
+            st.error(f"Erreur pour récupérer les extractions : {e}")
+            return []
+
+
+def get_extraction_stats(user_id, days=30):
+    """
+    Calcule en base les statistiques du dashboard.
+
+    Retourne un dict avec `total` (nombre d'extractions), `latest` (date de la plus
+    récente, ou None) et `daily` (liste de (jour, nombre) sur les `days` derniers jours).
+    """
+    stats = {"total": 0, "latest": None, "daily": []}
+    with db_connection() as conn:
+        if conn is None:
+            return stats
+
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "SELECT COUNT(*), MAX(created_at) FROM extractions WHERE user_id = %s",
+                    (user_id,),
+                )
+                stats["total"], stats["latest"] = cur.fetchone()
+                if stats["total"]:
+                    cur.execute(
+                        """
+                        SELECT date_trunc('day', created_at)::date AS day, COUNT(*)
+                        FROM extractions
+                        WHERE user_id = %s AND created_at >= NOW() - make_interval(days => %s)
+                        GROUP BY day
+                        ORDER BY day
+                        """,
+                        (user_id, days),
+                    )
+                    stats["daily"] = cur.fetchall()
+            return stats
+        except Exception as e:
+            st.error(f"Erreur pour calculer les statistiques : {e}")
+            return stats
+
+
+# Tris proposés par search_extractions (l'id départage les égalités pour un ordre stable)
+SEARCH_SORTS = {
+    "recent": "created_at DESC, id DESC",
+    "oldest": "created_at ASC, id ASC",
+    "amount_desc": "amount DESC NULLS LAST, id DESC",
+    "amount_asc": "amount ASC NULLS LAST, id DESC",
+    "funding_date_desc": "funding_date DESC NULLS LAST, id DESC",
+    "startup": "startup_name ASC NULLS LAST, id DESC",
+}
+
+
+def _like_escape(term):
+    """Échappe les caractères spéciaux de LIKE dans un terme saisi par l'utilisateur."""
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _search_conditions(user_id, filters):
+    """Construit la clause WHERE (et ses paramètres) d'une recherche dans l'historique."""
+    conditions = ["user_id = %s"]
+    params = [user_id]
+
+    if filters.get("startup"):
+        conditions.append("lower(startup_name) LIKE %s")
+        params.append(_like_escape(filters["startup"].strip().lower()) + "%")
+    if filters.get("investor"):
+        conditions.append("lower(investors::TEXT) LIKE %s")
+        params.append("%" + _like_escape(filters["investor"].strip().lower()) + "%")
+    if filters.get("source_url"):
+        conditions.append("lower(source_url) LIKE %s")
+        params.append("%" + _like_escape(filters["source_url"].strip().lower()) + "%")
+    if filters.get("round"):
+        conditions.append("funding_round = %s")
+        params.append(filters["round"])
+    if filters.get("amount_min") is not None:
+        conditions.append("amount >= %s")
+        params.append(filters["amount_min"])
+    if filters.get("amount_max") is not None:
+        conditions.append("amount <= %s")
+        params.append(filters["amount_max"])
+    if filters.get("date_from") is not None:
+        conditions.append("funding_date >= %s")
+        params.append(filters["date_from"])
+    if filters.get("date_to") is not None:
+        conditions.append("funding_date <= %s")
+        params.append(filters["date_to"])
+
+    return " AND ".join(conditions), params
+
+
+def search_extractions(
+    user_id, filters=None, sort="recent", page=0, page_size=50, fields=None
+):
+    """
+    Recherche dans l'historique d'un utilisateur, filtres et tri appliqués en base.
+
+    `filters` accepte les clés `startup` (préfixe du nom), `investor` et `source_url`
+    (texte contenu), `round` (tour exact), `amount_min`/`amount_max` (M€) et
+    `date_from`/`date_to` (date de levée). `sort` est une clé de SEARCH_SORTS et
+    `page` commence à 0. Retourne (extractions de la page, nombre total de résultats).
+    """
+    if sort not in SEARCH_SORTS:
+        raise ValueError(f"Tri inconnu : {sort}")
+    columns = _select_fields(fields)
+    where, params = _search_conditions(user_id, filters or {})
+
+    with db_connection() as conn:
+        if conn is None:
+            return [], 0
+
+        try:
+            with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
+                cur.execute(f"SELECT COUNT(*) FROM extractions WHERE {where}", params)
+                total = cur.fetchone()[0]
+                if not total:
+                    return [], 0
+                cur.execute(
+                    f"""
+                    SELECT {columns} FROM extractions
+                    WHERE {where}
+                    ORDER BY {SEARCH_SORTS[sort]}
+                    LIMIT %s OFFSET %s
+                    """,
+                    params + [page_size, page * page_size],
+                )
+                return cur.fetchall(), total
+        except Exception as e:
+            st.error(f"Erreur lors de la recherche des extractions : {e}")
+            return [], 0
+
+
+def stream_extractions(
+    user_id, filters=None, sort="recent", fields=None, batch_size=1000
+):
+    """
+    Parcourt les extractions d'un utilisateur avec un curseur côté serveur (curseur nommé).
+
+    Les lignes arrivent par lots de `batch_size` : l'historique n'est jamais chargé
+    entièrement en mémoire. La connexion reste empruntée pendant tout le parcours.
+    Mêmes `filters` et `sort` que search_extractions.
+    """
+    if sort not in SEARCH_SORTS:
+        raise ValueError(f"Tri inconnu : {sort}")
+    columns = _select_fields(fields)
+    where, params = _search_conditions(user_id, filters or {})
+
+    with db_connection() as conn:
+        if conn is None:
+            return
+
+        try:
+            with conn.cursor(
+                name=f"export_{uuid.uuid4().hex}",
+                cursor_factory=psycopg2.extras.DictCursor,
+            ) as cur:
+                cur.itersize = batch_size
+                cur.execute(
+                    f"SELECT {columns} FROM extractions WHERE {where} ORDER BY {SEARCH_SORTS[sort]}",
+                    params,
+                )
+                yield from cur
+        except Exception as e:
+            st.error(f"Erreur lors de la lecture des extractions : {e}")
+
+
+def get_funding_rounds(user_id):
+    """Retourne les types de tour présents dans l'historique de l'utilisateur."""
+    with db_connection() as conn:
+        if conn is None:
+            return []
+
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    SELECT DISTINCT funding_round FROM extractions
+                    WHERE user_id = %s AND funding_round IS NOT NULL
+                    ORDER BY funding_round
+                    """,
+                    (user_id,),
+                )
+                return [row[0] for row in cur.fetchall()]
+        except Exception as e:
+            st.error(f"Erreur pour récupérer les types de tour : {e}")
+            return []
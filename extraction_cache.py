@@ -0,0 +1,172 @@
+"""
+Cache local des réponses du LLM, adressé par le contenu de l'article
+
+Une extraction est identifiée par le hash du contenu, le hash du prompt système,
+le modèle et la température. Les résultats sont stockés dans un fichier SQLite,
+avec éviction par ancienneté et par nombre d'entrées.
+"""
+
+import functools
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import prompt_manager
+
+CACHE_ENABLED = os.getenv("EXTRACTION_CACHE_ENABLED", "true").lower() == "true"
+CACHE_PATH = os.getenv(
+    "EXTRACTION_CACHE_PATH", os.path.join(".cache", "extractions.sqlite3")
+)
+CACHE_MAX_ENTRIES = int(os.getenv("EXTRACTION_CACHE_MAX_ENTRIES", "50000"))
+CACHE_MAX_AGE_DAYS = float(os.getenv("EXTRACTION_CACHE_MAX_AGE_DAYS", "30"))
+
+# Fréquence de l'éviction (toutes les N écritures)
+EVICTION_INTERVAL = 500
+
+
+def _sha256(text):
+    """Même hash que database.calculate_content_hash : les clés existantes restent valides."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+@functools.lru_cache(maxsize=32)
+def prompt_hash(system_prompt):
+    """
+    Hash du prompt système, mémorisé : le même prompt (jusqu'à ~35 Ko) sert pour tout un
+    lot. Celui d'un prompt prédéfini est déjà calculé par prompt_manager.
+    """
+    return prompt_manager.get_prompt_hash(system_prompt) or _sha256(system_prompt)
+
+
+def make_cache_key(content_hash, system_prompt, model, temperature):
+    """Construit la clé de cache d'une extraction."""
+    prompt_hash_value = prompt_hash(system_prompt)
+    return _sha256(f"{content_hash}:{prompt_hash_value}:{model}:{temperature}")
+
+
+class ExtractionCache:
+    """Cache SQLite des extractions LLM, partageable entre threads."""
+
+    def __init__(
+        self,
+        path=CACHE_PATH,
+        max_entries=CACHE_MAX_ENTRIES,
+        max_age_days=CACHE_MAX_AGE_DAYS,
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_days * 86400
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                cache_key TEXT PRIMARY KEY,
+                model TEXT,
+                extracted_data TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_llm_cache_last_access ON llm_cache(last_access)"
+        )
+        self._conn.commit()
+        self.evict()
+
+    def get(self, cache_key):
+        """Retourne l'extraction en cache (dict) ou None."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT extracted_data, created_at FROM llm_cache WHERE cache_key = ?",
+                (cache_key,),
+            ).fetchone()
+            if row is None or now - row[1] > self.max_age_seconds:
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE llm_cache SET last_access = ? WHERE cache_key = ?",
+                (now, cache_key),
+            )
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, cache_key, extracted_data, model=None):
+        """Enregistre une extraction dans le cache."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO llm_cache (cache_key, model, extracted_data, created_at, last_access)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (cache_key) DO UPDATE SET
+                    extracted_data = excluded.extracted_data,
+                    created_at = excluded.created_at,
+                    last_access = excluded.last_access
+                """,
+                (
+                    cache_key,
+                    model,
+                    json.dumps(extracted_data, ensure_ascii=False),
+                    now,
+                    now,
+                ),
+            )
+            self._conn.commit()
+            self._writes += 1
+            should_evict = self._writes % EVICTION_INTERVAL == 0
+        if should_evict:
+            self.evict()
+
+    def evict(self):
+        """Supprime les entrées expirées puis les moins récemment utilisées au-delà de max_entries."""
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM llm_cache WHERE created_at < ?",
+                (time.time() - self.max_age_seconds,),
+            )
+            self._conn.execute(
+                """
+                DELETE FROM llm_cache WHERE cache_key IN (
+                    SELECT cache_key FROM llm_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entries,),
+            )
+            self._conn.commit()
+
+    def stats(self):
+        """Retourne les compteurs de hits/misses depuis le démarrage du processus."""
+        return {"hits": self.hits, "misses": self.misses}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Retourne le cache partagé du processus, ou None si le cache est désactivé ou indisponible."""
+    global _cache
+    if not CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                try:
+                    _cache = ExtractionCache()
+                except sqlite3.Error as e:
+                    print(f"Cache des extractions indisponible: {e}")
+                    return None
+    return _cache
@@ -0,0 +1,148 @@
+"""
+Mise à plat partagée des extractions (historique, aperçus, exports)
+
+Transforme un lot de lignes de la table `extractions` en tableau pandas à colonnes
+fixes : JSON décodé une seule fois, investisseurs joints, Date_levée découpée en
+jour/mois/année. Les tableaux sont mémorisés par (utilisateur, jeton de modification,
+lignes) : un rerun Streamlit sans nouvelle extraction ne refait pas le travail.
+"""
+
+import json
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+# Colonnes du tableau de l'historique et de l'export CSV
+COLUMNS = [
+    "ID",
+    "Date_extraction",
+    "Nom_start-up",
+    "Type",
+    "Montant",
+    "Date_levée",
+    "Jour",
+    "Mois",
+    "Année",
+    "Tour",
+    "Investisseurs",
+    "Lien",
+]
+
+# Clés lues dans extracted_data
+JSON_FIELDS = [
+    "Nom_start-up",
+    "Type",
+    "Montant",
+    "Date_levée",
+    "Tour",
+    "Investisseurs",
+    "Lien",
+]
+
+# Nombre de tableaux gardés en mémoire (toutes pages et tous utilisateurs confondus)
+MEMO_SIZE = 64
+
+_memo = OrderedDict()
+_memo_lock = threading.Lock()
+
+
+def parse_extracted_data(data):
+    """Retourne extracted_data sous forme de dict (la colonne peut arriver en texte)."""
+    if isinstance(data, str):
+        try:
+            data = json.loads(data)
+        except json.JSONDecodeError:
+            return {"error": "invalid json"}
+    return data if isinstance(data, dict) else {}
+
+
+def _join_investors(value):
+    if isinstance(value, list):
+        return ", ".join(str(investor) for investor in value) if value else None
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return None
+    return str(value) if value else None
+
+
+def flatten_extractions(extractions, missing="N/A"):
+    """
+    Met à plat un lot d'extractions en DataFrame (colonnes COLUMNS).
+
+    Chaque ligne doit fournir `id`, `created_at` et `extracted_data` (et, si
+    disponible, `source_url`). Les valeurs absentes sont remplacées par `missing`.
+    """
+    extractions = list(extractions)
+    if not extractions:
+        return pd.DataFrame(columns=COLUMNS)
+
+    fields = pd.DataFrame.from_records(
+        [parse_extracted_data(ext["extracted_data"]) for ext in extractions],
+        columns=JSON_FIELDS,
+    ).astype(object)
+    source_urls = pd.Series([ext.get("source_url") or None for ext in extractions])
+
+    # Date_levée au format JJ/MM/AAAA : découpée seulement si elle a trois parties
+    dates = fields["Date_levée"].where(fields["Date_levée"].map(bool)).astype(object)
+    date_parts = (
+        dates.where(dates.map(lambda value: isinstance(value, str)))
+        .astype("string")
+        .str.extract(r"^([^/]*)/([^/]*)/([^/]*)$")
+    )
+
+    # Lien de l'article, sinon URL source enregistrée avec l'extraction
+    links = fields["Lien"].where(fields["Lien"].map(bool)).fillna(source_urls)
+
+    table = pd.DataFrame(
+        {
+            "ID": [ext["id"] for ext in extractions],
+            "Date_extraction": [
+                ext["created_at"].strftime("%Y-%m-%d %H:%M") for ext in extractions
+            ],
+            "Nom_start-up": fields["Nom_start-up"],
+            "Type": fields["Type"],
+            "Montant": fields["Montant"],
+            "Date_levée": dates,
+            "Jour": date_parts[0].astype(object),
+            "Mois": date_parts[1].astype(object),
+            "Année": date_parts[2].astype(object),
+            "Tour": fields["Tour"],
+            "Investisseurs": fields["Investisseurs"].map(_join_investors),
+            "Lien": links,
+        },
+        columns=COLUMNS,
+    )
+    table[COLUMNS[2:]] = (
+        table[COLUMNS[2:]].astype(object).where(table[COLUMNS[2:]].notna(), missing)
+    )
+    return table
+
+
+def get_table(user_id, change_token, extractions, missing="N/A"):
+    """
+    Retourne le tableau mis à plat des extractions, mémorisé.
+
+    `change_token` (voir `database.get_change_token`) change à chaque écriture dans
+    l'historique de l'utilisateur, ce qui invalide les tableaux mémorisés. Le tableau
+    renvoyé est partagé : ne pas le modifier en place.
+    """
+    extractions = list(extractions)
+    key = (user_id, change_token, tuple(ext["id"] for ext in extractions), missing)
+    with _memo_lock:
+        table = _memo.get(key)
+        if table is not None:
+            _memo.move_to_end(key)
+            return table
+
+    table = flatten_extractions(extractions, missing=missing)
+    with _memo_lock:
+        _memo[key] = table
+        while len(_memo) > MEMO_SIZE:
+            _memo.popitem(last=False)
+    return table
+
+
+def clear_memo():
+    """Vide les tableaux mémorisés."""
+    with _memo_lock:
+        _memo.clear()
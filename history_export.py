@@ -0,0 +1,162 @@
+"""
+Export de l'historique des extractions en flux (CSV, NDJSON ou archive ZIP de JSON)
+
+Les extractions sont lues avec un curseur côté serveur (`database.stream_extractions`)
+et écrites au fil de l'eau dans un fichier : la mémoire utilisée ne dépend pas de la
+taille de l'historique. Utilisable depuis l'application ou en ligne de commande :
+
+    python history_export.py --user alice --format csv --output historique.csv
+"""
+
+import argparse
+import io
+import json
+import os
+import sys
+import zipfile
+from datetime import datetime
+
+import pandas as pd
+
+import database
+import extractions_view
+
+EXPORT_FORMATS = {
+    "csv": ("csv", "text/csv"),
+    "ndjson": ("ndjson", "application/x-ndjson"),
+    "zip": ("zip", "application/zip"),
+}
+
+EXPORT_FIELDS = ("id", "extracted_data", "source_url", "created_at")
+
+# Nombre d'extractions mises à plat et écrites à la fois dans le CSV
+CSV_CHUNK_SIZE = 1000
+
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def write_csv(extractions, fileobj):
+    """Écrit les extractions en CSV (UTF-8 avec BOM, lisible par Excel) dans un fichier binaire."""
+    text = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+    try:
+        # En-tête seul, puis les lignes par paquets
+        pd.DataFrame(columns=extractions_view.COLUMNS).to_csv(text, index=False)
+        count = 0
+        for chunk in _chunks(extractions, CSV_CHUNK_SIZE):
+            extractions_view.flatten_extractions(chunk).to_csv(
+                text, header=False, index=False
+            )
+            count += len(chunk)
+        text.flush()
+        return count
+    finally:
+        # Rendre le fichier à l'appelant sans le fermer
+        text.detach()
+
+
+def write_ndjson(extractions, fileobj):
+    """Écrit une extraction JSON par ligne dans un fichier binaire."""
+    count = 0
+    for ext in extractions:
+        line = json.dumps(
+            {
+                "id": ext["id"],
+                "created_at": ext["created_at"].isoformat(),
+                "source_url": ext.get("source_url"),
+                "extracted_data": extractions_view.parse_extracted_data(
+                    ext["extracted_data"]
+                ),
+            },
+            ensure_ascii=False,
+        )
+        fileobj.write(line.encode("utf-8") + b"\n")
+        count += 1
+    return count
+
+
+def write_json_zip(extractions, fileobj):
+    """Écrit une archive ZIP contenant un fichier extraction_<id>.json par extraction."""
+    count = 0
+    with zipfile.ZipFile(fileobj, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for ext in extractions:
+            archive.writestr(
+                f"extraction_{ext['id']}.json",
+                json.dumps(
+                    extractions_view.parse_extracted_data(ext["extracted_data"]),
+                    indent=2,
+                    ensure_ascii=False,
+                ),
+            )
+            count += 1
+    return count
+
+
+WRITERS = {"csv": write_csv, "ndjson": write_ndjson, "zip": write_json_zip}
+
+
+def export_history(user_id, export_format, fileobj, filters=None, sort="recent"):
+    """Exporte l'historique (filtré) d'un utilisateur dans `fileobj`. Retourne le nombre d'extractions écrites."""
+    if export_format not in WRITERS:
+        raise ValueError(f"Format d'export inconnu : {export_format}")
+    extractions = database.stream_extractions(
+        user_id, filters=filters, sort=sort, fields=EXPORT_FIELDS
+    )
+    return WRITERS[export_format](extractions, fileobj)
+
+
+def default_file_name(username, export_format):
+    """Nom de fichier proposé pour un export."""
+    extension = EXPORT_FORMATS[export_format][0]
+    return (
+        f"historique_extractions_{username}_{datetime.now():%Y%m%d-%H%M%S}.{extension}"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Export de l'historique des extractions d'un utilisateur."
+    )
+    parser.add_argument(
+        "--user",
+        type=str,
+        required=True,
+        help="Nom d'utilisateur dont l'historique est exporté.",
+    )
+    parser.add_argument(
+        "--format",
+        choices=list(EXPORT_FORMATS),
+        default="csv",
+        help="'csv' : tableau de l'historique ; 'ndjson' : une extraction JSON par ligne ; 'zip' : archive d'un fichier JSON par extraction.",
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        help="Fichier de sortie ('-' pour la sortie standard). Par défaut : historique_extractions_<user>_<date>.<format>",
+    )
+    args = parser.parse_args()
+
+    user = database.get_user(args.user)
+    if not user:
+        print(f"ERREUR: L'utilisateur '{args.user}' n'existe pas.", file=sys.stderr)
+        sys.exit(1)
+
+    output = args.output or default_file_name(args.user, args.format)
+    if output == "-":
+        count = export_history(user["id"], args.format, sys.stdout.buffer)
+        sys.stdout.buffer.flush()
+    else:
+        # Écrire dans un fichier temporaire pour ne jamais laisser un export incomplet
+        tmp_path = f"{output}.tmp"
+        with open(tmp_path, "wb") as f:
+            count = export_history(user["id"], args.format, f)
+        os.replace(tmp_path, output)
+    print(f"{count} extraction(s) exportée(s) vers {output}.", file=sys.stderr)
@@ -0,0 +1,143 @@
+"""
+Clients HTTP partagés pour les appels au LLM (OpenAI ou API compatible LM Studio)
+
+Les clients sont créés une seule fois par processus (CLI comme application Streamlit)
+et gardent leurs connexions ouvertes (keep-alive) d'un appel à l'autre.
+"""
+
+import asyncio
+import os
+import threading
+import weakref
+
+import httpx
+import requests
+from openai import DEFAULT_MAX_RETRIES, AsyncOpenAI, OpenAI
+from requests.adapters import HTTPAdapter
+
+# Taille du pool de connexions HTTP (à aligner sur le nombre de workers)
+POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "20"))
+# Timeouts en secondes : établissement de la connexion / attente de la réponse du LLM
+CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "10"))
+READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "120"))
+
+# Limites du client HTTP asynchrone partagé
+ASYNC_MAX_CONNECTIONS = int(os.getenv("LLM_ASYNC_MAX_CONNECTIONS", "100"))
+
+_lock = threading.Lock()
+_http_session = None
+# Clients OpenAI par (clé API, nombre de nouvelles tentatives du SDK)
+_openai_clients = {}
+
+# Un client httpx est lié à la boucle d'événements qui l'utilise : on en garde un par boucle
+# (Streamlit crée une nouvelle boucle à chaque asyncio.run).
+_async_http_clients = weakref.WeakKeyDictionary()
+_async_openai_clients = weakref.WeakKeyDictionary()
+
+
+def get_request_timeout():
+    """Retourne le timeout (connexion, lecture) à passer à `requests`."""
+    return (CONNECT_TIMEOUT, READ_TIMEOUT)
+
+
+def _httpx_timeout():
+    return httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT)
+
+
+def get_http_session():
+    """Retourne la session `requests` partagée, avec un pool de connexions keep-alive."""
+    global _http_session
+    if _http_session is None:
+        with _lock:
+            if _http_session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE
+                )
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _http_session = session
+    return _http_session
+
+
+def get_openai_client(api_key, max_retries=DEFAULT_MAX_RETRIES):
+    """
+    Retourne le client OpenAI partagé pour cette clé API. `max_retries=0` désactive les
+    nouvelles tentatives du SDK (quand l'appelant les gère, voir rate_limiter).
+    """
+    key = (api_key, max_retries)
+    client = _openai_clients.get(key)
+    if client is None:
+        with _lock:
+            client = _openai_clients.get(key)
+            if client is None:
+                client = OpenAI(
+                    api_key=api_key,
+                    timeout=_httpx_timeout(),
+                    max_retries=max_retries,
+                    http_client=httpx.Client(
+                        timeout=_httpx_timeout(),
+                        limits=httpx.Limits(
+                            max_connections=POOL_SIZE,
+                            max_keepalive_connections=POOL_SIZE,
+                        ),
+                    ),
+                )
+                _openai_clients[key] = client
+    return client
+
+
+def get_async_http_client():
+    """Retourne le client httpx asynchrone partagé par la boucle d'événements courante."""
+    loop = asyncio.get_running_loop()
+    client = _async_http_clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            timeout=_httpx_timeout(),
+            limits=httpx.Limits(
+                max_connections=ASYNC_MAX_CONNECTIONS,
+                max_keepalive_connections=ASYNC_MAX_CONNECTIONS,
+            ),
+        )
+        _async_http_clients[loop] = client
+        _async_openai_clients.pop(loop, None)
+    return client
+
+
+def get_async_openai_client(api_key, max_retries=DEFAULT_MAX_RETRIES):
+    """Retourne un client AsyncOpenAI qui réutilise le client httpx partagé (voir `get_openai_client`)."""
+    loop = asyncio.get_running_loop()
+    http_client = get_async_http_client()
+    clients = _async_openai_clients.setdefault(loop, {})
+    key = (api_key, max_retries)
+    client = clients.get(key)
+    if client is None:
+        client = AsyncOpenAI(
+            api_key=api_key,
+            timeout=_httpx_timeout(),
+            max_retries=max_retries,
+            http_client=http_client,
+        )
+        clients[key] = client
+    return client
+
+
+async def close_async_clients():
+    """Ferme les clients asynchrones de la boucle courante (à appeler avant la fin de la boucle)."""
+    loop = asyncio.get_running_loop()
+    _async_openai_clients.pop(loop, None)
+    client = _async_http_clients.pop(loop, None)
+    if client is not None:
+        await client.aclose()
+
+
+def close_clients():
+    """Ferme la session HTTP et les clients OpenAI partagés (fin de processus, tests)."""
+    global _http_session
+    with _lock:
+        if _http_session is not None:
+            _http_session.close()
+            _http_session = None
+        for client in _openai_clients.values():
+            client.close()
+        _openai_clients.clear()
@@ -0,0 +1,260 @@
+"""
+Lecture tolérante du JSON renvoyé par le LLM
+
+Les réponses invalides sont souvent faciles à corriger localement : bloc ```json ... ```,
+virgule avant une accolade fermante, texte autour de l'objet, ou réponse coupée par
+la limite de tokens. `loads` corrige ces cas en quelques millisecondes, avant de
+recourir à un appel de réparation au LLM (plusieurs secondes et tout l'historique
+renvoyé).
+
+Une réponse tronquée est coupée après le dernier élément complet (le champ en cours
+d'écriture est abandonné) puis les objets et tableaux ouverts sont refermés.
+"""
+
+import json
+import re
+
+CODE_FENCE = re.compile(r"```[a-zA-Z]*[ \t]*\n?(.*?)(?:\n?```|$)", re.DOTALL)
+
+CLOSERS = {"{": "}", "[": "]"}
+
+_decoder = json.JSONDecoder()
+
+
+def strip_code_fences(text):
+    """Retourne le contenu du premier bloc ``` ... ``` (même non refermé), ou le texte tel quel."""
+    match = CODE_FENCE.search(text)
+    return match.group(1) if match else text
+
+
+def _repair(text, start):
+    """
+    Réécrit le JSON qui commence à `start` : supprime les virgules superflues et, si le
+    texte s'arrête avant la fin de la structure, la referme après le dernier élément
+    complet. Génère les textes candidats, du plus complet au plus court : un seul si
+    la structure est refermée dans le texte.
+    """
+    out = []
+    stack = []
+    # Points de coupure : longueur de `out` après un élément complet, et pile à ce moment
+    cuts = []
+    in_string = False
+    escape = False
+    position = start
+    length = len(text)
+
+    while position < length:
+        char = text[position]
+        position += 1
+        if in_string:
+            out.append(char)
+            if escape:
+                escape = False
+            elif char == "\\":
+                escape = True
+            elif char == '"':
+                in_string = False
+            elif char == "\n":
+                # Retour à la ligne brut dans une chaîne : invalide en JSON
+                out[-1] = "\\n"
+            continue
+
+        if char == '"':
+            in_string = True
+            out.append(char)
+        elif char in CLOSERS:
+            stack.append(char)
+            out.append(char)
+        elif char in "}]":
+            if not stack or CLOSERS[stack[-1]] != char:
+                # Fermeture sans ouverture correspondante : fin de la structure
+                break
+            stack.pop()
+            out.append(char)
+            if not stack:
+                yield "".join(out)
+                return
+            cuts.append((len(out), tuple(stack)))
+        elif char == ",":
+            following = position
+            while following < length and text[following].isspace():
+                following += 1
+            if following == length or text[following] in "}]":
+                # Virgule finale (ou réponse coupée juste après)
+                continue
+            cuts.append((len(out), tuple(stack)))
+            out.append(char)
+        else:
+            out.append(char)
+
+    # Structure non refermée : réponse tronquée
+    out = "".join(out)
+    if not in_string:
+        tail = out.rstrip()
+        # Dernier élément gardé seulement s'il est certainement complet (un nombre
+        # coupé serait lu comme une autre valeur)
+        if tail and tail[-1] in '"}]':
+            yield tail + _closing(stack)
+    for cut, cut_stack in reversed(cuts):
+        yield out[:cut] + _closing(cut_stack)
+
+
+def _closing(stack):
+    return "".join(CLOSERS[opener] for opener in reversed(stack))
+
+
+def _balanced_end(text, start):
+    """Position qui suit la structure ouverte à `start`, ou None si elle n'est pas refermée."""
+    depth = 0
+    in_string = False
+    escape = False
+    for position in range(start, len(text)):
+        char = text[position]
+        if in_string:
+            if escape:
+                escape = False
+            elif char == "\\":
+                escape = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in CLOSERS:
+            depth += 1
+        elif char in "}]":
+            depth -= 1
+            if depth == 0:
+                return position + 1
+    return None
+
+
+def _loads_at(text, start):
+    """Lit la structure qui commence à `start` ; retourne `(valeur, corrige)` ou None."""
+    try:
+        value, _ = _decoder.raw_decode(text, start)
+        return value, False
+    except ValueError:
+        pass
+
+    for candidate in _repair(text, start):
+        try:
+            value = json.loads(candidate)
+        except ValueError:
+            continue
+        if not value:
+            # Rien de complet avant la coupure
+            return None
+        return value, True
+    return None
+
+
+def loads(text, opening="{"):
+    """
+    Lit la première structure JSON (objet si `opening` vaut "{", tableau pour "[")
+    de la réponse du LLM.
+
+    Une structure refermée mais invalide (« {source} » dans le texte qui précède le
+    JSON) ou vide (« {} » cité en exemple) est ignorée et la suivante est essayée ; une
+    structure vide n'est retournée que s'il n'y en a pas d'autre.
+
+    Retourne `(valeur, corrige)`, `corrige` indiquant qu'une correction locale a été
+    nécessaire. Lève ValueError si aucune structure exploitable n'est trouvée.
+    """
+    text = strip_code_fences(text)
+    start = text.find(opening)
+    if start == -1:
+        raise ValueError(f"Aucun JSON commençant par « {opening} » dans la réponse.")
+
+    empty = None
+    while start != -1:
+        result = _loads_at(text, start)
+        if result is not None:
+            if result[0]:
+                return result
+            empty = empty or result
+        end = _balanced_end(text, start)
+        if end is None:
+            # Structure tronquée : tout ce qui suit en fait partie
+            break
+        start = text.find(opening, end)
+    if empty is not None:
+        return empty
+    raise ValueError("JSON invalide ou tronqué, non réparable localement.")
+
+
+class StreamScanner:
+    """
+    Suit une réponse reçue morceau par morceau (streaming) et détecte la fin de la
+    première structure JSON, pour interrompre la réception sans attendre le texte qui
+    suit éventuellement.
+
+    Seule une structure commençant par `opening` (celui passé à `loads`) est suivie, et
+    elle n'est déclarée complète que si `loads` la lit : des crochets ou accolades dans
+    le texte qui précède le JSON (« [JSON] », « {source} ») ne coupent pas la réception.
+    """
+
+    def __init__(self, opening="{"):
+        self.opening = opening
+        self._parts = []
+        self._length = 0
+        # Position du début de la structure en cours dans le texte reçu (None : pas encore)
+        self._start = None
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self.complete = False
+
+    @property
+    def text(self):
+        """Texte reçu jusqu'ici."""
+        return "".join(self._parts)
+
+    def feed(self, delta):
+        """Ajoute un morceau de réponse ; retourne True quand la structure JSON est complète."""
+        offset = self._length
+        self._parts.append(delta)
+        self._length += len(delta)
+        if self.complete:
+            return True
+        for index, char in enumerate(delta):
+            if self._start is None:
+                if char == self.opening:
+                    self._start = offset + index
+                    self._depth = 1
+                continue
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in CLOSERS:
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    if self._is_valid(offset + index + 1):
+                        self.complete = True
+                        return True
+                    # Pas du JSON : on attend la structure suivante
+                    self._start = None
+        return False
+
+    def _is_valid(self, end):
+        try:
+            value, _ = loads(self.text[self._start : end], self.opening)
+        except ValueError:
+            return False
+        # « {} » vide dans le texte d'introduction n'est pas la réponse attendue
+        return bool(value)
+
+    def partial(self):
+        """Champs complets reçus jusqu'ici (voir `loads`), ou None si rien d'exploitable."""
+        try:
+            value, _ = loads(self.text, self.opening)
+        except ValueError:
+            return None
+        return value
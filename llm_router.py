@@ -0,0 +1,197 @@
+"""
+Répartition des requêtes entre plusieurs serveurs LLM compatibles OpenAI
+
+Les serveurs locaux (LM Studio, llama.cpp...) sont décrits par `LLM_ENDPOINTS` :
+des entrées `url|poids|max` séparées par des virgules, `max` étant le nombre de
+requêtes simultanées accepté par le serveur (0 = illimité).
+
+- Chaque requête part vers le serveur disponible le moins chargé relativement à son
+  poids (requêtes en cours / poids).
+- Un serveur qui échoue `LLM_ENDPOINT_MAX_FAILURES` fois de suite (réseau, 5xx) est
+  écarté ; un thread interroge alors son `/models` à intervalles réguliers et le
+  réintègre dès qu'il répond.
+- Quand tous les serveurs sont pleins ou écartés, la requête part vers OpenAI si le
+  débordement est activé ; sinon elle attend une place (serveurs pleins) ou échoue
+  (tous écartés), ce que rate_limiter traite comme une erreur transitoire.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+
+import llm_client
+import rate_limiter
+
+# Échecs consécutifs avant d'écarter un serveur
+MAX_FAILURES = int(os.getenv("LLM_ENDPOINT_MAX_FAILURES", "3"))
+# Intervalle (s) entre deux vérifications d'un serveur écarté
+HEALTH_CHECK_INTERVAL = float(os.getenv("LLM_HEALTH_CHECK_INTERVAL", "15"))
+HEALTH_CHECK_TIMEOUT = 5
+# Intervalle de vérification d'une place libre pour les appels asynchrones
+ASYNC_POLL_INTERVAL = 0.05
+
+# Cible renvoyée par `acquire` quand la requête doit partir vers OpenAI
+OPENAI = "openai"
+
+
+class NoEndpointAvailable(requests.exceptions.ConnectionError):
+    """Tous les serveurs LLM sont écartés et le débordement vers OpenAI est désactivé."""
+
+
+class Endpoint:
+    """Serveur LLM local et son état (requêtes en cours, échecs, compteurs)."""
+
+    def __init__(self, url, weight=1.0, max_concurrency=0):
+        self.url = url
+        self.weight = weight if weight > 0 else 1.0
+        self.max_concurrency = max_concurrency
+        self.name = urlparse(url).netloc or url
+        self.in_flight = 0
+        self.failures = 0
+        self.healthy = True
+        self.requests = 0
+        self.errors = 0
+        self.ejections = 0
+
+    def has_capacity(self):
+        return self.healthy and (
+            not self.max_concurrency or self.in_flight < self.max_concurrency
+        )
+
+    def load(self):
+        """Charge relative après ajout d'une requête (plus bas = prioritaire)."""
+        return (self.in_flight + 1) / self.weight
+
+
+def parse_endpoints(value, default_url):
+    """Lit la liste `url|poids|max,...` ; sans entrée, un seul serveur `default_url`."""
+    endpoints = []
+    for entry in value.split(","):
+        parts = [part.strip() for part in entry.split("|")]
+        if not parts[0]:
+            continue
+        weight = float(parts[1]) if len(parts) > 1 and parts[1] else 1.0
+        max_concurrency = int(parts[2]) if len(parts) > 2 and parts[2] else 0
+        endpoints.append(Endpoint(parts[0], weight, max_concurrency))
+    return endpoints or [Endpoint(default_url)]
+
+
+def health_url(url):
+    """URL de vérification d'un serveur : `/models` à côté de `/chat/completions`."""
+    base = url.rstrip("/").removesuffix("/chat/completions")
+    return f"{base}/models"
+
+
+def check_health(endpoint):
+    """Indique si le serveur répond (toute réponse HTTP hors 5xx)."""
+    try:
+        response = llm_client.get_http_session().get(
+            health_url(endpoint.url), timeout=HEALTH_CHECK_TIMEOUT
+        )
+    except requests.exceptions.RequestException:
+        return False
+    return response.status_code < 500
+
+
+def is_endpoint_failure(error):
+    """Erreur imputable au serveur (réseau, timeout, 5xx) ; un 429 signale une surcharge passagère."""
+    return (
+        rate_limiter.is_retryable(error) and rate_limiter.get_status_code(error) != 429
+    )
+
+
+class Router:
+    """Choisit le serveur de chaque requête et suit l'état des serveurs."""
+
+    def __init__(self, endpoints, openai_fallback=False):
+        self.endpoints = endpoints
+        self.openai_fallback = openai_fallback
+        self.fallback_requests = 0
+        self._condition = threading.Condition()
+
+    def _select(self):
+        """Réserve une place (à appeler sous le verrou) ; None si tous les serveurs sont pleins."""
+        available = [endpoint for endpoint in self.endpoints if endpoint.has_capacity()]
+        if available:
+            endpoint = min(available, key=Endpoint.load)
+            endpoint.in_flight += 1
+            endpoint.requests += 1
+            return endpoint
+        if self.openai_fallback:
+            self.fallback_requests += 1
+            return OPENAI
+        if not any(endpoint.healthy for endpoint in self.endpoints):
+            raise NoEndpointAvailable(
+                "Aucun serveur LLM disponible : tous sont écartés après des échecs."
+            )
+        return None
+
+    def acquire(self):
+        """Retourne le serveur (Endpoint) ou OPENAI pour la prochaine requête."""
+        with self._condition:
+            while True:
+                target = self._select()
+                if target is not None:
+                    return target
+                self._condition.wait()
+
+    async def acquire_async(self):
+        """Version asynchrone de `acquire`."""
+        while True:
+            with self._condition:
+                target = self._select()
+            if target is not None:
+                return target
+            await asyncio.sleep(ASYNC_POLL_INTERVAL)
+
+    def release(self, target, error=None):
+        """Libère la place prise par `acquire` ; `error` est l'exception de la requête, s'il y en a une."""
+        if target is OPENAI:
+            return
+        with self._condition:
+            target.in_flight -= 1
+            if error is None:
+                target.failures = 0
+            elif is_endpoint_failure(error):
+                target.failures += 1
+                target.errors += 1
+                if target.healthy and target.failures >= MAX_FAILURES:
+                    self._eject(target)
+            self._condition.notify_all()
+
+    def _eject(self, endpoint):
+        # Un serveur seul, sans débordement, n'est pas écarté : il n'y a pas d'alternative
+        if len(self.endpoints) == 1 and not self.openai_fallback:
+            return
+        endpoint.healthy = False
+        endpoint.ejections += 1
+        print(
+            f"Serveur LLM {endpoint.name} écarté après {endpoint.failures} échecs consécutifs."
+        )
+        threading.Thread(target=self._watch, args=(endpoint,), daemon=True).start()
+
+    def _watch(self, endpoint):
+        """Vérifie un serveur écarté jusqu'à ce qu'il réponde, puis le réintègre."""
+        while True:
+            time.sleep(HEALTH_CHECK_INTERVAL)
+            if check_health(endpoint):
+                with self._condition:
+                    endpoint.healthy = True
+                    endpoint.failures = 0
+                    self._condition.notify_all()
+                print(f"Serveur LLM {endpoint.name} réintégré.")
+                return
+
+    def stats(self):
+        """Compteurs cumulés : requêtes, erreurs et mises à l'écart par serveur, débordements."""
+        with self._condition:
+            stats = {"openai_fallback": self.fallback_requests}
+            for endpoint in self.endpoints:
+                stats[f"requests@{endpoint.name}"] = endpoint.requests
+                stats[f"errors@{endpoint.name}"] = endpoint.errors
+                stats[f"ejections@{endpoint.name}"] = endpoint.ejections
+            return stats
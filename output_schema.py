@@ -0,0 +1,123 @@
+"""
+Schéma JSON de la réponse attendue, déduit du prompt système
+
+Les prompts décrivent la réponse par un bloc « Voici le format JSON attendu : {...} »
+dont les valeurs sont des indications de type ("String", "Float (en M€)", liste...).
+Ce bloc est converti en JSON Schema strict, envoyé au LLM via `response_format` :
+OpenAI (structured outputs) et les serveurs locaux compatibles (LM Studio, llama.cpp,
+qui le traduit en grammaire) ne génèrent alors que du JSON conforme.
+"""
+
+import functools
+import json
+import re
+
+FORMAT_MARKER = re.compile(r"format JSON attendu\s*:?", re.IGNORECASE)
+
+# Indications de type numérique dans les valeurs d'exemple du format
+NUMBER_HINT = re.compile(r"\b(float|int|integer|number|nombre|entier)\b", re.IGNORECASE)
+
+
+def find_format_block(prompt):
+    """Retourne le bloc JSON du format attendu (dict), ou None si le prompt n'en a pas."""
+    match = FORMAT_MARKER.search(prompt)
+    if not match:
+        return None
+    start = prompt.find("{", match.end())
+    if start == -1:
+        return None
+
+    depth = 0
+    in_string = False
+    escape = False
+    for position in range(start, len(prompt)):
+        char = prompt[position]
+        if in_string:
+            if escape:
+                escape = False
+            elif char == "\\":
+                escape = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth == 0:
+                try:
+                    block = json.loads(prompt[start : position + 1])
+                except ValueError:
+                    return None
+                return block if isinstance(block, dict) and block else None
+    return None
+
+
+def _property_schema(example):
+    if isinstance(example, dict):
+        return schema_from_example(example)
+    if isinstance(example, list):
+        items = (
+            _property_schema(example[0])
+            if example and isinstance(example[0], dict)
+            else {"type": "string"}
+        )
+        return {"type": "array", "items": items}
+    if isinstance(example, bool):
+        return {"type": ["boolean", "null"]}
+    if isinstance(example, (int, float)):
+        return {"type": ["number", "null"]}
+    if isinstance(example, str) and NUMBER_HINT.search(example):
+        return {"type": ["number", "null"]}
+    return {"type": ["string", "null"]}
+
+
+def schema_from_example(example):
+    """
+    Convertit un exemple de réponse en JSON Schema strict.
+
+    Tous les champs sont requis (exigence du mode strict) mais peuvent valoir null,
+    sauf les listes, vides à défaut de valeur.
+    """
+    return {
+        "type": "object",
+        "properties": {key: _property_schema(value) for key, value in example.items()},
+        "required": list(example),
+        "additionalProperties": False,
+    }
+
+
+@functools.lru_cache(maxsize=32)
+def get_prompt_schema(prompt):
+    """JSON Schema de la réponse décrite par le prompt, ou None. Le dict renvoyé est partagé."""
+    block = find_format_block(prompt)
+    return schema_from_example(block) if block else None
+
+
+def pack_schema(schema):
+    """Schéma d'une réponse groupée : {"results": [{"id": n, "data": {...}}]}."""
+    return {
+        "type": "object",
+        "properties": {
+            "results": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {"id": {"type": "integer"}, "data": schema},
+                    "required": ["id", "data"],
+                    "additionalProperties": False,
+                },
+            }
+        },
+        "required": ["results"],
+        "additionalProperties": False,
+    }
+
+
+def response_format(schema, name="extraction"):
+    """Paramètre `response_format` (format OpenAI, repris par les serveurs compatibles)."""
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": name, "strict": True, "schema": schema},
+    }
@@ -1,13 +1,25 @@
 """
 Gestionnaire de prompts système prédéfinis
+
+Les prompts sont chargés une fois en mémoire (configuration, contenu, hash et nombre
+de tokens), indexés par ID et par contenu, et rechargés seulement quand la date de
+modification de prompts_config.json ou d'un fichier de prompt change. Le hash et le
+nombre de tokens servent aux clés du cache des extractions et au budget de contexte.
 """
 
+import hashlib
 import json
 import os
+import threading
+
+import token_counter
 
 PROMPTS_DIR = "prompts"
 CONFIG_FILE = os.path.join(PROMPTS_DIR, "prompts_config.json")
 
+_registry = {"signature": None, "prompts": [], "by_id": {}, "by_content": {}}
+_registry_lock = threading.Lock()
+
 
 def load_prompts_config():
     """Charge la configuration des prompts disponibles"""
@@ -18,15 +30,85 @@ def load_prompts_config():
         return {"prompts": []}
 
 
+def _mtime(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _signature(prompts):
+    """Dates de modification de la configuration et des fichiers de prompts."""
+    return (_mtime(CONFIG_FILE),) + tuple(
+        _mtime(os.path.join(PROMPTS_DIR, prompt["file"])) for prompt in prompts
+    )
+
+
+def _read_prompt_file(file_name):
+    try:
+        with open(os.path.join(PROMPTS_DIR, file_name), "r", encoding="utf-8") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def _load_registry():
+    prompts = load_prompts_config().get("prompts", [])
+    by_id = {}
+    by_content = {}
+    for prompt in prompts:
+        if prompt["id"] in by_id:
+            # Le premier prompt déclaré pour un ID l'emporte
+            continue
+        content = _read_prompt_file(prompt["file"])
+        by_id[prompt["id"]] = {
+            "info": prompt,
+            "content": content,
+            "content_hash": hashlib.sha256(content.encode("utf-8")).hexdigest()
+            if content is not None
+            else None,
+            "token_count": token_counter.count_tokens(content)
+            if content is not None
+            else None,
+        }
+        if content is not None:
+            by_content.setdefault(content, by_id[prompt["id"]])
+    return {
+        "signature": _signature(prompts),
+        "prompts": prompts,
+        "by_id": by_id,
+        "by_content": by_content,
+    }
+
+
+def _get_registry():
+    """Retourne le registre, rechargé si un fichier a changé depuis le dernier chargement."""
+    global _registry
+    registry = _registry
+    if registry["signature"] != _signature(registry["prompts"]):
+        with _registry_lock:
+            if _registry["signature"] != _signature(_registry["prompts"]):
+                _registry = _load_registry()
+            registry = _registry
+    return registry
+
+
+def reload_prompts():
+    """Force le rechargement des prompts depuis le disque."""
+    global _registry
+    with _registry_lock:
+        _registry = _load_registry()
+
+
 def get_available_prompts():
     """Retourne la liste des prompts disponibles"""
-    config = load_prompts_config()
-    return config.get("prompts", [])
+    return [dict(prompt) for prompt in _get_registry()["prompts"]]
 
 
 def get_default_prompt_id():
     """Retourne l'ID du prompt par défaut"""
-    prompts = get_available_prompts()
+    prompts = _get_registry()["prompts"]
     for prompt in prompts:
         if prompt.get("default", False):
             return prompt["id"]
@@ -36,22 +118,29 @@ def get_default_prompt_id():
 
 def get_prompt_by_id(prompt_id):
     """Retourne le contenu d'un prompt par son ID"""
-    prompts = get_available_prompts()
-    for prompt in prompts:
-        if prompt["id"] == prompt_id:
-            file_path = os.path.join(PROMPTS_DIR, prompt["file"])
-            try:
-                with open(file_path, "r", encoding="utf-8") as f:
-                    return f.read()
-            except FileNotFoundError:
-                return None
-    return None
+    entry = _get_registry()["by_id"].get(prompt_id)
+    return entry["content"] if entry else None
 
 
 def get_prompt_info(prompt_id):
     """Retourne les informations sur un prompt"""
-    prompts = get_available_prompts()
-    for prompt in prompts:
-        if prompt["id"] == prompt_id:
-            return prompt
-    return None
+    entry = _get_registry()["by_id"].get(prompt_id)
+    return dict(entry["info"]) if entry else None
+
+
+def get_prompt_hash(content):
+    """
+    Retourne le hash SHA256 précalculé d'un prompt prédéfini de ce contenu (même calcul
+    que database.calculate_content_hash), ou None pour un prompt personnalisé
+    """
+    entry = _get_registry()["by_content"].get(content)
+    return entry["content_hash"] if entry else None
+
+
+def get_prompt_token_count(content):
+    """
+    Retourne le nombre de tokens précalculé d'un prompt prédéfini de ce contenu (modèle
+    par défaut de token_counter), ou None pour un prompt personnalisé
+    """
+    entry = _get_registry()["by_content"].get(content)
+    return entry["token_count"] if entry else None
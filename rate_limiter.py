@@ -0,0 +1,298 @@
+"""
+Limitation de débit et nouvelles tentatives des appels au LLM
+
+Un limiteur partagé par tout le processus (threads comme boucles asyncio) :
+
+- deux seaux à jetons, requêtes par minute (`LLM_RPM`) et tokens par minute
+  (`LLM_TPM`), qui espacent les requêtes avant que le fournisseur ne les refuse ;
+- les erreurs transitoires (429, 5xx, connexion coupée, timeout) sont retentées avec
+  un délai exponentiel aléatoire, ou le délai `Retry-After` indiqué par le serveur ;
+  après un 429, toutes les requêtes attendent ce délai ;
+- le nombre de requêtes simultanées s'adapte : divisé par deux sur 429/5xx, augmenté
+  d'une unité par série de requêtes réussies, jusqu'à `LLM_MAX_CONCURRENCY`.
+"""
+
+import asyncio
+import email.utils
+import os
+import random
+import threading
+import time
+
+import httpx
+import openai
+import requests
+
+# Quotas du fournisseur (0 = pas de limite connue)
+LLM_RPM = int(os.getenv("LLM_RPM", "0"))
+LLM_TPM = int(os.getenv("LLM_TPM", "0"))
+# Plafond des requêtes LLM simultanées dans le processus
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "64"))
+# Nouvelles tentatives après une erreur transitoire, et bornes du délai d'attente (s)
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "5"))
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+# Délai minimal entre deux réductions de la concurrence (une rafale de 429 ne compte qu'une fois)
+DECREASE_INTERVAL = 2.0
+# Intervalle de vérification d'une place libre pour les appels asynchrones
+ASYNC_POLL_INTERVAL = 0.05
+
+RETRY_STATUS_CODES = (408, 409, 429, 500, 502, 503, 504)
+TRANSIENT_ERRORS = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+    httpx.TransportError,
+    openai.APIConnectionError,
+)
+
+
+class TokenBucket:
+    """Seau à jetons rechargé en continu de `rate_per_minute` unités par minute."""
+
+    def __init__(self, rate_per_minute):
+        self.capacity = rate_per_minute
+        self._rate = rate_per_minute / 60
+        self._level = float(rate_per_minute)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount):
+        """
+        Réserve `amount` unités et retourne l'attente (secondes) avant de les utiliser.
+
+        Le niveau peut devenir négatif : les réservations suivantes attendent d'autant
+        plus longtemps, dans leur ordre d'arrivée.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._level = min(
+                self.capacity, self._level + (now - self._updated) * self._rate
+            )
+            self._updated = now
+            # Une demande plus grande que le seau attendrait indéfiniment
+            self._level -= min(amount, self.capacity)
+            return 0.0 if self._level >= 0 else -self._level / self._rate
+
+
+def get_status_code(error):
+    """Code HTTP d'une erreur (SDK OpenAI, requests ou httpx), ou None."""
+    status_code = getattr(error, "status_code", None)
+    if status_code is None:
+        status_code = getattr(getattr(error, "response", None), "status_code", None)
+    return status_code
+
+
+def retry_after(error):
+    """Délai (secondes) demandé par le serveur (`Retry-After`, `retry-after-ms`), ou None."""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, date.timestamp() - time.time())
+
+
+def is_retryable(error):
+    """Indique si l'erreur est transitoire (quota momentané, serveur surchargé, réseau)."""
+    if getattr(error, "code", None) == "insufficient_quota":
+        # 429 d'OpenAI pour un crédit épuisé : inutile de réessayer
+        return False
+    if isinstance(error, TRANSIENT_ERRORS):
+        return True
+    return get_status_code(error) in RETRY_STATUS_CODES
+
+
+class RateLimiter:
+    """Limiteur partagé : seaux RPM/TPM, concurrence adaptative et nouvelles tentatives."""
+
+    def __init__(
+        self,
+        rpm=LLM_RPM,
+        tpm=LLM_TPM,
+        max_concurrency=LLM_MAX_CONCURRENCY,
+        max_retries=LLM_MAX_RETRIES,
+    ):
+        self._requests = TokenBucket(rpm) if rpm > 0 else None
+        self._tokens = TokenBucket(tpm) if tpm > 0 else None
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max_retries
+        self._limit = float(self.max_concurrency)
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+        self._stats = {
+            "retries": 0,
+            "rate_limited": 0,
+            "server_errors": 0,
+            "failed_after_retries": 0,
+        }
+
+    # --- Accès au débit ---
+
+    def _reserve(self, tokens):
+        """Réserve une requête et `tokens` tokens ; retourne l'attente nécessaire (secondes)."""
+        wait = self._paused_until - time.monotonic()
+        if self._requests is not None:
+            wait = max(wait, self._requests.reserve(1))
+        if self._tokens is not None:
+            wait = max(wait, self._tokens.reserve(tokens))
+        return max(0.0, wait)
+
+    def _try_enter(self):
+        with self._condition:
+            if self._in_flight < int(self._limit):
+                self._in_flight += 1
+                return True
+            return False
+
+    def _enter(self):
+        with self._condition:
+            while self._in_flight >= int(self._limit):
+                self._condition.wait()
+            self._in_flight += 1
+
+    def _leave(self):
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify()
+
+    # --- Adaptation de la concurrence ---
+
+    def _on_success(self):
+        with self._condition:
+            if self._limit < self.max_concurrency:
+                # +1 après `limit` succès consécutifs en moyenne
+                self._limit = min(self.max_concurrency, self._limit + 1 / self._limit)
+                self._condition.notify_all()
+
+    def _on_error(self, error, attempt):
+        """Enregistre l'erreur ; retourne le délai avant nouvelle tentative, ou None."""
+        if not is_retryable(error) or attempt >= self.max_retries:
+            if is_retryable(error):
+                self._count("failed_after_retries")
+            return None
+
+        status_code = get_status_code(error)
+        delay = retry_after(error)
+        if delay is None:
+            # Délai exponentiel avec aléa complet : les workers ne repartent pas ensemble
+            delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2**attempt))
+        delay = min(delay, BACKOFF_MAX)
+
+        now = time.monotonic()
+        with self._condition:
+            self._stats["retries"] += 1
+            if status_code == 429:
+                self._stats["rate_limited"] += 1
+                # Le quota est partagé : toutes les requêtes attendent
+                self._paused_until = max(self._paused_until, now + delay)
+            elif status_code is not None and status_code >= 500:
+                self._stats["server_errors"] += 1
+            if (
+                status_code == 429 or (status_code or 0) >= 500
+            ) and now - self._last_decrease >= DECREASE_INTERVAL:
+                self._limit = max(1.0, self._limit / 2)
+                self._last_decrease = now
+        return delay
+
+    def _count(self, key):
+        with self._condition:
+            self._stats[key] += 1
+
+    def _log_retry(self, error, delay, attempt):
+        status_code = get_status_code(error)
+        reason = f"HTTP {status_code}" if status_code else type(error).__name__
+        print(
+            f"LLM indisponible ({reason}), tentative {attempt + 2}/{self.max_retries + 1} "
+            f"dans {delay:.1f} s (concurrence: {self.concurrency})"
+        )
+
+    # --- Appels ---
+
+    def call(self, send, tokens=0):
+        """
+        Appelle `send()` en respectant les quotas ; réessaie les erreurs transitoires.
+        Lève la dernière erreur si elle n'est pas transitoire ou après `max_retries` essais.
+        """
+        for attempt in range(self.max_retries + 1):
+            wait = self._reserve(tokens)
+            if wait:
+                time.sleep(wait)
+            self._enter()
+            try:
+                result = send()
+            except Exception as e:
+                error = e
+                delay = self._on_error(error, attempt)
+                if delay is None:
+                    raise
+            else:
+                self._on_success()
+                return result
+            finally:
+                self._leave()
+            self._log_retry(error, delay, attempt)
+            time.sleep(delay)
+
+    async def call_async(self, send, tokens=0):
+        """Version asynchrone de `call` : `send()` retourne une coroutine."""
+        for attempt in range(self.max_retries + 1):
+            wait = self._reserve(tokens)
+            if wait:
+                await asyncio.sleep(wait)
+            while not self._try_enter():
+                await asyncio.sleep(ASYNC_POLL_INTERVAL)
+            try:
+                result = await send()
+            except Exception as e:
+                error = e
+                delay = self._on_error(error, attempt)
+                if delay is None:
+                    raise
+            else:
+                self._on_success()
+                return result
+            finally:
+                self._leave()
+            self._log_retry(error, delay, attempt)
+            await asyncio.sleep(delay)
+
+    @property
+    def concurrency(self):
+        """Nombre de requêtes simultanées actuellement autorisé."""
+        return int(self._limit)
+
+    def stats(self):
+        """Compteurs cumulés : nouvelles tentatives, 429, erreurs 5xx, abandons."""
+        with self._condition:
+            return dict(self._stats)
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_limiter():
+    """Retourne le limiteur partagé du processus."""
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = RateLimiter()
+    return _limiter
@@ -1,13 +1,28 @@
 import argparse
+import asyncio
+import contextvars
 import csv
+import functools
 import json
 import os
+import queue
 import shutil
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
+import httpx
 import requests
-from openai import OpenAI
 
+import article_chunking
 import database  # Importe notre nouveau module de base de données
+import extraction_cache
+import llm_client
+import llm_json
+import llm_router
+import output_schema
+import prompt_manager
+import rate_limiter
+import token_counter
 
 # --- Constantes ---
 # Configuration de l'API LLM
@@ -27,11 +42,78 @@ OPENAI_MODEL = os.getenv(
 # 2. Définissez LLM_API_URL=http://localhost:1234/v1/chat/completions dans votre .env
 # LM Studio utilise une API compatible OpenAI, donc le même format de requête fonctionne
 LLM_API_URL = os.getenv("LLM_API_URL", "http://localhost:1234/v1/chat/completions")
+# Nom du modèle chargé dans LM Studio (sert à distinguer les entrées du cache)
+LLM_MODEL = os.getenv("LLM_MODEL", "local-model")
+# Plusieurs serveurs locaux servant le même modèle : `url|poids|max` séparés par des
+# virgules (voir llm_router). Sans cette variable, seul LLM_API_URL est utilisé.
+LLM_ENDPOINTS = os.getenv("LLM_ENDPOINTS", "")
+# Débordement vers OpenAI (OPENAI_API_KEY requise) quand tous les serveurs locaux sont
+# pleins ou écartés
+LLM_OPENAI_FALLBACK = os.getenv("LLM_OPENAI_FALLBACK", "false").lower() == "true"
+
+# Paramètres de génération communs aux deux backends
+LLM_TEMPERATURE = 0.1
+LLM_MAX_TOKENS = 2000
+
+# Cache de préfixe du prompt côté serveur : le prompt système (15 à 35 Ko) est identique
+# pour tous les articles d'un lot, seul l'article change en fin de requête.
+# OpenAI : clé de routage `prompt_cache_key` dérivée du hash du prompt.
+# llama.cpp / serveurs compatibles : `cache_prompt` et, optionnellement, un slot fixe.
+LLM_PROMPT_CACHE = os.getenv("LLM_PROMPT_CACHE", "true").lower() == "true"
+LLM_SLOT_ID = os.getenv("LLM_SLOT_ID")
+
+# Sortie structurée : schéma JSON déduit du format attendu décrit par le prompt (voir
+# output_schema), envoyé via `response_format`. Désactivée automatiquement pour le
+# processus si le serveur refuse le paramètre.
+LLM_STRUCTURED_OUTPUT = os.getenv("LLM_STRUCTURED_OUTPUT", "true").lower() == "true"
+# Mots du message d'erreur (400/422) qui désignent un refus du paramètre ou du schéma
+SCHEMA_ERROR_MARKERS = ("response_format", "json_schema", "schema")
+
+# Réception en streaming : la réponse est lue au fil de l'eau et la requête interrompue
+# dès que l'objet JSON est complet, sans attendre le texte que le modèle ajoute après.
+# Toujours actif quand l'appelant suit les champs partiels (vue d'analyse).
+LLM_STREAM = os.getenv("LLM_STREAM", "false").lower() == "true"
+
+# Articles longs (voir article_chunking) : retrait des sections standard (« À propos »,
+# contacts presse, mentions légales) puis découpage en morceaux extraits séparément
+# et fusionnés si l'article dépasse le budget de tokens d'une requête.
+LLM_TRIM_BOILERPLATE = os.getenv("LLM_TRIM_BOILERPLATE", "true").lower() == "true"
+# Fenêtre de contexte du modèle (prompt système + article + réponse), en tokens
+LLM_CONTEXT_TOKENS = int(
+    os.getenv("LLM_CONTEXT_TOKENS", "128000" if USE_OPENAI else "8192")
+)
+# Taille maximale de l'article (ou d'un morceau) envoyé dans une requête, en tokens
+LLM_CHUNK_TOKENS = int(os.getenv("LLM_CHUNK_TOKENS", "6000"))
+# Marge pour l'enveloppe des messages, et taille minimale d'un morceau
+CONTEXT_MARGIN_TOKENS = 256
+MIN_CHUNK_TOKENS = 500
+# Nombre de morceaux d'un même article extraits en parallèle
+CHUNK_WORKERS = 4
+
+# Regroupement d'articles courts dans une même requête (1 = désactivé) : le prompt
+# système n'est envoyé qu'une fois pour tout le groupe.
+DEFAULT_PACK_SIZE = int(os.getenv("LLM_PACK_SIZE", "1"))
+# Taille cumulée maximale (tokens) des articles d'un groupe ; un article qui dépasse la
+# moitié de ce budget est extrait seul
+LLM_PACK_TOKENS = int(os.getenv("LLM_PACK_TOKENS", "4000"))
+# Limite de tokens de la réponse d'un groupe (LLM_MAX_TOKENS par article, plafonnée)
+PACK_MAX_COMPLETION_TOKENS = 8000
 
 SYSTEM_PROMPT_FILE = "system_prompt.txt"
 SOURCE_DIR = "a_traiter"
 PROCESSED_DIR = "traites"
 
+# Nombre de requêtes LLM envoyées en parallèle par défaut en mode batch (1 = séquentiel)
+DEFAULT_WORKERS = int(os.getenv("EXTRACTION_WORKERS", "1"))
+# Nombre maximal d'extractions simultanées sur la boucle asyncio (mode async, import WordPress)
+DEFAULT_ASYNC_CONCURRENCY = int(os.getenv("LLM_ASYNC_CONCURRENCY", "16"))
+# Nombre d'extractions écrites en base par transaction en mode batch
+DEFAULT_DB_CHUNK_SIZE = int(os.getenv("DB_BULK_CHUNK_SIZE", "100"))
+# Noms de colonne acceptés pour le texte des articles dans un CSV
+CSV_CONTENT_COLUMNS = ["content", "article", "text", "texte", "contenu"]
+# Nombre d'articles vérifiés par requête lors de la recherche des extractions existantes
+SKIP_LOOKUP_CHUNK_SIZE = 500
+
 # --- Fonctions Core ---
 
 
@@ -45,82 +127,769 @@ def load_system_prompt():
         return None
 
 
-def extract_data_from_llm(article_text, system_prompt, max_retries=2):
+JSON_REPAIR_MESSAGE = "Votre réponse précédente n'était pas un JSON valide. Veuillez corriger le format et ne renvoyer que le JSON corrigé, sans texte supplémentaire."
+
+
+def _build_history(article_text, system_prompt):
+    """
+    Construit l'historique de messages initial envoyé au LLM.
+
+    Le prompt système reste en tête et l'article en dernier : le préfixe commun à toutes
+    les requêtes peut être réutilisé par le cache de prompt du serveur. Les messages de
+    réparation sont ajoutés à la suite, sans modifier ce préfixe.
+    """
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": article_text},
+    ]
+
+
+def _lm_studio_request(history, max_tokens=LLM_MAX_TOKENS, schema=None, stream=False):
+    """Retourne les en-têtes et le payload d'une requête vers LM Studio (ou autre API compatible)."""
+    headers = {"Content-Type": "application/json"}
+
+    # Ajoute la clé API si elle est configurée (optionnel pour LM Studio local)
+    llm_api_key = os.getenv("LLM_API_KEY")
+    if llm_api_key:
+        headers["Authorization"] = f"Bearer {llm_api_key}"
+
+    payload = {
+        "messages": history,
+        "temperature": LLM_TEMPERATURE,
+        "max_tokens": max_tokens,
+        "stream": stream,
+    }
+    if stream:
+        payload["stream_options"] = {"include_usage": True}
+    if LLM_PROMPT_CACHE:
+        # Réutilise le cache KV du préfixe déjà évalué (ignoré par les serveurs qui ne le gèrent pas)
+        payload["cache_prompt"] = True
+        if LLM_SLOT_ID:
+            payload["id_slot"] = int(LLM_SLOT_ID)
+    if schema is not None:
+        # LM Studio et llama.cpp contraignent la génération avec ce schéma (grammaire)
+        payload["response_format"] = output_schema.response_format(schema)
+    return headers, payload
+
+
+def _openai_request(history, max_tokens=LLM_MAX_TOKENS, schema=None, stream=False):
+    """Retourne les paramètres d'un appel `chat.completions.create` (synchrone, asynchrone ou batch)."""
+    request = {
+        "model": OPENAI_MODEL,
+        "messages": history,
+        "temperature": LLM_TEMPERATURE,
+        "max_tokens": max_tokens,
+    }
+    if LLM_PROMPT_CACHE:
+        # Oriente les requêtes d'un même prompt vers les serveurs qui l'ont déjà en cache
+        request["prompt_cache_key"] = (
+            f"extraction-{extraction_cache.prompt_hash(history[0]['content'])[:32]}"
+        )
+    if schema is not None:
+        request["response_format"] = output_schema.response_format(schema)
+    if stream:
+        request["stream"] = True
+        request["stream_options"] = {"include_usage": True}
+    return request
+
+
+_structured_output = {"enabled": LLM_STRUCTURED_OUTPUT}
+
+
+def _output_schema(system_prompt):
+    """Schéma JSON de la réponse attendue par ce prompt, ou None (sortie libre)."""
+    if not _structured_output["enabled"]:
+        return None
+    return output_schema.get_prompt_schema(system_prompt)
+
+
+def _error_body(error):
+    """Message et corps de la réponse d'une erreur HTTP (SDK OpenAI, requests ou httpx)."""
+    response = getattr(error, "response", None)
+    try:
+        body = response.text if response is not None else ""
+    except httpx.ResponseNotRead:
+        body = ""
+    return f"{error} {body}".lower()
+
+
+def _is_schema_rejected(error):
+    """
+    Indique si le serveur a refusé la requête (400/422) à cause de `response_format` :
+    le message d'erreur doit citer le format ou le schéma, sinon le refus a une autre
+    cause et l'erreur est traitée normalement.
+    """
+    if rate_limiter.get_status_code(error) not in (400, 422):
+        return False
+    body = _error_body(error)
+    return any(marker in body for marker in SCHEMA_ERROR_MARKERS)
+
+
+def _disable_structured_output(error):
+    if _structured_output["enabled"]:
+        _structured_output["enabled"] = False
+        print(
+            f"Sortie structurée non prise en charge par le serveur ({error}) : désactivée pour ce traitement."
+        )
+
+
+_usage_lock = threading.Lock()
+_usage_stats = {
+    "calls": 0,
+    "prompt_tokens": 0,
+    "cached_tokens": 0,
+    "completion_tokens": 0,
+    "packed_calls": 0,
+    "packed_articles": 0,
+    "pack_fallbacks": 0,
+    "structured_calls": 0,
+    "schema_first_try": 0,
+    "repair_calls": 0,
+    "local_repairs": 0,
+    "stream_calls": 0,
+    "stream_early_stops": 0,
+}
+
+
+def _count_usage(key, count=1):
+    with _usage_lock:
+        _usage_stats[key] += count
+
+
+def _record_usage(usage, timings=None):
+    """
+    Ajoute aux compteurs les tokens d'entrée (dont en cache) et de sortie d'une réponse.
+
+    `usage` est l'objet `usage` du SDK OpenAI ou le dict équivalent d'une API compatible ;
+    `timings` est le bloc renvoyé par llama.cpp (`cache_n` : tokens relus du cache).
+    """
+    if usage is None:
+        return
+    if not isinstance(usage, dict):
+        usage = usage.model_dump()
+    details = usage.get("prompt_tokens_details") or {}
+    cached_tokens = details.get("cached_tokens")
+    if cached_tokens is None and timings:
+        cached_tokens = timings.get("cache_n")
+    with _usage_lock:
+        _usage_stats["calls"] += 1
+        _usage_stats["prompt_tokens"] += usage.get("prompt_tokens") or 0
+        _usage_stats["cached_tokens"] += cached_tokens or 0
+        _usage_stats["completion_tokens"] += usage.get("completion_tokens") or 0
+
+
+def get_usage_stats():
+    """Retourne les tokens consommés par les appels LLM du processus (et les compteurs du limiteur de débit)."""
+    with _usage_lock:
+        usage_stats = dict(_usage_stats)
+    for key, value in rate_limiter.get_limiter().stats().items():
+        usage_stats[f"limiter_{key}"] = value
+    if _router is not None:
+        for key, value in _router.stats().items():
+            usage_stats[f"router_{key}"] = value
+    return usage_stats
+
+
+def _parse_llm_json(llm_response_text):
+    """
+    Extrait l'objet JSON de la réponse du LLM, en corrigeant localement les erreurs
+    courantes (voir llm_json). Lève ValueError si aucun JSON exploitable.
+    """
+    extracted_data, repaired = llm_json.loads(llm_response_text, "{")
+    if repaired:
+        _count_usage("local_repairs")
+    return extracted_data
+
+
+def _handle_json_error(history, llm_response_text, attempt, max_retries, error):
+    """
+    Ajoute la demande de correction à l'historique après une réponse non JSON.
+    Retourne False si le nombre maximal de tentatives est atteint.
+    """
+    print(f"Tentative {attempt + 1}: Erreur de décodage JSON. {error}")
+    if attempt < max_retries:
+        print("Demande de correction au LLM...")
+        _count_usage("repair_calls")
+        history.append({"role": "assistant", "content": llm_response_text})
+        history.append({"role": "user", "content": JSON_REPAIR_MESSAGE})
+        return True
+    print("Échec de l'extraction des données après plusieurs tentatives.")
+    return False
+
+
+def _target_model(url):
+    """Identifiant du modèle qui traite une requête envoyée à OpenAI (`url` None) ou à un serveur local."""
+    if url is None:
+        return OPENAI_MODEL
+    # Les serveurs de LLM_ENDPOINTS servent tous le même modèle
+    return f"{LLM_MODEL}@{LLM_API_URL}"
+
+
+def _current_model():
+    """Identifiant du modèle du backend configuré, pour la clé de cache."""
+    return _target_model(None if USE_OPENAI else LLM_API_URL)
+
+
+# Modèles ayant répondu aux requêtes de l'extraction en cours : une requête locale peut
+# déborder vers OpenAI (voir llm_router), et son résultat n'est pas celui du modèle local
+_served_models = contextvars.ContextVar("served_models", default=None)
+
+
+def _record_model(url):
+    models = _served_models.get()
+    if models is not None:
+        models.add(_target_model(url))
+
+
+def _track_models(call, *args):
+    """
+    Appelle `call(*args)` ; retourne `(resultat, modele)`, `modele` étant celui qui a
+    répondu à toutes ses requêtes (None si aucun ou plusieurs).
+    """
+    models = set()
+    token = _served_models.set(models)
+    try:
+        result = call(*args)
+    finally:
+        _served_models.reset(token)
+    return result, next(iter(models)) if len(models) == 1 else None
+
+
+async def _track_models_async(coroutine):
+    """Version asynchrone de `_track_models` (les tâches lancées par `coroutine` héritent du suivi)."""
+    models = set()
+    token = _served_models.set(models)
+    try:
+        result = await coroutine
+    finally:
+        _served_models.reset(token)
+    return result, next(iter(models)) if len(models) == 1 else None
+
+
+def _cache_entry(article_text, system_prompt, use_cache):
+    """Retourne `(cache, hash du contenu)` pour cet article, ou `(None, None)` si le cache n'est pas utilisé."""
+    cache = extraction_cache.get_cache() if use_cache else None
+    if cache is None:
+        return None, None
+    return cache, database.calculate_content_hash(article_text)
+
+
+def _cache_key(content_hash, system_prompt, model):
+    return extraction_cache.make_cache_key(
+        content_hash, system_prompt, model, LLM_TEMPERATURE
+    )
+
+
+def _cache_get(cache, content_hash, system_prompt):
+    """Extraction en cache de cet article pour le modèle du backend configuré, ou None."""
+    return cache.get(_cache_key(content_hash, system_prompt, _current_model()))
+
+
+def _cache_set(cache, content_hash, system_prompt, extracted_data, model):
+    """
+    Met l'extraction en cache sous le modèle qui l'a produite ; rien n'est enregistré
+    si plusieurs modèles y ont contribué (morceaux ou réparation partis vers OpenAI).
+    """
+    if model is None:
+        return
+    cache.set(
+        _cache_key(content_hash, system_prompt, model), extracted_data, model=model
+    )
+
+
+def _token_model(openai_target=USE_OPENAI):
+    """
+    Modèle utilisé pour compter les tokens (None : encodage par défaut pour les modèles
+    locaux). Avant le choix du serveur, celui du backend configuré : la fenêtre de
+    contexte locale, plus petite, convient aussi aux requêtes qui débordent vers OpenAI.
+    """
+    return OPENAI_MODEL if openai_target else None
+
+
+@functools.lru_cache(maxsize=32)
+def _prompt_tokens(system_prompt):
+    # Prompt prédéfini : décompte fait au chargement par prompt_manager, avec le modèle
+    # par défaut de token_counter (OPENAI_MODEL, comme `_token_model`)
+    token_count = prompt_manager.get_prompt_token_count(system_prompt)
+    if token_count is None:
+        token_count = token_counter.count_tokens(system_prompt, _token_model())
+    return token_count
+
+
+def _article_token_budget(system_prompt):
+    """Nombre de tokens d'article qu'une requête peut contenir avec ce prompt système."""
+    available = (
+        LLM_CONTEXT_TOKENS
+        - _prompt_tokens(system_prompt)
+        - LLM_MAX_TOKENS
+        - CONTEXT_MARGIN_TOKENS
+    )
+    return max(MIN_CHUNK_TOKENS, min(LLM_CHUNK_TOKENS, available))
+
+
+def _prepare_article(article_text, system_prompt):
+    """Retourne les textes à envoyer au LLM : l'article allégé, découpé s'il dépasse le budget."""
+    if LLM_TRIM_BOILERPLATE:
+        article_text = article_chunking.trim_boilerplate(article_text)
+    chunks = article_chunking.split_chunks(
+        article_text, _article_token_budget(system_prompt), _token_model()
+    )
+    if len(chunks) == 1:
+        return chunks
+    return [
+        f"[Partie {index}/{len(chunks)} de l'article]\n{chunk}"
+        for index, chunk in enumerate(chunks, start=1)
+    ]
+
+
+def _merge_chunk_results(results):
+    """Fusionne les extractions des morceaux d'un article (None si aucune n'a réussi)."""
+    extracted = [result for result in results if result is not None]
+    if len(extracted) < len(results):
+        print(
+            f"Article découpé en {len(results)} parties : {len(results) - len(extracted)} partie(s) sans extraction."
+        )
+    return article_chunking.merge_extractions(extracted) or None
+
+
+def get_cache_stats():
+    """Retourne les compteurs hits/misses du cache des extractions (zéros si désactivé)."""
+    cache = extraction_cache.get_cache()
+    return cache.stats() if cache else {"hits": 0, "misses": 0}
+
+
+def extract_data_from_llm(
+    article_text, system_prompt, max_retries=2, use_cache=True, on_partial=None
+):
     """
     Envoie le texte de l'article à l'API du LLM (OpenAI ou LM Studio) et tente d'extraire un JSON valide.
     Inclut une logique de réparation en cas d'échec.
 
     Si USE_OPENAI=true : utilise l'API OpenAI officielle
     Si USE_OPENAI=false : utilise LM Studio (ou autre API compatible OpenAI)
+
+    Si use_cache=True, une extraction déjà faite pour le même contenu, prompt, modèle et
+    température est relue depuis le cache local sans appeler le LLM.
+
+    Avec `on_partial`, la réponse est reçue en streaming et `on_partial(champs)` est
+    appelé à chaque champ complété (article extrait en une seule requête uniquement).
     """
-    history = [
-        {"role": "system", "content": system_prompt},
-        {"role": "user", "content": article_text},
-    ]
+    cache, content_hash = _cache_entry(article_text, system_prompt, use_cache)
+    if cache is not None:
+        cached_data = _cache_get(cache, content_hash, system_prompt)
+        if cached_data is not None:
+            return cached_data
 
-    for attempt in range(max_retries + 1):
-        try:
-            if USE_OPENAI:
-                # === Utilisation de l'API OpenAI officielle ===
-                if not OPENAI_API_KEY:
-                    print(
-                        "ERREUR: OPENAI_API_KEY n'est pas définie dans les variables d'environnement."
-                    )
-                    return None
+    extracted_data, model = _track_models(
+        _extract_article, article_text, system_prompt, max_retries, on_partial
+    )
+    if extracted_data is not None and cache is not None:
+        _cache_set(cache, content_hash, system_prompt, extracted_data, model)
+    return extracted_data
 
-                client = OpenAI(api_key=OPENAI_API_KEY)
 
-                response = client.chat.completions.create(
-                    model=OPENAI_MODEL,
-                    messages=history,
-                    temperature=0.1,
-                    max_tokens=2000,
+def _extract_article(article_text, system_prompt, max_retries, on_partial=None):
+    """Extrait un article, en plusieurs requêtes parallèles fusionnées s'il est trop long."""
+    chunks = _prepare_article(article_text, system_prompt)
+    if len(chunks) == 1:
+        return _extract_with_repair(chunks[0], system_prompt, max_retries, on_partial)
+
+    # Contexte copié pour chaque morceau : les threads suivent les modèles de l'article
+    contexts = [contextvars.copy_context() for _ in chunks]
+    with ThreadPoolExecutor(max_workers=min(len(chunks), CHUNK_WORKERS)) as executor:
+        results = list(
+            executor.map(
+                lambda context, chunk: context.run(
+                    _extract_with_repair, chunk, system_prompt, max_retries
+                ),
+                contexts,
+                chunks,
+            )
+        )
+    return _merge_chunk_results(results)
+
+
+def _check_api_key():
+    """Vérifie que la clé API OpenAI est définie quand le backend OpenAI est utilisé."""
+    if USE_OPENAI and not OPENAI_API_KEY:
+        print(
+            "ERREUR: OPENAI_API_KEY n'est pas définie dans les variables d'environnement."
+        )
+        return False
+    return True
+
+
+def _call_llm(history, max_tokens=LLM_MAX_TOKENS, schema=None, on_partial=None):
+    """
+    Envoie l'historique au LLM configuré et retourne le texte de la réponse.
+
+    Avec `schema`, la réponse est contrainte par ce JSON Schema. Si le serveur refuse la
+    requête et l'accepte sans schéma, la sortie structurée est désactivée pour le processus.
+    `on_partial` reçoit les champs déjà complets pendant la réception (streaming).
+    """
+    try:
+        llm_response_text = _send_llm_request(history, max_tokens, schema, on_partial)
+    except Exception as e:
+        if schema is None or not _is_schema_rejected(e):
+            raise
+        llm_response_text = _send_llm_request(history, max_tokens, None, on_partial)
+        _disable_structured_output(e)
+        return llm_response_text
+    if schema is not None:
+        _count_usage("structured_calls")
+    return llm_response_text
+
+
+async def _call_llm_async(
+    history, max_tokens=LLM_MAX_TOKENS, schema=None, on_partial=None
+):
+    """Version asynchrone de `_call_llm`."""
+    try:
+        llm_response_text = await _send_llm_request_async(
+            history, max_tokens, schema, on_partial
+        )
+    except Exception as e:
+        if schema is None or not _is_schema_rejected(e):
+            raise
+        llm_response_text = await _send_llm_request_async(
+            history, max_tokens, None, on_partial
+        )
+        _disable_structured_output(e)
+        return llm_response_text
+    if schema is not None:
+        _count_usage("structured_calls")
+    return llm_response_text
+
+
+def _request_tokens(history, max_tokens):
+    """
+    Tokens décomptés du quota par minute pour une requête : entrée estimée plus
+    `max_tokens` (les fournisseurs réservent la sortie maximale à l'envoi).
+    """
+    model = _token_model()
+    return (
+        _prompt_tokens(history[0]["content"])
+        + sum(
+            token_counter.count_tokens(message["content"], model)
+            for message in history[1:]
+        )
+        + max_tokens
+    )
+
+
+def _send_llm_request(history, max_tokens=LLM_MAX_TOKENS, schema=None, on_partial=None):
+    """Envoie la requête via le limiteur de débit partagé (quotas, nouvelles tentatives)."""
+    return rate_limiter.get_limiter().call(
+        lambda: _post_llm_request(history, max_tokens, schema, on_partial),
+        _request_tokens(history, max_tokens),
+    )
+
+
+async def _send_llm_request_async(
+    history, max_tokens=LLM_MAX_TOKENS, schema=None, on_partial=None
+):
+    """Version asynchrone de `_send_llm_request`."""
+    return await rate_limiter.get_limiter().call_async(
+        lambda: _post_llm_request_async(history, max_tokens, schema, on_partial),
+        _request_tokens(history, max_tokens),
+    )
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def _get_router():
+    """Routeur partagé entre les serveurs locaux de LLM_ENDPOINTS (ou LLM_API_URL seul)."""
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = llm_router.Router(
+                    llm_router.parse_endpoints(LLM_ENDPOINTS, LLM_API_URL),
+                    openai_fallback=LLM_OPENAI_FALLBACK and bool(OPENAI_API_KEY),
                 )
+    return _router
 
-                llm_response_text = response.choices[0].message.content
 
-            else:
-                # === Utilisation de LM Studio (ou autre API compatible) ===
-                headers = {"Content-Type": "application/json"}
+def _openai_client():
+    """Client OpenAI partagé, sans les nouvelles tentatives du SDK (faites par rate_limiter)."""
+    return llm_client.get_openai_client(OPENAI_API_KEY, max_retries=0)
+
+
+def _async_openai_client():
+    return llm_client.get_async_openai_client(OPENAI_API_KEY, max_retries=0)
+
+
+def _post_llm_request(history, max_tokens, schema, on_partial):
+    """
+    Envoie une requête (une tentative) : vers OpenAI si USE_OPENAI, sinon vers le serveur
+    local le moins chargé choisi par le routeur (voir llm_router), ou OpenAI en débordement.
+    """
+    if USE_OPENAI:
+        llm_response_text = _send_to(None, history, max_tokens, schema, on_partial)
+        _record_model(None)
+        return llm_response_text
+    router = _get_router()
+    target = router.acquire()
+    url = None if target is llm_router.OPENAI else target.url
+    try:
+        llm_response_text = _send_to(url, history, max_tokens, schema, on_partial)
+    except Exception as e:
+        router.release(target, e)
+        raise
+    router.release(target)
+    _record_model(url)
+    return llm_response_text
+
+
+async def _post_llm_request_async(history, max_tokens, schema, on_partial):
+    """Version asynchrone de `_post_llm_request`."""
+    if USE_OPENAI:
+        llm_response_text = await _send_to_async(
+            None, history, max_tokens, schema, on_partial
+        )
+        _record_model(None)
+        return llm_response_text
+    router = _get_router()
+    target = await router.acquire_async()
+    url = None if target is llm_router.OPENAI else target.url
+    try:
+        llm_response_text = await _send_to_async(
+            url, history, max_tokens, schema, on_partial
+        )
+    except Exception as e:
+        router.release(target, e)
+        raise
+    router.release(target)
+    _record_model(url)
+    return llm_response_text
+
+
+def _send_to(url, history, max_tokens, schema, on_partial):
+    """Envoie la requête à OpenAI (`url` None) ou au serveur compatible d'URL `url`."""
+    if LLM_STREAM or on_partial is not None:
+        return _stream_llm_request(url, history, max_tokens, schema, on_partial)
+
+    if url is None:
+        # === Utilisation de l'API OpenAI officielle ===
+        # Client partagé (connexions keep-alive réutilisées d'un appel à l'autre)
+        client = _openai_client()
+
+        response = client.chat.completions.create(
+            **_openai_request(history, max_tokens, schema)
+        )
+
+        _record_usage(response.usage)
+        return response.choices[0].message.content
+
+    # === Utilisation de LM Studio (ou autre API compatible) ===
+    headers, payload = _lm_studio_request(history, max_tokens, schema)
+
+    response = llm_client.get_http_session().post(
+        url,
+        headers=headers,
+        json=payload,
+        timeout=llm_client.get_request_timeout(),
+    )
+    response.raise_for_status()
+    response_json = response.json()
+    _record_usage(response_json.get("usage"), response_json.get("timings"))
+    return response_json["choices"][0]["message"]["content"]
+
+
+async def _send_to_async(url, history, max_tokens, schema, on_partial):
+    """Version asynchrone de `_send_to`."""
+    if LLM_STREAM or on_partial is not None:
+        return await _stream_llm_request_async(
+            url, history, max_tokens, schema, on_partial
+        )
+
+    if url is None:
+        client = _async_openai_client()
+
+        response = await client.chat.completions.create(
+            **_openai_request(history, max_tokens, schema)
+        )
+
+        _record_usage(response.usage)
+        return response.choices[0].message.content
+
+    headers, payload = _lm_studio_request(history, max_tokens, schema)
+
+    http_client = llm_client.get_async_http_client()
+    response = await http_client.post(url, headers=headers, json=payload)
+    response.raise_for_status()
+    response_json = response.json()
+    _record_usage(response_json.get("usage"), response_json.get("timings"))
+    return response_json["choices"][0]["message"]["content"]
 
-                # Ajoute la clé API si elle est configurée (optionnel pour LM Studio local)
-                llm_api_key = os.getenv("LLM_API_KEY")
-                if llm_api_key:
-                    headers["Authorization"] = f"Bearer {llm_api_key}"
 
-                payload = {
-                    "messages": history,
-                    "temperature": 0.1,
-                    "max_tokens": 2000,
-                    "stream": False,
-                }
+def _parse_sse_line(line):
+    """Retourne l'événement d'une ligne `data: {...}` d'un flux SSE, ou None."""
+    if isinstance(line, bytes):
+        line = line.decode("utf-8")
+    if not line.startswith("data:"):
+        return None
+    data = line[len("data:") :].strip()
+    if not data or data == "[DONE]":
+        return None
+    return json.loads(data)
+
+
+def _feed_stream(scanner, delta, on_partial):
+    """Ajoute un morceau de réponse ; retourne True quand l'objet JSON est complet."""
+    complete = scanner.feed(delta)
+    # Un champ vient de se terminer : les champs partiels ont pu changer
+    if on_partial is not None and any(char in delta for char in ",}]"):
+        partial = scanner.partial()
+        if partial:
+            on_partial(partial)
+    return complete
+
+
+def _finish_stream(url, history, scanner, stopped, usage, timings):
+    """
+    Compte un appel en streaming. Une réponse interrompue ne reçoit pas le bloc `usage`
+    final : ses tokens sont alors estimés (voir token_counter) pour le modèle qui a
+    répondu (OpenAI si `url` est None).
+    """
+    _count_usage("stream_calls")
+    if stopped:
+        _count_usage("stream_early_stops")
+    if usage is None:
+        model = _token_model(url is None)
+        usage = {
+            "prompt_tokens": sum(
+                token_counter.count_tokens(message["content"], model)
+                for message in history
+            ),
+            "completion_tokens": token_counter.count_tokens(scanner.text, model),
+        }
+    _record_usage(usage, timings)
+    return scanner.text
+
+
+def _stream_llm_request(url, history, max_tokens, schema, on_partial):
+    """Reçoit la réponse en streaming et coupe la connexion dès que l'objet JSON est complet."""
+    scanner = llm_json.StreamScanner()
+    stopped = False
+    usage = timings = None
+
+    if url is None:
+        client = _openai_client()
+        stream = client.chat.completions.create(
+            **_openai_request(history, max_tokens, schema, stream=True)
+        )
+        try:
+            for chunk in stream:
+                usage = chunk.usage or usage
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta and _feed_stream(scanner, delta, on_partial):
+                    stopped = True
+                    break
+        finally:
+            stream.close()
+        return _finish_stream(url, history, scanner, stopped, usage, timings)
+
+    headers, payload = _lm_studio_request(history, max_tokens, schema, stream=True)
+    with llm_client.get_http_session().post(
+        url,
+        headers=headers,
+        json=payload,
+        timeout=llm_client.get_request_timeout(),
+        stream=True,
+    ) as response:
+        if not response.ok:
+            # Corps lu avant la fermeture pour que `_is_schema_rejected` puisse l'examiner
+            _ = response.content
+        response.raise_for_status()
+        for line in response.iter_lines():
+            event = _parse_sse_line(line)
+            if event is None:
+                continue
+            usage = event.get("usage") or usage
+            timings = event.get("timings") or timings
+            choices = event.get("choices") or [{}]
+            delta = (choices[0].get("delta") or {}).get("content")
+            if delta and _feed_stream(scanner, delta, on_partial):
+                stopped = True
+                break
+    return _finish_stream(url, history, scanner, stopped, usage, timings)
+
 
-                response = requests.post(LLM_API_URL, headers=headers, json=payload)
-                response.raise_for_status()
-                llm_response_text = response.json()["choices"][0]["message"]["content"]
+async def _stream_llm_request_async(url, history, max_tokens, schema, on_partial):
+    """Version asynchrone de `_stream_llm_request`."""
+    scanner = llm_json.StreamScanner()
+    stopped = False
+    usage = timings = None
+
+    if url is None:
+        client = _async_openai_client()
+        stream = await client.chat.completions.create(
+            **_openai_request(history, max_tokens, schema, stream=True)
+        )
+        try:
+            async for chunk in stream:
+                usage = chunk.usage or usage
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta and _feed_stream(scanner, delta, on_partial):
+                    stopped = True
+                    break
+        finally:
+            await stream.close()
+        return _finish_stream(url, history, scanner, stopped, usage, timings)
+
+    headers, payload = _lm_studio_request(history, max_tokens, schema, stream=True)
+    http_client = llm_client.get_async_http_client()
+    async with http_client.stream(
+        "POST", url, headers=headers, json=payload
+    ) as response:
+        if response.is_error:
+            # Corps lu avant la fermeture pour que `_is_schema_rejected` puisse l'examiner
+            await response.aread()
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            event = _parse_sse_line(line)
+            if event is None:
+                continue
+            usage = event.get("usage") or usage
+            timings = event.get("timings") or timings
+            choices = event.get("choices") or [{}]
+            delta = (choices[0].get("delta") or {}).get("content")
+            if delta and _feed_stream(scanner, delta, on_partial):
+                stopped = True
+                break
+    return _finish_stream(url, history, scanner, stopped, usage, timings)
+
+
+def _count_first_try(attempt, schema):
+    """Compte les réponses contraintes par le schéma et valides sans appel de réparation."""
+    if attempt == 0 and schema is not None and _structured_output["enabled"]:
+        _count_usage("schema_first_try")
+
+
+def _extract_with_repair(article_text, system_prompt, max_retries, on_partial=None):
+    """Appelle le LLM et redemande une correction tant que la réponse n'est pas un JSON valide."""
+    if not _check_api_key():
+        return None
+    history = _build_history(article_text, system_prompt)
+
+    for attempt in range(max_retries + 1):
+        llm_response_text = ""
+        try:
+            schema = _output_schema(system_prompt)
+            llm_response_text = _call_llm(history, schema=schema, on_partial=on_partial)
 
             # Essayer de parser le JSON
-            json_start = llm_response_text.find("{")
-            json_end = llm_response_text.rfind("}") + 1
-            if json_start != -1:
-                json_str = llm_response_text[json_start:json_end]
-                return json.loads(json_str)
-            else:
-                raise ValueError("Aucun objet JSON trouvé dans la réponse.")
+            extracted_data = _parse_llm_json(llm_response_text)
+            _count_first_try(attempt, schema)
+            return extracted_data
 
         except (json.JSONDecodeError, ValueError) as e:
-            print(f"Tentative {attempt + 1}: Erreur de décodage JSON. {e}")
-            if attempt < max_retries:
-                print("Demande de correction au LLM...")
-                history.append({"role": "assistant", "content": llm_response_text})
-                history.append(
-                    {
-                        "role": "user",
-                        "content": "Votre réponse précédente n'était pas un JSON valide. Veuillez corriger le format et ne renvoyer que le JSON corrigé, sans texte supplémentaire.",
-                    }
-                )
-            else:
-                print("Échec de l'extraction des données après plusieurs tentatives.")
+            if not _handle_json_error(
+                history, llm_response_text, attempt, max_retries, e
+            ):
                 return None
         except requests.exceptions.RequestException as e:
             print(f"Erreur de connexion à l'API du LLM: {e}")
@@ -131,15 +900,791 @@ def extract_data_from_llm(article_text, system_prompt, max_retries=2):
     return None
 
 
+async def extract_data_from_llm_async(
+    article_text, system_prompt, max_retries=2, use_cache=True, on_partial=None
+):
+    """
+    Version asynchrone de `extract_data_from_llm`, avec la même logique de réparation JSON
+    et le même cache local.
+
+    Les appels passent par un client HTTP asynchrone partagé (voir llm_client), ce qui
+    permet de lancer des centaines d'extractions sur une seule boucle d'événements.
+    """
+    cache, content_hash = _cache_entry(article_text, system_prompt, use_cache)
+    if cache is not None:
+        cached_data = _cache_get(cache, content_hash, system_prompt)
+        if cached_data is not None:
+            return cached_data
+
+    extracted_data, model = await _track_models_async(
+        _extract_article_async(article_text, system_prompt, max_retries, on_partial)
+    )
+    if extracted_data is not None and cache is not None:
+        _cache_set(cache, content_hash, system_prompt, extracted_data, model)
+    return extracted_data
+
+
+async def _extract_article_async(
+    article_text, system_prompt, max_retries, on_partial=None
+):
+    """Version asynchrone de `_extract_article`."""
+    chunks = _prepare_article(article_text, system_prompt)
+    if len(chunks) == 1:
+        return await _extract_with_repair_async(
+            chunks[0], system_prompt, max_retries, on_partial
+        )
+
+    results = await asyncio.gather(
+        *(
+            _extract_with_repair_async(chunk, system_prompt, max_retries)
+            for chunk in chunks
+        )
+    )
+    return _merge_chunk_results(results)
+
+
+async def _extract_with_repair_async(
+    article_text, system_prompt, max_retries, on_partial=None
+):
+    """Version asynchrone de `_extract_with_repair`."""
+    if not _check_api_key():
+        return None
+    history = _build_history(article_text, system_prompt)
+
+    for attempt in range(max_retries + 1):
+        llm_response_text = ""
+        try:
+            schema = _output_schema(system_prompt)
+            llm_response_text = await _call_llm_async(
+                history, schema=schema, on_partial=on_partial
+            )
+
+            extracted_data = _parse_llm_json(llm_response_text)
+            _count_first_try(attempt, schema)
+            return extracted_data
+
+        except (json.JSONDecodeError, ValueError) as e:
+            if not _handle_json_error(
+                history, llm_response_text, attempt, max_retries, e
+            ):
+                return None
+        except httpx.HTTPError as e:
+            print(f"Erreur de connexion à l'API du LLM: {e}")
+            return None
+        except Exception as e:
+            print(f"Erreur inattendue: {e}")
+            return None
+    return None
+
+
+# --- Regroupement d'articles courts ---
+
+PACK_INSTRUCTIONS = """Les {count} articles ci-dessous sont délimités par <<<ARTICLE n>>> et <<<FIN ARTICLE n>>>.
+Traite chaque article indépendamment, en suivant exactement les consignes et le format JSON ci-dessus.
+Renvoie UNIQUEMENT un objet JSON dont la liste "results" contient un élément par article, dans le même ordre :
+{{"results": [{{"id": 1, "data": {{...JSON attendu pour l'article 1...}}}}, {{"id": 2, "data": {{...}}}}]}}"""
+
+
+def _build_pack_history(articles, system_prompt):
+    """Historique d'une requête groupée : même prompt système, articles numérotés à la suite."""
+    parts = [PACK_INSTRUCTIONS.format(count=len(articles))]
+    for index, article_text in enumerate(articles, start=1):
+        if LLM_TRIM_BOILERPLATE:
+            article_text = article_chunking.trim_boilerplate(article_text)
+        parts.append(
+            f"<<<ARTICLE {index}>>>\n{article_text}\n<<<FIN ARTICLE {index}>>>"
+        )
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": "\n\n".join(parts)},
+    ]
+
+
+def _pack_max_tokens(count):
+    """Limite de la réponse d'un groupe : LLM_MAX_TOKENS par article, dans la moitié du contexte au plus."""
+    return min(
+        LLM_MAX_TOKENS * count, PACK_MAX_COMPLETION_TOKENS, LLM_CONTEXT_TOKENS // 2
+    )
+
+
+def _pack_output_schema(system_prompt):
+    schema = _output_schema(system_prompt)
+    return output_schema.pack_schema(schema) if schema is not None else None
+
+
+def _parse_pack_response(llm_response_text, count):
+    """
+    Associe les objets du tableau JSON renvoyé aux articles du groupe.
+
+    La réponse attendue est `{"results": [...]}` ; un tableau seul est aussi accepté.
+    Une réponse tronquée garde les résultats complets ; les autres articles sont réextraits.
+    Retourne une liste de `count` extractions ; None pour un article sans résultat valide.
+    Lève ValueError si la réponse ne contient pas de liste de résultats.
+    """
+    items = None
+    for opening in ("{", "["):
+        try:
+            parsed, repaired = llm_json.loads(llm_response_text, opening)
+        except ValueError:
+            continue
+        if isinstance(parsed, dict):
+            parsed = parsed.get("results")
+        if isinstance(parsed, list):
+            items = parsed
+            if repaired:
+                _count_usage("local_repairs")
+            break
+    if items is None:
+        raise ValueError("Aucune liste de résultats JSON trouvée dans la réponse.")
+
+    results = [None] * count
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        item_id = item.get("id")
+        if isinstance(item_id, str) and item_id.isdigit():
+            item_id = int(item_id)
+        if isinstance(item_id, int) and 1 <= item_id <= count:
+            data = item.get("data")
+            if _is_valid_extraction(data):
+                results[item_id - 1] = data
+    return results
+
+
+def _is_valid_extraction(data):
+    """Une extraction groupée est gardée si c'est un objet JSON avec au moins un champ renseigné."""
+    return isinstance(data, dict) and any(
+        not article_chunking.is_empty(value) for value in data.values()
+    )
+
+
+def _pack_jobs(jobs, system_prompt, pack_size):
+    """
+    Regroupe les jobs `(cle, texte)` en paquets d'au plus `pack_size` articles courts.
+
+    Le budget cumulé d'un paquet est LLM_PACK_TOKENS (borné par la fenêtre de contexte) ;
+    un article trop long pour être regroupé forme un paquet à lui seul.
+    """
+    budget = min(
+        LLM_PACK_TOKENS,
+        LLM_CONTEXT_TOKENS
+        - _prompt_tokens(system_prompt)
+        - _pack_max_tokens(pack_size)
+        - CONTEXT_MARGIN_TOKENS,
+    )
+    pack, pack_tokens = [], 0
+    for key, text in jobs:
+        tokens = token_counter.count_tokens(text, _token_model())
+        if tokens > budget // 2:
+            yield [(key, text)]
+            continue
+        if pack and (len(pack) >= pack_size or pack_tokens + tokens > budget):
+            yield pack
+            pack, pack_tokens = [], 0
+        pack.append((key, text))
+        pack_tokens += tokens
+    if pack:
+        yield pack
+
+
+def _pack_pending(articles, system_prompt, use_cache):
+    """Relit le cache pour chaque article du groupe ; retourne `(resultats, entrees_cache, indices_a_extraire)`."""
+    results = [None] * len(articles)
+    entries = [(None, None)] * len(articles)
+    pending = []
+    for index, article_text in enumerate(articles):
+        cache, content_hash = _cache_entry(article_text, system_prompt, use_cache)
+        entries[index] = (cache, content_hash)
+        cached_data = (
+            _cache_get(cache, content_hash, system_prompt)
+            if cache is not None
+            else None
+        )
+        if cached_data is not None:
+            results[index] = cached_data
+        else:
+            pending.append(index)
+    return results, entries, pending
+
+
+def _store_pack_results(results, entries, pending, packed, system_prompt, model):
+    """Range les extractions groupées valides (et les met en cache) ; retourne les indices à réextraire seuls."""
+    _count_usage("packed_calls")
+    _count_usage("packed_articles", len(pending))
+    retry = []
+    for index, extracted_data in zip(pending, packed):
+        if extracted_data is None:
+            retry.append(index)
+        else:
+            _store_result(results, entries, index, extracted_data, system_prompt, model)
+    _count_usage("pack_fallbacks", len(retry))
+    return retry
+
+
+def _store_result(results, entries, index, extracted_data, system_prompt, model):
+    results[index] = extracted_data
+    cache, content_hash = entries[index]
+    if extracted_data is not None and cache is not None:
+        _cache_set(cache, content_hash, system_prompt, extracted_data, model)
+
+
+def extract_packed(articles, system_prompt, max_retries=2, use_cache=True):
+    """
+    Extrait plusieurs articles courts en une seule requête au LLM.
+
+    La réponse attendue est un tableau JSON `[{"id": n, "data": {...}}]`. Tout article
+    sans résultat valide (réponse illisible, id manquant, objet vide) est réextrait seul,
+    comme avec `extract_data_from_llm`. Retourne les extractions dans l'ordre des articles.
+    """
+    results, entries, pending = _pack_pending(articles, system_prompt, use_cache)
+    if len(pending) > 1 and _check_api_key():
+        history = _build_pack_history([articles[i] for i in pending], system_prompt)
+        model = None
+        try:
+            llm_response_text, model = _track_models(
+                _call_llm,
+                history,
+                _pack_max_tokens(len(pending)),
+                _pack_output_schema(system_prompt),
+            )
+            packed = _parse_pack_response(llm_response_text, len(pending))
+        except (json.JSONDecodeError, ValueError) as e:
+            print(
+                f"Réponse groupée inexploitable ({e}), extraction article par article."
+            )
+            packed = [None] * len(pending)
+        except Exception as e:
+            print(f"Erreur lors de l'extraction groupée: {e}")
+            packed = [None] * len(pending)
+        pending = _store_pack_results(
+            results, entries, pending, packed, system_prompt, model
+        )
+
+    for index in pending:
+        extracted_data, model = _track_models(
+            _extract_article, articles[index], system_prompt, max_retries
+        )
+        _store_result(results, entries, index, extracted_data, system_prompt, model)
+    return results
+
+
+async def extract_packed_async(articles, system_prompt, max_retries=2, use_cache=True):
+    """Version asynchrone de `extract_packed`."""
+    results, entries, pending = _pack_pending(articles, system_prompt, use_cache)
+    if len(pending) > 1 and _check_api_key():
+        history = _build_pack_history([articles[i] for i in pending], system_prompt)
+        model = None
+        try:
+            llm_response_text, model = await _track_models_async(
+                _call_llm_async(
+                    history,
+                    _pack_max_tokens(len(pending)),
+                    _pack_output_schema(system_prompt),
+                )
+            )
+            packed = _parse_pack_response(llm_response_text, len(pending))
+        except (json.JSONDecodeError, ValueError) as e:
+            print(
+                f"Réponse groupée inexploitable ({e}), extraction article par article."
+            )
+            packed = [None] * len(pending)
+        except Exception as e:
+            print(f"Erreur lors de l'extraction groupée: {e}")
+            packed = [None] * len(pending)
+        pending = _store_pack_results(
+            results, entries, pending, packed, system_prompt, model
+        )
+
+    fallback = await asyncio.gather(
+        *(
+            _track_models_async(
+                _extract_article_async(articles[index], system_prompt, max_retries)
+            )
+            for index in pending
+        )
+    )
+    for index, (extracted_data, model) in zip(pending, fallback):
+        _store_result(results, entries, index, extracted_data, system_prompt, model)
+    return results
+
+
+def _iter_packs(jobs, system_prompt, pack_size):
+    """Paquets de jobs `(cle, texte)` à extraire ensemble (un job par paquet si pack_size <= 1)."""
+    if pack_size > 1:
+        return _pack_jobs(jobs, system_prompt, pack_size)
+    return ([job] for job in jobs)
+
+
+def _pack_label(pack):
+    return ", ".join(str(key) for key, _ in pack)
+
+
+def _extract_pack(pack, system_prompt, **extract_kwargs):
+    """Extrait un paquet de jobs ; retourne les triplets `(cle, texte, extracted_data)`."""
+    texts = [text for _, text in pack]
+    if len(pack) == 1:
+        results = [extract_data_from_llm(texts[0], system_prompt, **extract_kwargs)]
+    else:
+        results = extract_packed(texts, system_prompt, **extract_kwargs)
+    return [(key, text, data) for (key, text), data in zip(pack, results)]
+
+
+async def _extract_pack_async(pack, system_prompt, **extract_kwargs):
+    """Version asynchrone de `_extract_pack`."""
+    texts = [text for _, text in pack]
+    if len(pack) == 1:
+        results = [
+            await extract_data_from_llm_async(texts[0], system_prompt, **extract_kwargs)
+        ]
+    else:
+        results = await extract_packed_async(texts, system_prompt, **extract_kwargs)
+    return [(key, text, data) for (key, text), data in zip(pack, results)]
+
+
+async def extract_many_async(
+    articles,
+    system_prompt,
+    concurrency=DEFAULT_ASYNC_CONCURRENCY,
+    on_result=None,
+    pack_size=DEFAULT_PACK_SIZE,
+    on_error=None,
+    **extract_kwargs,
+):
+    """
+    Extrait les données d'une liste d'articles en parallèle sur la boucle courante.
+
+    Au plus `concurrency` requêtes sont en vol. `on_result(index, extracted_data)` est
+    appelé à chaque fin d'extraction. Retourne les résultats dans l'ordre des articles.
+    Avec pack_size > 1, les articles courts sont extraits par groupes (voir `extract_packed`).
+
+    Une erreur inattendue n'interrompt que son groupe : ses articles valent None et
+    `on_error(index, erreur)` est appelé pour chacun (sinon l'erreur est affichée).
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    results = [None] * len(articles)
+
+    async def run_pack(pack):
+        try:
+            async with semaphore:
+                pack_results = await _extract_pack_async(
+                    pack, system_prompt, **extract_kwargs
+                )
+        except Exception as e:
+            if on_error is None:
+                print(f"Erreur inattendue (articles {_pack_label(pack)}): {e}")
+            else:
+                for index, _ in pack:
+                    on_error(index, e)
+            pack_results = [(index, text, None) for index, text in pack]
+        for index, _, extracted_data in pack_results:
+            results[index] = extracted_data
+            if on_result:
+                on_result(index, extracted_data)
+
+    await asyncio.gather(
+        *(
+            run_pack(pack)
+            for pack in _iter_packs(enumerate(articles), system_prompt, pack_size)
+        )
+    )
+    return results
+
+
+def extract_many(
+    articles,
+    system_prompt,
+    concurrency=DEFAULT_ASYNC_CONCURRENCY,
+    on_result=None,
+    pack_size=DEFAULT_PACK_SIZE,
+    on_error=None,
+    **extract_kwargs,
+):
+    """Point d'entrée synchrone de `extract_many_async` (CLI, Streamlit)."""
+
+    async def main():
+        try:
+            return await extract_many_async(
+                articles,
+                system_prompt,
+                concurrency=concurrency,
+                on_result=on_result,
+                pack_size=pack_size,
+                on_error=on_error,
+                **extract_kwargs,
+            )
+        finally:
+            await llm_client.close_async_clients()
+
+    return asyncio.run(main())
+
+
 # --- Logique de Traitement par Lots ---
 
 
-def process_csv(user_id, system_prompt, csv_file):
+def _run_extractions_async(
+    jobs, system_prompt, concurrency, pack_size, **extract_kwargs
+):
+    """
+    Exécute les extractions sur une boucle asyncio dédiée (thread d'arrière-plan) et
+    renvoie les résultats au thread appelant au fil de l'eau.
+
+    Les paquets sont construits sur le thread appelant (lecture du CSV, recherche des
+    articles déjà extraits en base) : la boucle ne fait que les appels au LLM. Si
+    l'appelant arrête l'itération, les requêtes en cours sont annulées.
+    """
+    results = queue.Queue()
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+
+    async def run_pack(pack):
+        try:
+            pack_results = await _extract_pack_async(
+                pack, system_prompt, **extract_kwargs
+            )
+        except Exception as e:
+            print(f"Erreur inattendue ({_pack_label(pack)}): {e}")
+            pack_results = [(key, text, None) for key, text in pack]
+        results.put(pack_results)
+
+    async def shutdown():
+        current = asyncio.current_task()
+        tasks = [task for task in asyncio.all_tasks() if task is not current]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await llm_client.close_async_clients()
+
+    in_flight = 0
+    try:
+        for pack in _iter_packs(jobs, system_prompt, pack_size):
+            # Au plus `concurrency` paquets en vol : on attend qu'un paquet se termine
+            while in_flight >= max(1, concurrency):
+                yield from results.get()
+                in_flight -= 1
+            asyncio.run_coroutine_threadsafe(run_pack(pack), loop)
+            in_flight += 1
+            while not results.empty():
+                yield from results.get()
+                in_flight -= 1
+        while in_flight:
+            yield from results.get()
+            in_flight -= 1
+    finally:
+        try:
+            asyncio.run_coroutine_threadsafe(shutdown(), loop).result()
+        except Exception as e:
+            print(f"Erreur à l'arrêt de la boucle asynchrone: {e}")
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+
+def run_extractions(
+    jobs,
+    system_prompt,
+    workers=1,
+    use_async=False,
+    pack_size=DEFAULT_PACK_SIZE,
+    **extract_kwargs,
+):
+    """
+    Exécute l'extraction LLM pour chaque job `(cle, texte)` et renvoie les résultats
+    au fil de l'eau sous la forme `(cle, texte, extracted_data)`.
+
+    Avec workers > 1, les articles sont envoyés au LLM en parallèle via un pool de
+    threads. La file des requêtes en vol est bornée à 2 * workers pour ne pas lire
+    tout le fichier d'entrée d'avance ; les résultats arrivent dans l'ordre de fin.
+    Avec use_async=True, les requêtes partent d'une seule boucle asyncio et `workers`
+    fixe le nombre d'appels simultanés (plusieurs centaines possibles).
+    Avec pack_size > 1, jusqu'à `pack_size` articles courts partagent une requête
+    (voir `extract_packed`) ; `workers` compte alors les requêtes, pas les articles.
+    Les autres arguments nommés sont transmis à la fonction d'extraction.
+    """
+    if use_async:
+        yield from _run_extractions_async(
+            jobs, system_prompt, workers, pack_size, **extract_kwargs
+        )
+        return
+
+    packs = _iter_packs(jobs, system_prompt, pack_size)
+    if workers <= 1:
+        for pack in packs:
+            yield from _extract_pack(pack, system_prompt, **extract_kwargs)
+        return
+
+    max_in_flight = workers * 2
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = {}
+
+        def collect(futures):
+            for future in futures:
+                pack = pending.pop(future)
+                try:
+                    yield from future.result()
+                except Exception as e:
+                    print(f"Erreur inattendue ({_pack_label(pack)}): {e}")
+                    for key, text in pack:
+                        yield key, text, None
+
+        for pack in packs:
+            if len(pending) >= max_in_flight:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                yield from collect(done)
+            future = executor.submit(
+                _extract_pack, pack, system_prompt, **extract_kwargs
+            )
+            pending[future] = pack
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            yield from collect(done)
+
+
+class BulkExtractionWriter:
+    """
+    Accumule les extractions réussies et les écrit en base par paquets de `chunk_size`
+    (une transaction par paquet via `database.add_extractions_bulk`).
+
+    `on_flush(keys, success, message)` est appelé après chaque écriture avec les clés
+    des articles du paquet. Le hash de `system_prompt` est enregistré avec chaque
+    extraction, pour que skip_existing_jobs sache avec quel prompt elle a été faite.
+    """
+
+    def __init__(
+        self,
+        user_id,
+        chunk_size=DEFAULT_DB_CHUNK_SIZE,
+        on_flush=None,
+        system_prompt=None,
+    ):
+        self.user_id = user_id
+        self.chunk_size = max(1, chunk_size)
+        self.on_flush = on_flush
+        self.prompt_hash = (
+            extraction_cache.prompt_hash(system_prompt) if system_prompt else None
+        )
+        self._keys = []
+        self._rows = []
+
+    def add(self, key, original_content, extracted_data, source_url=None):
+        """Ajoute une extraction au paquet courant et l'écrit si le paquet est plein."""
+        self._keys.append(key)
+        self._rows.append(
+            {
+                "original_content": original_content,
+                "extracted_data": json.dumps(extracted_data),
+                "content_hash": database.calculate_content_hash(original_content),
+                "source_url": source_url,
+                "prompt_hash": self.prompt_hash,
+            }
+        )
+        if len(self._rows) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """Écrit le paquet courant en base."""
+        if not self._rows:
+            return
+        keys, rows = self._keys, self._rows
+        self._keys, self._rows = [], []
+        success, message = database.add_extractions_bulk(self.user_id, rows)
+        if self.on_flush:
+            self.on_flush(keys, success, message)
+
+
+def detect_content_column(fieldnames):
+    """Retourne le nom de la colonne contenant le texte des articles dans un CSV, ou None."""
+    for col in CSV_CONTENT_COLUMNS:
+        if col in (fieldnames or []):
+            return col
+    return None
+
+
+def skip_existing_jobs(
+    jobs, user_id, system_prompt, on_skip=None, chunk_size=SKIP_LOOKUP_CHUNK_SIZE
+):
+    """
+    Filtre les jobs `(cle, texte)` déjà extraits pour l'utilisateur avec `system_prompt`.
+
+    Un article extrait avec un autre prompt n'est pas ignoré : il est ré-extrait avec
+    le prompt courant. Les hashes sont vérifiés en base par paquets de `chunk_size`
+    (une requête par paquet), avant tout appel au LLM. `on_skip(cle, texte)` est appelé
+    pour chaque job ignoré.
+    """
+    prompt_hash = extraction_cache.prompt_hash(system_prompt)
+
+    def flush(buffer):
+        existing = database.get_existing_content_hashes(
+            user_id, [content_hash for _, _, content_hash in buffer], prompt_hash
+        )
+        for key, text, content_hash in buffer:
+            if content_hash in existing:
+                if on_skip:
+                    on_skip(key, text)
+            else:
+                yield key, text
+
+    buffer = []
+    for key, text in jobs:
+        buffer.append((key, text, database.calculate_content_hash(text)))
+        if len(buffer) >= chunk_size:
+            yield from flush(buffer)
+            buffer = []
+    if buffer:
+        yield from flush(buffer)
+
+
+def _print_cache_summary(cache_stats_before):
+    """Affiche les hits/misses du cache depuis `cache_stats_before`."""
+    cache_stats = get_cache_stats()
+    hits = cache_stats["hits"] - cache_stats_before["hits"]
+    misses = cache_stats["misses"] - cache_stats_before["misses"]
+    print(f"  - Cache: {hits} hits, {misses} misses (appels LLM évités: {hits})")
+
+
+def _print_pool_summary():
+    """Affiche les métriques du pool de connexions PostgreSQL du processus."""
+    pool_stats = database.get_pool_stats()
+    if not pool_stats:
+        return
+    print(
+        f"  - Pool PostgreSQL: {pool_stats['checkouts']} emprunts "
+        f"(attente moyenne {pool_stats['avg_checkout_ms']:.1f} ms, max {pool_stats['max_checkout_ms']:.1f} ms), "
+        f"{pool_stats['waits']} attentes de connexion libre, {pool_stats['timeouts']} timeouts, "
+        f"{pool_stats['reconnects']} reconnexions"
+    )
+
+
+def _print_usage_summary(usage_stats_before):
+    """Affiche les tokens consommés depuis `usage_stats_before`, dont ceux relus du cache de prompt."""
+    usage_stats = get_usage_stats()
+    calls = usage_stats["calls"] - usage_stats_before["calls"]
+    if not calls:
+        return
+    prompt_tokens = usage_stats["prompt_tokens"] - usage_stats_before["prompt_tokens"]
+    cached_tokens = usage_stats["cached_tokens"] - usage_stats_before["cached_tokens"]
+    completion_tokens = (
+        usage_stats["completion_tokens"] - usage_stats_before["completion_tokens"]
+    )
+    cached_share = 100 * cached_tokens / prompt_tokens if prompt_tokens else 0
+    print(
+        f"  - Tokens: {prompt_tokens} en entrée (dont {cached_tokens} en cache, {cached_share:.0f}%), "
+        f"{completion_tokens} en sortie sur {calls} appels LLM"
+    )
+    packed_calls = usage_stats["packed_calls"] - usage_stats_before["packed_calls"]
+    if packed_calls:
+        packed_articles = (
+            usage_stats["packed_articles"] - usage_stats_before["packed_articles"]
+        )
+        fallbacks = usage_stats["pack_fallbacks"] - usage_stats_before["pack_fallbacks"]
+        print(
+            f"  - Regroupement: {packed_articles} articles en {packed_calls} requêtes groupées, "
+            f"{fallbacks} réextraits seuls"
+        )
+    structured_calls = (
+        usage_stats["structured_calls"] - usage_stats_before["structured_calls"]
+    )
+    repair_calls = usage_stats["repair_calls"] - usage_stats_before["repair_calls"]
+    if structured_calls:
+        first_try = (
+            usage_stats["schema_first_try"] - usage_stats_before["schema_first_try"]
+        )
+        print(
+            f"  - Sortie structurée: {structured_calls} réponses contraintes par le schéma, "
+            f"{first_try} articles valides du premier coup, "
+            f"{repair_calls} appels de réparation"
+        )
+    elif repair_calls:
+        print(f"  - Appels de réparation JSON: {repair_calls}")
+    stream_calls = usage_stats["stream_calls"] - usage_stats_before["stream_calls"]
+    if stream_calls:
+        early_stops = (
+            usage_stats["stream_early_stops"] - usage_stats_before["stream_early_stops"]
+        )
+        print(
+            f"  - Streaming: {early_stops} réponses sur {stream_calls} interrompues dès le JSON complet "
+            f"(tokens estimés quand le serveur n'a pas envoyé le décompte)"
+        )
+    retries = usage_stats["limiter_retries"] - usage_stats_before["limiter_retries"]
+    if retries:
+        rate_limited = (
+            usage_stats["limiter_rate_limited"]
+            - usage_stats_before["limiter_rate_limited"]
+        )
+        server_errors = (
+            usage_stats["limiter_server_errors"]
+            - usage_stats_before["limiter_server_errors"]
+        )
+        failed = (
+            usage_stats["limiter_failed_after_retries"]
+            - usage_stats_before["limiter_failed_after_retries"]
+        )
+        print(
+            f"  - Nouvelles tentatives: {retries} ({rate_limited} quotas dépassés (429), "
+            f"{server_errors} erreurs serveur), {failed} abandons ; "
+            f"concurrence finale: {rate_limiter.get_limiter().concurrency}"
+        )
+    _print_router_summary(usage_stats, usage_stats_before)
+    local_repairs = usage_stats["local_repairs"] - usage_stats_before["local_repairs"]
+    if local_repairs:
+        print(
+            f"  - JSON corrigés localement (balises, virgules, réponses tronquées): "
+            f"{local_repairs}, sans appel de réparation"
+        )
+
+
+def _print_router_summary(usage_stats, usage_stats_before):
+    """Répartition des requêtes entre les serveurs locaux (plusieurs serveurs ou débordement)."""
+    if _router is None:
+        return
+
+    def delta(key):
+        key = f"router_{key}"
+        return usage_stats.get(key, 0) - usage_stats_before.get(key, 0)
+
+    fallback = delta("openai_fallback")
+    if len(_router.endpoints) == 1 and not fallback:
+        return
+    parts = []
+    for endpoint in _router.endpoints:
+        part = f"{endpoint.name}: {delta(f'requests@{endpoint.name}')} requêtes"
+        errors = delta(f"errors@{endpoint.name}")
+        ejections = delta(f"ejections@{endpoint.name}")
+        if errors:
+            part += f", {errors} erreurs"
+        if ejections:
+            part += f", écarté {ejections} fois"
+        parts.append(part)
+    if fallback:
+        parts.append(f"OpenAI (débordement): {fallback} requêtes")
+    print(f"  - Serveurs LLM: {' ; '.join(parts)}")
+
+
+def process_csv(
+    user_id,
+    system_prompt,
+    csv_file,
+    workers=1,
+    use_async=False,
+    use_cache=True,
+    skip_existing=True,
+    db_chunk_size=DEFAULT_DB_CHUNK_SIZE,
+    pack_size=DEFAULT_PACK_SIZE,
+):
     """
     Traite un fichier CSV contenant des articles.
     Le CSV doit avoir une colonne 'content' ou 'article' avec le texte.
+    Avec workers > 1, plusieurs lignes sont envoyées au LLM en parallèle
+    (threads, ou boucle asyncio si use_async=True).
+    Avec skip_existing=True, les articles déjà extraits pour l'utilisateur avec ce prompt
+    sont ignorés.
+    Les extractions sont écrites en base par paquets de `db_chunk_size`.
+    Avec pack_size > 1, les articles courts sont envoyés au LLM par groupes.
     """
     print(f"Traitement du fichier CSV: {csv_file}")
+    cache_stats_before = get_cache_stats()
+    usage_stats_before = get_usage_stats()
 
     try:
         with open(csv_file, "r", encoding="utf-8") as f:
@@ -147,11 +1692,7 @@ def process_csv(user_id, system_prompt, csv_file):
 
             # Détecter la colonne de contenu
             fieldnames = reader.fieldnames
-            content_column = None
-            for col in ["content", "article", "text", "texte", "contenu"]:
-                if col in fieldnames:
-                    content_column = col
-                    break
+            content_column = detect_content_column(fieldnames)
 
             if not content_column:
                 print(f"ERREUR: Aucune colonne de contenu trouvée dans le CSV.")
@@ -162,50 +1703,85 @@ def process_csv(user_id, system_prompt, csv_file):
                 return
 
             print(f"Colonne de contenu détectée: '{content_column}'")
+            if use_async:
+                print(f"Mode asynchrone: {workers} requêtes LLM simultanées")
+            elif workers > 1:
+                print(f"Mode parallèle: {workers} requêtes LLM simultanées")
+            if pack_size > 1:
+                print(f"Regroupement: jusqu'à {pack_size} articles courts par requête")
 
             row_count = 0
             success_count = 0
             error_count = 0
+            skipped_count = 0
+
+            def on_skip(row_num, article_content):
+                nonlocal skipped_count
+                skipped_count += 1
+                print(f"Ligne {row_num}: Article déjà extrait, ignoré.")
+
+            def on_flush(row_nums, success, message):
+                nonlocal success_count, error_count
+                if success:
+                    print(
+                        f"✅ Lignes {', '.join(map(str, row_nums))}: Données sauvegardées/mises à jour."
+                    )
+                    success_count += len(row_nums)
+                else:
+                    print(
+                        f"❌ Lignes {', '.join(map(str, row_nums))}: Erreur de sauvegarde: {message}"
+                    )
+                    error_count += len(row_nums)
 
-            for row_num, row in enumerate(
-                reader, start=2
-            ):  # Start at 2 (ligne 1 = header)
-                article_content = row.get(content_column, "").strip()
+            writer = BulkExtractionWriter(
+                user_id, db_chunk_size, on_flush=on_flush, system_prompt=system_prompt
+            )
 
-                if not article_content:
-                    print(f"Ligne {row_num}: Contenu vide, ignoré.")
-                    continue
+            def iter_rows():
+                nonlocal row_count
+                for row_num, row in enumerate(
+                    reader, start=2
+                ):  # Start at 2 (ligne 1 = header)
+                    article_content = row.get(content_column, "").strip()
 
-                row_count += 1
-                print(
-                    f"\n--- Traitement ligne {row_num} ({row_count} articles traités) ---"
-                )
+                    if not article_content:
+                        print(f"Ligne {row_num}: Contenu vide, ignoré.")
+                        continue
 
-                extracted_data = extract_data_from_llm(article_content, system_prompt)
+                    row_count += 1
+                    print(
+                        f"\n--- Traitement ligne {row_num} ({row_count} articles traités) ---"
+                    )
+                    yield row_num, article_content
 
+            jobs = iter_rows()
+            if skip_existing:
+                jobs = skip_existing_jobs(jobs, user_id, system_prompt, on_skip=on_skip)
+
+            for row_num, article_content, extracted_data in run_extractions(
+                jobs,
+                system_prompt,
+                workers=workers,
+                use_async=use_async,
+                pack_size=pack_size,
+                use_cache=use_cache,
+            ):
                 if extracted_data:
-                    content_hash = database.calculate_content_hash(article_content)
-                    success, message = database.add_extraction(
-                        user_id=user_id,
-                        original_content=article_content,
-                        extracted_data=json.dumps(extracted_data),
-                        content_hash=content_hash,
-                    )
-                    if success:
-                        print(f"✅ Données sauvegardées/mises à jour.")
-                        success_count += 1
-                    else:
-                        print(f"❌ Erreur de sauvegarde: {message}")
-                        error_count += 1
+                    writer.add(row_num, article_content, extracted_data)
                 else:
-                    print(f"❌ Échec de l'extraction.")
+                    print(f"❌ Ligne {row_num}: Échec de l'extraction.")
                     error_count += 1
+            writer.flush()
 
             print(f"\n{'=' * 60}")
             print(f"Traitement terminé:")
             print(f"  - {row_count} articles traités")
             print(f"  - {success_count} succès")
             print(f"  - {error_count} échecs")
+            print(f"  - {skipped_count} déjà extraits (ignorés)")
+            _print_cache_summary(cache_stats_before)
+            _print_usage_summary(usage_stats_before)
+            _print_pool_summary()
             print(f"{'=' * 60}")
 
     except FileNotFoundError:
@@ -214,9 +1790,24 @@ def process_csv(user_id, system_prompt, csv_file):
         print(f"ERREUR lors de la lecture du CSV: {e}")
 
 
-def process_batch(user_id, system_prompt):
+def process_batch(
+    user_id,
+    system_prompt,
+    workers=1,
+    use_async=False,
+    use_cache=True,
+    skip_existing=True,
+    db_chunk_size=DEFAULT_DB_CHUNK_SIZE,
+    pack_size=DEFAULT_PACK_SIZE,
+):
     """
     Traite tous les fichiers .txt dans le dossier SOURCE_DIR.
+    Avec workers > 1, plusieurs fichiers sont envoyés au LLM en parallèle
+    (threads, ou boucle asyncio si use_async=True).
+    Avec skip_existing=True, les fichiers déjà extraits pour l'utilisateur avec ce prompt
+    ne sont pas renvoyés au LLM et sont directement déplacés dans PROCESSED_DIR.
+    Les extractions sont écrites en base par paquets de `db_chunk_size`.
+    Avec pack_size > 1, les articles courts sont envoyés au LLM par groupes.
     """
     print(f"Lancement du traitement par lots pour l'utilisateur ID: {user_id}...")
     os.makedirs(PROCESSED_DIR, exist_ok=True)
@@ -226,41 +1817,79 @@ def process_batch(user_id, system_prompt):
         print("Aucun fichier à traiter dans le dossier 'a_traiter'.")
         return
 
-    for filename in files_to_process:
-        filepath = os.path.join(SOURCE_DIR, filename)
-        print(f"--- Traitement du fichier: {filename} ---")
+    cache_stats_before = get_cache_stats()
+    usage_stats_before = get_usage_stats()
+    skipped_count = 0
 
-        with open(filepath, "r", encoding="utf-8") as f:
-            article_content = f.read()
+    def on_skip(filename, article_content):
+        nonlocal skipped_count
+        skipped_count += 1
+        shutil.move(
+            os.path.join(SOURCE_DIR, filename), os.path.join(PROCESSED_DIR, filename)
+        )
+        print(
+            f"{filename}: Article déjà extrait, ignoré et déplacé vers '{PROCESSED_DIR}'."
+        )
 
-        if not article_content.strip():
-            print("Fichier vide, ignoré.")
-            continue
+    def on_flush(filenames, success, message):
+        if not success:
+            print(f"Erreur lors de la sauvegarde en base de données: {message}")
+            return
+        print(
+            f"Données sauvegardées/mises à jour dans la base de données pour l'utilisateur {user_id} ({len(filenames)} fichiers)."
+        )
+        for filename in filenames:
+            # Déplacer le fichier traité
+            shutil.move(
+                os.path.join(SOURCE_DIR, filename),
+                os.path.join(PROCESSED_DIR, filename),
+            )
+            print(f"{filename}: Fichier déplacé vers '{PROCESSED_DIR}'.")
+
+    writer = BulkExtractionWriter(
+        user_id, db_chunk_size, on_flush=on_flush, system_prompt=system_prompt
+    )
+
+    def iter_files():
+        for filename in files_to_process:
+            filepath = os.path.join(SOURCE_DIR, filename)
+            print(f"--- Traitement du fichier: {filename} ---")
+
+            with open(filepath, "r", encoding="utf-8") as f:
+                article_content = f.read()
+
+            if not article_content.strip():
+                print("Fichier vide, ignoré.")
+                continue
 
-        extracted_data = extract_data_from_llm(article_content, system_prompt)
+            yield filename, article_content
 
+    jobs = iter_files()
+    if skip_existing:
+        jobs = skip_existing_jobs(jobs, user_id, system_prompt, on_skip=on_skip)
+
+    for filename, article_content, extracted_data in run_extractions(
+        jobs,
+        system_prompt,
+        workers=workers,
+        use_async=use_async,
+        pack_size=pack_size,
+        use_cache=use_cache,
+    ):
         if extracted_data:
-            print("Données extraites avec succès.")
-            # Calculer le hash du contenu
-            content_hash = database.calculate_content_hash(article_content)
-
-            success, message = database.add_extraction(
-                user_id=user_id,
-                original_content=article_content,
-                extracted_data=json.dumps(extracted_data),
-                content_hash=content_hash,
-            )
-            if success:
-                print(
-                    f"Données sauvegardées/mises à jour dans la base de données pour l'utilisateur {user_id}."
-                )
-                # Déplacer le fichier traité
-                shutil.move(filepath, os.path.join(PROCESSED_DIR, filename))
-                print(f"Fichier déplacé vers '{PROCESSED_DIR}'.")
-            else:
-                print(f"Erreur lors de la sauvegarde en base de données: {message}")
+            print(f"{filename}: Données extraites avec succès.")
+            writer.add(filename, article_content, extracted_data)
         else:
-            print("Échec de l'extraction des données pour ce fichier.")
+            print(f"{filename}: Échec de l'extraction des données pour ce fichier.")
+    writer.flush()
+
+    print(f"\n{'=' * 60}")
+    print("Traitement terminé:")
+    print(f"  - {skipped_count} déjà extraits (ignorés)")
+    _print_cache_summary(cache_stats_before)
+    _print_usage_summary(usage_stats_before)
+    _print_pool_summary()
+    print(f"{'=' * 60}")
 
 
 if __name__ == "__main__":
@@ -278,7 +1907,66 @@ if __name__ == "__main__":
         type=str,
         help="Chemin vers un fichier CSV à traiter (doit contenir une colonne 'content', 'article', 'text', 'texte' ou 'contenu')",
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help=f"Nombre de requêtes LLM envoyées en parallèle (défaut: {DEFAULT_WORKERS} en mode sync, {DEFAULT_ASYNC_CONCURRENCY} en mode async).",
+    )
+    parser.add_argument(
+        "--pack-size",
+        type=int,
+        default=DEFAULT_PACK_SIZE,
+        help="Nombre maximal d'articles courts envoyés dans une même requête LLM (défaut: 1, pas de regroupement).",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Ignore le cache local des extractions et appelle toujours le LLM.",
+    )
+    existing_group = parser.add_mutually_exclusive_group()
+    existing_group.add_argument(
+        "--skip-existing",
+        dest="skip_existing",
+        action="store_true",
+        default=True,
+        help="Ignore les articles déjà extraits pour cet utilisateur avec le même prompt (comportement par défaut).",
+    )
+    existing_group.add_argument(
+        "--force",
+        dest="skip_existing",
+        action="store_false",
+        help="Ré-extrait aussi les articles déjà présents en base (combiner avec --no-cache pour rappeler le LLM).",
+    )
+    parser.add_argument(
+        "--db-chunk-size",
+        type=int,
+        default=DEFAULT_DB_CHUNK_SIZE,
+        help="Nombre d'extractions écrites en base par transaction (défaut: 100).",
+    )
+    parser.add_argument(
+        "--mode",
+        choices=["sync", "async", "batch"],
+        default="sync",
+        help="'sync' : appels bloquants (pool de threads si --workers > 1) ; 'async' : appels asynchrones sur une seule boucle asyncio ; 'batch' : soumission via l'API Batch d'OpenAI.",
+    )
+    parser.add_argument(
+        "--resume",
+        type=str,
+        metavar="JOB_DIR",
+        help="Mode batch : reprend un job existant à partir de son dossier (batch_jobs/<job_id>).",
+    )
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=None,
+        help="Mode batch : intervalle en secondes entre deux vérifications du statut (défaut: 60).",
+    )
     args = parser.parse_args()
+    if args.workers is None:
+        args.workers = (
+            DEFAULT_ASYNC_CONCURRENCY if args.mode == "async" else DEFAULT_WORKERS
+        )
 
     # Vérifier si l'utilisateur existe
     user = database.get_user(args.user)
@@ -297,17 +1985,70 @@ if __name__ == "__main__":
             system_prompt_to_use = load_system_prompt()
             print(f"Utilisation du prompt par défaut pour l'utilisateur '{args.user}'.")
 
-        if system_prompt_to_use:
+        if args.mode == "batch" or args.resume:
+            # Import local : batch_api importe lui-même ce module
+            import batch_api
+
+            poll_interval = args.poll_interval or batch_api.BATCH_POLL_INTERVAL
+            if not USE_OPENAI:
+                print("ERREUR: Le mode batch nécessite l'API OpenAI (USE_OPENAI=true).")
+            elif args.resume:
+                batch_api.run_job(
+                    batch_api.load_manifest(args.resume),
+                    poll_interval=poll_interval,
+                    db_chunk_size=args.db_chunk_size,
+                )
+            elif system_prompt_to_use:
+                if args.csv:
+                    jobs, source = batch_api.iter_csv_jobs(args.csv), "csv"
+                else:
+                    jobs, source = batch_api.iter_directory_jobs(), "directory"
+                if args.skip_existing:
+                    jobs = skip_existing_jobs(jobs, user["id"], system_prompt_to_use)
+                manifest = batch_api.create_job(
+                    user["id"], system_prompt_to_use, jobs, source
+                )
+                if manifest is None:
+                    print("Aucun nouvel article à soumettre.")
+                else:
+                    print(
+                        f"Job batch {manifest['job_id']} créé: {manifest['request_count']} articles."
+                    )
+                    batch_api.run_job(
+                        manifest,
+                        poll_interval=poll_interval,
+                        db_chunk_size=args.db_chunk_size,
+                    )
+            else:
+                print(
+                    "ERREUR: Le prompt système est vide. Impossible de lancer le traitement."
+                )
+        elif system_prompt_to_use:
             # Si un fichier CSV est fourni, traiter le CSV
             if args.csv:
                 process_csv(
                     user_id=user["id"],
                     system_prompt=system_prompt_to_use,
                     csv_file=args.csv,
+                    workers=args.workers,
+                    use_async=args.mode == "async",
+                    use_cache=not args.no_cache,
+                    skip_existing=args.skip_existing,
+                    db_chunk_size=args.db_chunk_size,
+                    pack_size=args.pack_size,
                 )
             else:
                 # Sinon, traiter les fichiers txt du dossier a_traiter
-                process_batch(user_id=user["id"], system_prompt=system_prompt_to_use)
+                process_batch(
+                    user_id=user["id"],
+                    system_prompt=system_prompt_to_use,
+                    workers=args.workers,
+                    use_async=args.mode == "async",
+                    use_cache=not args.no_cache,
+                    skip_existing=args.skip_existing,
+                    db_chunk_size=args.db_chunk_size,
+                    pack_size=args.pack_size,
+                )
         else:
             print(
                 "ERREUR: Le prompt système est vide. Impossible de lancer le traitement."
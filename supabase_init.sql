@@ -41,10 +41,30 @@ CREATE TABLE IF NOT EXISTS extractions (
 CREATE INDEX IF NOT EXISTS idx_extractions_user_id ON extractions(user_id);
 CREATE INDEX IF NOT EXISTS idx_extractions_created_at ON extractions(created_at DESC);
 CREATE INDEX IF NOT EXISTS idx_extractions_content_hash ON extractions(content_hash);
+-- Pagination de l'historique par (created_at, id) (migration 2)
+CREATE INDEX IF NOT EXISTS idx_extractions_user_created ON extractions(user_id, created_at DESC, id DESC);
 
 -- Index GIN pour recherche rapide dans les données JSON
 CREATE INDEX IF NOT EXISTS idx_extractions_data ON extractions USING GIN (extracted_data);
 
+-- ========================================
+-- Suivi des migrations (voir MIGRATIONS dans database.py)
+-- ========================================
+-- Ce script correspond à la version 2 : l'application appliquera elle-même les versions suivantes
+-- (version 1 : schéma initial ; version 2 : index de pagination, ajouté avec l'historique paginé).
+-- Une migration de MIGRATIONS reprise dans ce script y ajoute sa ligne ci-dessous et ce numéro.
+CREATE TABLE IF NOT EXISTS schema_version (
+    version INTEGER PRIMARY KEY,
+    description TEXT,
+    applied_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+INSERT INTO schema_version (version, description)
+VALUES (1, 'Schéma initial : users, extractions, content_hash, source_url, unique_user_content')
+ON CONFLICT (version) DO NOTHING;
+INSERT INTO schema_version (version, description)
+VALUES (2, 'Index (user_id, created_at DESC, id DESC) pour la pagination de l''historique')
+ON CONFLICT (version) DO NOTHING;
+
 -- ========================================
 -- Politiques de sécurité Row Level Security (RLS)
 -- ========================================
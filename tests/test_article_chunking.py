@@ -0,0 +1,57 @@
+"""Retrait des sections standard de fin de communiqué (trim_boilerplate)"""
+
+import article_chunking
+
+INVESTORS = "Le tour est mené par Partech, avec la participation de Bpifrance."
+
+
+def test_trims_about_section_after_content():
+    text = "\n".join(
+        [
+            "Acme lève 10 millions d'euros.",
+            INVESTORS,
+            "",
+            "À propos d'Acme",
+            "Acme est une start-up fondée en 2020.",
+            "Contact presse : presse@acme.fr",
+        ]
+    )
+
+    trimmed = article_chunking.trim_boilerplate(text)
+
+    assert INVESTORS in trimmed
+    assert "fondée en 2020" not in trimmed
+
+
+def test_trims_press_contact_and_end_marker_headings():
+    for heading in ("Contacts presse :", "Media contact", "###", "DISCLAIMER"):
+        text = f"Acme lève 10 millions d'euros.\n{heading}\nJane Doe, +33 1 00 00 00 00"
+        assert article_chunking.trim_boilerplate(text) == (
+            "Acme lève 10 millions d'euros."
+        )
+
+
+def test_keeps_sentences_starting_like_a_heading():
+    sentences = [
+        "About 40 new jobs will be created.",
+        "Avertissement : les montants sont provisoires.",
+        "Disclaimer aside, the round closed in March. It was oversubscribed",
+        "À propos de cette levée, le fondateur se dit confiant !",
+    ]
+    for sentence in sentences:
+        text = "\n".join(["Acme raises $10M.", sentence, INVESTORS])
+        trimmed = article_chunking.trim_boilerplate(text)
+        assert sentence in trimmed
+        assert INVESTORS in trimmed
+
+
+def test_keeps_article_that_starts_with_about():
+    text = "À propos de la levée\nAcme lève 10 millions d'euros.\n" + INVESTORS
+    assert article_chunking.trim_boilerplate(text) == text
+
+
+def test_drops_noise_lines_only():
+    text = "Acme lève 10 millions d'euros.\nPartager sur LinkedIn\n" + INVESTORS
+    assert article_chunking.trim_boilerplate(text) == (
+        "Acme lève 10 millions d'euros.\n" + INVESTORS
+    )
@@ -0,0 +1,304 @@
+"""
+Mode batch testé de bout en bout contre un faux serveur Batch local
+
+Le serveur imite les routes de l'API OpenAI utilisées par batch_api (envoi de fichier,
+création et suivi d'un batch, lecture du fichier de résultats). L'écriture en base est
+remplacée par une liste en mémoire.
+"""
+
+import email.parser
+import email.policy
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import batch_api
+import database
+import extraction_cache
+import llm_client
+import run_extraction
+
+SYSTEM_PROMPT = """Extrais les informations de l'article.
+
+Voici le format JSON attendu :
+{
+  "Nom_start-up": "..."
+}
+"""
+
+
+class FakeBatchHandler(BaseHTTPRequestHandler):
+    """
+    Routes `/v1/files`, `/v1/batches` et `/v1/files/<id>/content`. Un batch est terminé
+    après deux consultations. Les fichiers et batchs sont gardés sur le serveur
+    (`self.server.files`, `self.server.batches`), propres à chaque test.
+
+    Selon le texte de l'article, la ligne de résultat est absente (« erreur »), en échec
+    HTTP 500 (« surcharge ») ou sans JSON exploitable (« illisible »).
+    """
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, payload, raw=None):
+        data = raw if raw is not None else json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _batch(self, batch_id):
+        batch = self.server.batches[batch_id]
+        done = batch["polls"] >= 2
+        return {
+            "id": batch_id,
+            "object": "batch",
+            "endpoint": batch_api.BATCH_ENDPOINT,
+            "input_file_id": batch["input_file_id"],
+            "completion_window": batch_api.BATCH_COMPLETION_WINDOW,
+            "status": "completed" if done else "in_progress",
+            "created_at": 0,
+            "output_file_id": batch["output_file_id"] if done else None,
+            "error_file_id": None,
+            "request_counts": {
+                "total": batch["total"],
+                "completed": batch["total"] if done else 0,
+                "failed": 0,
+            },
+        }
+
+    def _upload(self, body):
+        message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+            f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode() + body
+        )
+        for part in message.iter_parts():
+            if part.get_param("name", header="content-disposition") == "file":
+                content = part.get_payload(decode=True)
+        file_id = f"file-{len(self.server.files)}"
+        self.server.files[file_id] = content
+        return {
+            "id": file_id,
+            "object": "file",
+            "bytes": len(content),
+            "created_at": 0,
+            "filename": "input.jsonl",
+            "purpose": "batch",
+            "status": "processed",
+        }
+
+    def _create_batch(self, body):
+        request = json.loads(body)
+        lines = self.server.files[request["input_file_id"]].decode().splitlines()
+        requests = [json.loads(line) for line in lines if line]
+        results = []
+        for index, item in enumerate(requests):
+            article = item["body"]["messages"][-1]["content"]
+            if "erreur" in article:
+                continue
+            if "surcharge" in article:
+                response = {
+                    "status_code": 500,
+                    "body": {"error": {"message": "Erreur interne du serveur"}},
+                }
+            else:
+                content = (
+                    "Désolé, je ne trouve aucune levée de fonds."
+                    if "illisible" in article
+                    else json.dumps({"Nom_start-up": article.split()[-1]})
+                )
+                response = {
+                    "status_code": 200,
+                    "body": {"choices": [{"message": {"content": content}}]},
+                }
+            results.append(
+                {
+                    "id": f"response-{index}",
+                    "custom_id": item["custom_id"],
+                    "response": response,
+                }
+            )
+        output_file_id = f"file-{len(self.server.files)}"
+        self.server.files[output_file_id] = "\n".join(map(json.dumps, results)).encode()
+        batch_id = f"batch_{len(self.server.batches)}"
+        self.server.batches[batch_id] = {
+            "polls": 0,
+            "input_file_id": request["input_file_id"],
+            "output_file_id": output_file_id,
+            "total": len(requests),
+        }
+        return self._batch(batch_id)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path.endswith("/files"):
+            return self._send_json(self._upload(body))
+        if self.path.endswith("/batches"):
+            return self._send_json(self._create_batch(body))
+        self.send_error(404)
+
+    def do_GET(self):
+        match = re.search(r"/batches/([^/]+)$", self.path)
+        if match:
+            self.server.batches[match.group(1)]["polls"] += 1
+            return self._send_json(self._batch(match.group(1)))
+        match = re.search(r"/files/([^/]+)/content$", self.path)
+        if match:
+            return self._send_json(None, raw=self.server.files[match.group(1)])
+        self.send_error(404)
+
+
+@pytest.fixture
+def fake_batch_server(monkeypatch):
+    """Démarre le faux serveur Batch et y dirige le client OpenAI partagé."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeBatchHandler)
+    server.files = {}
+    server.batches = {}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    monkeypatch.setenv("OPENAI_BASE_URL", f"http://127.0.0.1:{server.server_port}/v1")
+    monkeypatch.setattr(run_extraction, "OPENAI_API_KEY", "sk-test")
+    monkeypatch.setattr(extraction_cache, "CACHE_ENABLED", False)
+    llm_client.close_clients()
+    yield server
+    llm_client.close_clients()
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def saved_rows(monkeypatch):
+    """Extractions « enregistrées en base » pendant le test."""
+    rows = []
+
+    def add_extractions_bulk(user_id, chunk, page_size=500):
+        rows.extend(chunk)
+        return True, f"{len(chunk)} extractions enregistrées."
+
+    monkeypatch.setattr(database, "add_extractions_bulk", add_extractions_bulk)
+    return rows
+
+
+def test_create_job_without_articles_writes_nothing(tmp_path):
+    assert batch_api.create_job(1, SYSTEM_PROMPT, [], "csv", str(tmp_path)) is None
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_create_job_splits_requests_into_parts(tmp_path, monkeypatch):
+    monkeypatch.setattr(batch_api, "BATCH_MAX_REQUESTS", 2)
+    jobs = [(f"ligne {i}", f"Article sur Startup{i}") for i in range(5)]
+
+    manifest = batch_api.create_job(1, SYSTEM_PROMPT, jobs, "csv", str(tmp_path))
+
+    assert manifest["request_count"] == 5
+    assert [part["request_count"] for part in manifest["parts"]] == [2, 2, 1]
+    assert batch_api.load_manifest(manifest["job_dir"]) == manifest
+    for part in manifest["parts"]:
+        with open(part["input_path"], encoding="utf-8") as f:
+            requests = [json.loads(line) for line in f]
+        assert len(requests) == part["request_count"]
+        assert requests[0]["url"] == batch_api.BATCH_ENDPOINT
+
+
+def test_run_job_against_fake_batch_server(
+    tmp_path, monkeypatch, fake_batch_server, saved_rows
+):
+    monkeypatch.setattr(batch_api, "BATCH_MAX_REQUESTS", 2)
+    jobs = [
+        ("ligne 2", "Article sur Alpha"),
+        ("ligne 3", "Article en erreur"),
+        ("ligne 4", "Article sur Gamma"),
+    ]
+    manifest = batch_api.create_job(1, SYSTEM_PROMPT, jobs, "csv", str(tmp_path))
+
+    batch_api.run_job(manifest, poll_interval=0)
+
+    assert manifest["status"] == "ingested"
+    assert manifest["results"] == {"success": 2, "errors": 1}
+    assert all(part["ingested"] for part in manifest["parts"])
+    assert len(fake_batch_server.batches) == 2
+    assert sorted(
+        json.loads(row["extracted_data"])["Nom_start-up"] for row in saved_rows
+    ) == [
+        "Alpha",
+        "Gamma",
+    ]
+    # Le manifeste sur disque permet de reprendre le job : tout est déjà fait
+    assert batch_api.load_manifest(manifest["job_dir"])["status"] == "ingested"
+
+
+def test_failed_and_unreadable_output_lines_count_as_errors(
+    tmp_path, fake_batch_server, saved_rows
+):
+    jobs = [
+        ("ligne 2", "Article sur Alpha"),
+        ("ligne 3", "Article en surcharge"),
+        ("ligne 4", "Article illisible"),
+        ("ligne 5", "Article en erreur"),
+        ("ligne 6", "Article sur Epsilon"),
+    ]
+    manifest = batch_api.create_job(1, SYSTEM_PROMPT, jobs, "csv", str(tmp_path))
+
+    batch_api.run_job(manifest, poll_interval=0)
+
+    assert manifest["results"] == {"success": 2, "errors": 3}
+    assert sorted(
+        json.loads(row["extracted_data"])["Nom_start-up"] for row in saved_rows
+    ) == ["Alpha", "Epsilon"]
+
+
+def test_resume_after_interrupted_submit(
+    tmp_path, monkeypatch, fake_batch_server, saved_rows
+):
+    monkeypatch.setattr(batch_api, "BATCH_MAX_REQUESTS", 2)
+    jobs = [
+        ("ligne 2", "Article sur Alpha"),
+        ("ligne 3", "Article sur Beta"),
+        ("ligne 4", "Article sur Gamma"),
+    ]
+    manifest = batch_api.create_job(1, SYSTEM_PROMPT, jobs, "csv", str(tmp_path))
+
+    # Interruption juste après la soumission de la première partie
+    save_manifest = batch_api.save_manifest
+    saves = []
+
+    def interrupted_save(manifest):
+        saves.append(manifest["status"])
+        if len(saves) == 3:
+            raise KeyboardInterrupt
+        save_manifest(manifest)
+
+    monkeypatch.setattr(batch_api, "save_manifest", interrupted_save)
+    with pytest.raises(KeyboardInterrupt):
+        batch_api.run_job(manifest, poll_interval=0)
+    monkeypatch.setattr(batch_api, "save_manifest", save_manifest)
+
+    resumed = batch_api.load_manifest(manifest["job_dir"])
+    assert resumed["status"] == "created"
+    assert resumed["parts"][0]["batch_id"] == "batch_0"
+    assert resumed["parts"][1]["batch_id"] is None
+
+    batch_api.run_job(resumed, poll_interval=0)
+
+    # La première partie n'est pas soumise une seconde fois
+    assert sorted(fake_batch_server.batches) == ["batch_0", "batch_1"]
+    assert resumed["status"] == "ingested"
+    assert resumed["results"] == {"success": 3, "errors": 0}
+    assert len(saved_rows) == 3
+
+
+def test_resume_while_batches_are_running(tmp_path, fake_batch_server, saved_rows):
+    jobs = [("ligne 2", "Article sur Alpha"), ("ligne 3", "Article en erreur")]
+    manifest = batch_api.create_job(1, SYSTEM_PROMPT, jobs, "csv", str(tmp_path))
+    batch_api.submit_job(manifest)
+
+    resumed = batch_api.load_manifest(manifest["job_dir"])
+    assert resumed["status"] == "submitted"
+    batch_api.run_job(resumed, poll_interval=0)
+
+    assert len(fake_batch_server.batches) == 1
+    assert fake_batch_server.batches["batch_0"]["polls"] == 2
+    assert resumed["results"] == {"success": 1, "errors": 1}
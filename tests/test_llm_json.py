@@ -0,0 +1,162 @@
+"""Lecture tolérante du JSON renvoyé par le LLM (llm_json.loads)"""
+
+import pytest
+
+import llm_json
+import run_extraction
+
+
+def test_valid_json_needs_no_repair():
+    assert llm_json.loads('{"a": 1, "b": [1, 2]}') == ({"a": 1, "b": [1, 2]}, False)
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        '```json\n{"a": 1}\n```',
+        '```\n{"a": 1}\n```\nJ\'espère que cela aide.',
+        '```json\n{"a": 1}',
+    ],
+)
+def test_code_fences_are_stripped(text):
+    assert llm_json.loads(text)[0] == {"a": 1}
+
+
+def test_trailing_commas_are_removed():
+    value, repaired = llm_json.loads('{"a": [1, 2,], "b": {"c": 3,},}')
+    assert value == {"a": [1, 2], "b": {"c": 3}}
+    assert repaired
+
+
+def test_raw_newline_in_string_is_escaped():
+    assert llm_json.loads('{"a": "ligne 1\nligne 2"}')[0] == {"a": "ligne 1\nligne 2"}
+
+
+def test_truncated_string_drops_the_unfinished_field():
+    value, repaired = llm_json.loads('{"a": "x", "b": "réponse coup')
+    assert value == {"a": "x"}
+    assert repaired
+
+
+def test_truncated_number_drops_the_unfinished_field():
+    # « 12 » pourrait être le début de « 1250000 » : le champ n'est pas gardé
+    assert llm_json.loads('{"a": "x", "montant": 12')[0] == {"a": "x"}
+
+
+def test_truncated_nested_structures_are_closed():
+    value, _ = llm_json.loads('{"a": {"b": 1}, "c": ["x", "y')
+    assert value == {"a": {"b": 1}, "c": ["x"]}
+
+
+def test_truncated_after_complete_value_keeps_it():
+    assert llm_json.loads('{"a": "x", "b": ["y"]')[0] == {"a": "x", "b": ["y"]}
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        '[JSON] {"a": 1}',
+        'Selon {source} : {"a": 1}',
+        'Réponse [1] : {"a": 1} [fin]',
+    ],
+)
+def test_brackets_in_leading_text_are_skipped(text):
+    assert llm_json.loads(text)[0] == {"a": 1}
+
+
+def test_empty_object_before_the_answer_is_skipped():
+    assert llm_json.loads('Format : {} puis {"a": 1}')[0] == {"a": 1}
+
+
+def test_empty_object_alone_is_returned():
+    assert llm_json.loads("{}") == ({}, False)
+
+
+def test_array_opening():
+    assert llm_json.loads('Voici : [{"id": 1}, {"id": 2},]', "[")[0] == [
+        {"id": 1},
+        {"id": 2},
+    ]
+
+
+@pytest.mark.parametrize(
+    "text", ["Aucune donnée.", '{"a": ', '{"montant": 12', "{source} seulement"]
+)
+def test_unusable_response_raises(text):
+    with pytest.raises(ValueError):
+        llm_json.loads(text)
+
+
+# --- Réception en streaming (StreamScanner) ---
+
+
+def feed_all(scanner, chunks):
+    """Envoie les morceaux un à un ; retourne l'indice du morceau qui complète le JSON."""
+    for index, chunk in enumerate(chunks):
+        if scanner.feed(chunk):
+            return index
+    return None
+
+
+def test_scanner_completes_when_top_level_object_closes():
+    scanner = llm_json.StreamScanner()
+    chunks = ['{"a": {"b"', ': 1}, "c": "}', '"}', "\n\nJ'espère que", " cela aide."]
+
+    assert feed_all(scanner, chunks) == 2
+    assert scanner.complete
+    assert llm_json.loads(scanner.text)[0] == {"a": {"b": 1}, "c": "}"}
+
+
+def test_scanner_ignores_brackets_in_leading_text():
+    scanner = llm_json.StreamScanner()
+    chunks = ["[JSON] Selon {source}, ", "voici : {}", ' {"a": [1, ', "2]}", " fin"]
+
+    assert feed_all(scanner, chunks) == 3
+    assert llm_json.loads(scanner.text)[0] == {"a": [1, 2]}
+
+
+def test_scanner_handles_escaped_quotes_and_split_escapes():
+    scanner = llm_json.StreamScanner()
+    chunks = ['{"a": "dit \\', '"}\\" "', ', "b": 2', "}"]
+
+    assert feed_all(scanner, chunks) == 3
+    assert llm_json.loads(scanner.text)[0] == {"a": 'dit "}" ', "b": 2}
+
+
+def test_scanner_partial_returns_completed_fields():
+    scanner = llm_json.StreamScanner()
+    assert scanner.partial() is None
+
+    scanner.feed('{"Nom": "Acme", "Montant": "10 M')
+    assert scanner.partial() == {"Nom": "Acme"}
+
+    scanner.feed('€", "Investisseurs": ["Partech", "Bpi')
+    assert scanner.partial() == {
+        "Nom": "Acme",
+        "Montant": "10 M€",
+        "Investisseurs": ["Partech"],
+    }
+    assert not scanner.complete
+
+
+def test_scanner_without_json_never_completes():
+    scanner = llm_json.StreamScanner()
+    assert feed_all(scanner, ["Je ne trouve ", "aucune donnée [1]."]) is None
+    assert scanner.partial() is None
+
+
+def test_feed_stream_reports_partial_fields_and_stops_early():
+    # Même boucle que la réception en streaming de run_extraction
+    scanner = llm_json.StreamScanner()
+    partials = []
+    chunks = ['{"Nom": "Ac', 'me", "Ville"', ': "Paris"}', " Autre texte {}"]
+
+    received = 0
+    for chunk in chunks:
+        received += 1
+        if run_extraction._feed_stream(scanner, chunk, partials.append):
+            break
+
+    assert received == 3
+    assert partials == [{"Nom": "Acme"}, {"Nom": "Acme", "Ville": "Paris"}]
+    assert scanner.text == '{"Nom": "Acme", "Ville": "Paris"}'
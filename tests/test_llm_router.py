@@ -0,0 +1,188 @@
+"""Répartition entre serveurs LLM locaux et débordement vers OpenAI (llm_router)"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+import requests
+
+import llm_router
+
+URL_A = "http://a:1234/v1/chat/completions"
+URL_B = "http://b:1234/v1/chat/completions"
+
+
+def http_error(status_code):
+    response = requests.Response()
+    response.status_code = status_code
+    return requests.HTTPError(f"{status_code} Error", response=response)
+
+
+@pytest.fixture
+def health(monkeypatch):
+    """Réponses du `/models` des serveurs écartés : liste de booléens consommée à chaque vérification."""
+    answers = []
+    finished = threading.Event()
+    threads_before = threading.active_count()
+
+    def check_health(endpoint):
+        if finished.is_set():
+            return True
+        return answers.pop(0) if answers else False
+
+    monkeypatch.setattr(llm_router, "check_health", check_health)
+    monkeypatch.setattr(llm_router, "HEALTH_CHECK_INTERVAL", 0.01)
+    monkeypatch.setattr(llm_router, "MAX_FAILURES", 2)
+    yield answers
+
+    # Réintègre les serveurs encore écartés : leurs threads de surveillance s'arrêtent
+    # au lieu de continuer (avec le vrai `time.sleep`) après le test
+    finished.set()
+    assert wait_until(lambda: threading.active_count() <= threads_before)
+
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_parse_endpoints():
+    endpoints = llm_router.parse_endpoints(f"{URL_A}|2|4, {URL_B}", URL_A)
+    assert [(e.url, e.weight, e.max_concurrency) for e in endpoints] == [
+        (URL_A, 2.0, 4),
+        (URL_B, 1.0, 0),
+    ]
+    assert [e.url for e in llm_router.parse_endpoints("", URL_B)] == [URL_B]
+
+
+def test_health_url():
+    assert llm_router.health_url(URL_A) == "http://a:1234/v1/models"
+
+
+def test_requests_go_to_least_loaded_endpoint_by_weight():
+    a, b = llm_router.Endpoint(URL_A, weight=2), llm_router.Endpoint(URL_B)
+    router = llm_router.Router([a, b])
+
+    targets = [router.acquire() for _ in range(3)]
+
+    assert targets == [a, a, b]
+    assert (a.in_flight, b.in_flight) == (2, 1)
+
+
+def test_saturated_endpoints_make_requests_wait():
+    a = llm_router.Endpoint(URL_A, max_concurrency=1)
+    router = llm_router.Router([a])
+    assert router.acquire() is a
+
+    acquired = []
+    waiter = threading.Thread(target=lambda: acquired.append(router.acquire()))
+    waiter.start()
+    time.sleep(0.05)
+    assert acquired == []
+
+    router.release(a)
+    waiter.join(timeout=2)
+    assert acquired == [a]
+
+
+def test_saturated_endpoints_overflow_to_openai():
+    a = llm_router.Endpoint(URL_A, max_concurrency=1)
+    router = llm_router.Router([a], openai_fallback=True)
+
+    assert router.acquire() is a
+    assert router.acquire() is llm_router.OPENAI
+    router.release(llm_router.OPENAI)
+
+    assert a.in_flight == 1
+    assert router.stats()["openai_fallback"] == 1
+
+
+def test_acquire_async_waits_for_a_free_slot():
+    a = llm_router.Endpoint(URL_A, max_concurrency=1)
+    router = llm_router.Router([a])
+
+    async def scenario():
+        first = await router.acquire_async()
+        second = asyncio.ensure_future(router.acquire_async())
+        await asyncio.sleep(0.1)
+        assert not second.done()
+        router.release(first)
+        return await asyncio.wait_for(second, timeout=1)
+
+    assert asyncio.run(scenario()) is a
+
+
+def test_consecutive_failures_eject_then_readmit_endpoint(health):
+    a, b = llm_router.Endpoint(URL_A), llm_router.Endpoint(URL_B)
+    router = llm_router.Router([a, b])
+
+    for _ in range(2):
+        target = router.acquire()
+        assert target is a
+        router.release(target, requests.exceptions.ConnectionError())
+
+    assert not a.healthy
+    assert router.stats()["ejections@a:1234"] == 1
+    # Les requêtes suivantes évitent le serveur écarté
+    assert router.acquire() is b
+    router.release(b)
+
+    # Premier `/models` en échec, le second répond : le serveur est réintégré
+    health.extend([False, True])
+    assert wait_until(lambda: a.healthy)
+    assert a.failures == 0
+    assert router.acquire() is a
+
+
+def test_success_and_429_do_not_count_as_failures(health):
+    a, b = llm_router.Endpoint(URL_A), llm_router.Endpoint(URL_B)
+    router = llm_router.Router([a, b])
+
+    for error in (http_error(503), None, http_error(503), http_error(429)):
+        router.release(router.acquire(), error)
+
+    assert a.healthy
+    assert a.failures == 1
+    assert a.errors == 2
+
+
+def test_all_endpoints_ejected_fall_back_to_openai(health):
+    a, b = llm_router.Endpoint(URL_A), llm_router.Endpoint(URL_B)
+    router = llm_router.Router([a, b], openai_fallback=True)
+
+    for endpoint in (a, b):
+        for _ in range(2):
+            endpoint.in_flight += 1
+            router.release(endpoint, http_error(502))
+
+    assert not a.healthy and not b.healthy
+    assert router.acquire() is llm_router.OPENAI
+
+
+def test_all_endpoints_ejected_without_fallback_raises(health):
+    a, b = llm_router.Endpoint(URL_A), llm_router.Endpoint(URL_B)
+    router = llm_router.Router([a, b])
+
+    for endpoint in (a, b):
+        for _ in range(2):
+            endpoint.in_flight += 1
+            router.release(endpoint, http_error(502))
+
+    with pytest.raises(llm_router.NoEndpointAvailable):
+        router.acquire()
+
+
+def test_single_endpoint_without_fallback_is_never_ejected(health):
+    a = llm_router.Endpoint(URL_A)
+    router = llm_router.Router([a])
+
+    for _ in range(5):
+        router.release(router.acquire(), requests.exceptions.Timeout())
+
+    assert a.healthy
+    assert router.acquire() is a
@@ -0,0 +1,159 @@
+"""Nouvelles tentatives et concurrence adaptative du limiteur de débit (rate_limiter)"""
+
+import asyncio
+import email.utils
+import time
+
+import pytest
+import requests
+
+import rate_limiter
+
+
+def http_error(status_code, headers=None, code=None):
+    response = requests.Response()
+    response.status_code = status_code
+    response.headers.update(headers or {})
+    error = requests.HTTPError(f"{status_code} Error", response=response)
+    if code:
+        error.code = code
+    return error
+
+
+class FakeSend:
+    """`send()` qui lève les erreurs données dans l'ordre, puis retourne "ok"."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Attentes demandées par le limiteur (sans attendre réellement)."""
+    delays = []
+    monkeypatch.setattr(rate_limiter.time, "sleep", delays.append)
+    # Aléa du délai exponentiel remplacé par sa borne haute
+    monkeypatch.setattr(rate_limiter.random, "uniform", lambda low, high: high)
+    return delays
+
+
+def test_429_honours_retry_after_and_halves_concurrency(sleeps):
+    limiter = rate_limiter.RateLimiter(max_concurrency=8, max_retries=3)
+    send = FakeSend(http_error(429, {"Retry-After": "7"}))
+
+    assert limiter.call(send) == "ok"
+
+    assert send.calls == 2
+    assert sleeps[0] == 7
+    assert limiter.concurrency == 4
+    assert limiter.stats()["retries"] == 1
+    assert limiter.stats()["rate_limited"] == 1
+    # Le quota est partagé : les requêtes suivantes attendent aussi
+    assert limiter._paused_until > time.monotonic()
+
+
+def test_retry_after_ms_takes_precedence():
+    error = http_error(429, {"retry-after-ms": "1500", "Retry-After": "9"})
+    assert rate_limiter.retry_after(error) == 1.5
+
+
+def test_retry_after_http_date():
+    date = email.utils.formatdate(time.time() + 30, usegmt=True)
+    assert 28 <= rate_limiter.retry_after(http_error(503, {"Retry-After": date})) <= 30
+
+
+def test_timeouts_use_exponential_backoff_then_give_up(sleeps):
+    limiter = rate_limiter.RateLimiter(max_concurrency=8, max_retries=3)
+    send = FakeSend(*(requests.exceptions.Timeout() for _ in range(4)))
+
+    with pytest.raises(requests.exceptions.Timeout):
+        limiter.call(send)
+
+    assert send.calls == 4
+    assert sleeps == [1.0, 2.0, 4.0]
+    assert limiter.stats()["retries"] == 3
+    assert limiter.stats()["failed_after_retries"] == 1
+    # Une erreur réseau ne signale pas une surcharge : concurrence inchangée
+    assert limiter.concurrency == 8
+
+
+def test_backoff_is_capped(sleeps):
+    limiter = rate_limiter.RateLimiter(max_retries=10)
+    limiter.call(FakeSend(*(requests.exceptions.ConnectionError() for _ in range(8))))
+    assert max(sleeps) == rate_limiter.BACKOFF_MAX
+
+
+def test_backoff_is_jittered(monkeypatch, sleeps):
+    bounds = []
+    monkeypatch.setattr(
+        rate_limiter.random,
+        "uniform",
+        lambda low, high: bounds.append((low, high)) or 0,
+    )
+    limiter = rate_limiter.RateLimiter(max_retries=2)
+    limiter.call(FakeSend(http_error(502), http_error(502)))
+    assert bounds == [(0, 1.0), (0, 2.0)]
+
+
+@pytest.mark.parametrize(
+    "error", [http_error(400), http_error(429, code="insufficient_quota")]
+)
+def test_non_transient_errors_are_not_retried(sleeps, error):
+    limiter = rate_limiter.RateLimiter(max_concurrency=8)
+    send = FakeSend(error)
+
+    with pytest.raises(requests.HTTPError):
+        limiter.call(send)
+
+    assert send.calls == 1
+    assert sleeps == []
+    assert limiter.concurrency == 8
+
+
+def test_burst_of_errors_decreases_concurrency_once(sleeps):
+    limiter = rate_limiter.RateLimiter(max_concurrency=16, max_retries=5)
+    limiter.call(FakeSend(http_error(503), http_error(429), http_error(500)))
+    assert limiter.concurrency == 8
+
+
+def test_successes_increase_concurrency_up_to_the_maximum():
+    limiter = rate_limiter.RateLimiter(max_concurrency=4)
+    limiter._limit = 2.0
+
+    limits = []
+    for _ in range(10):
+        limiter.call(FakeSend())
+        limits.append(limiter._limit)
+
+    # +1 environ tous les `limit` succès, sans dépasser le plafond
+    assert limits[0] == 2.5
+    assert limits == sorted(limits)
+    assert limiter.concurrency == 4
+    assert max(limits) == 4
+
+
+def test_call_async_retries_with_the_same_policy(monkeypatch):
+    delays = []
+
+    async def fake_sleep(delay):
+        delays.append(delay)
+
+    monkeypatch.setattr(rate_limiter.asyncio, "sleep", fake_sleep)
+    limiter = rate_limiter.RateLimiter(max_concurrency=8, max_retries=3)
+    send = FakeSend(http_error(429, {"Retry-After": "3"}))
+
+    async def async_send():
+        return send()
+
+    assert asyncio.run(limiter.call_async(async_send)) == "ok"
+    assert send.calls == 2
+    # Retry-After, puis la pause partagée (l'horloge n'avance pas pendant le test)
+    assert delays[0] == 3.0
+    assert limiter.concurrency == 4
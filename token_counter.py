@@ -0,0 +1,62 @@
+"""
+Comptage des tokens envoyés au LLM
+
+Utilise tiktoken quand il est installé (décompte exact pour les modèles OpenAI),
+sinon une estimation à partir du nombre de caractères. L'estimation suffit pour
+dimensionner des requêtes ou découper un texte, pas pour facturer.
+"""
+
+import math
+import os
+
+try:
+    import tiktoken
+except ImportError:  # dépendance optionnelle
+    tiktoken = None
+
+DEFAULT_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+
+# Encodage utilisé quand tiktoken ne connaît pas le modèle (modèles locaux, etc.)
+FALLBACK_ENCODING = "o200k_base"
+
+# Estimation sans tiktoken : ~4 caractères par token pour du texte français/anglais
+CHARS_PER_TOKEN = 4
+
+_encodings = {}
+
+
+def get_encoding(model=None):
+    """
+    Retourne l'encodage tiktoken du modèle, ou None si tiktoken n'est pas installé ou
+    si l'encodage ne peut pas être chargé (premier téléchargement impossible hors ligne).
+    """
+    if tiktoken is None:
+        return None
+    model = model or DEFAULT_MODEL
+    if model not in _encodings:
+        try:
+            try:
+                encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                encoding = tiktoken.get_encoding(FALLBACK_ENCODING)
+        except Exception as e:
+            # Échec mémorisé : pas de nouvelle tentative de téléchargement à chaque appel
+            print(f"Encodage tiktoken indisponible ({e}) : décompte des tokens estimé.")
+            encoding = None
+        _encodings[model] = encoding
+    return _encodings[model]
+
+
+def count_tokens(text, model=None):
+    """Nombre de tokens de `text` (exact avec tiktoken, estimé sinon)."""
+    if not text:
+        return 0
+    encoding = get_encoding(model)
+    if encoding is None:
+        return math.ceil(len(text) / CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def is_exact():
+    """Indique si les décomptes sont exacts (tiktoken disponible et encodages chargés)."""
+    return tiktoken is not None and None not in _encodings.values()